@@ -0,0 +1,385 @@
+# benchmarks/bench_orquestador.py
+# Ejecuta orquestador.main de principio a fin sin red: un servidor falso
+# compatible con OpenAI (latencia configurable y respuestas 'files' enlatadas),
+# un remoto git bare local por proyecto en lugar de GitHub/PyGithub y, salvo
+# --docker-real, un cliente Docker falso que lanza agent_runner.py como proceso.
+# Mide tareas/hora, latencia por etapa (a partir de las trazas) y pico de memoria
+# para cargas de varios tamaños, y falla si empeora respecto a la línea base.
+#
+#   python benchmarks/bench_orquestador.py --cargas 1,4 --workers 4
+#   python benchmarks/bench_orquestador.py --guardar-linea-base
+#
+# Con --docker-real hace falta la imagen 'agente-constructor' y que el contenedor
+# alcance el servidor falso por host.docker.internal; se fuerza el modo volumen
+# compartido porque el contenedor no ve los remotos bare del host.
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(RAIZ, "src"))
+sys.path.insert(0, RAIZ)
+
+LINEA_BASE_POR_DEFECTO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "linea_base_orquestador.json")
+ETAPAS_POR_DEFECTO = ["planificacion", "backend-dev", "frontend-dev", "backend-qa", "backend-doc", "documentacion"]
+MARGEN_LATENCIA_S = 0.05  # Por debajo de esto una subida de latencia se considera ruido.
+
+# --- Servidor LLM falso (OpenAI compatible) ---
+
+def respuesta_enlatada(prompt: str, ficheros_por_etapa: int, bytes_por_fichero: int) -> str:
+    """Plan para el arquitecto, 'files' para los obreros y markdown para el documentador."""
+    if "Generar plan de construcci" in prompt:  # El contexto viaja con json.dumps: los acentos llegan escapados.
+        plan = {"plan": [
+            {"etapa": "backend", "tareas": ["Crear la API REST de ejemplo."]},
+            {"etapa": "frontend", "tareas": ["Crear la página que consume la API."], "depende_de": ["backend"]},
+        ]}
+        return json.dumps({"files": [{"filename": "plan_construccion.json", "action": "create_or_update", "code": json.dumps(plan)}]})
+    if '"files"' in prompt:
+        etapa = "frontend" if "etapa de 'frontend'" in prompt else "backend"
+        linea = "def funcion_de_relleno(x):\n    return x * 2  # relleno\n"
+        codigo = linea * max(1, bytes_por_fichero // len(linea))
+        return json.dumps({"files": [
+            {"filename": f"{etapa}/modulo_{i}.py", "action": "create_or_update", "code": codigo}
+            for i in range(ficheros_por_etapa)
+        ]})
+    return "# Documentación\n\n" + "Descripción sintética del componente.\n" * max(1, bytes_por_fichero // 40)
+
+class ManejadorLLMFalso(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_response(404); self.end_headers(); return
+        peticion = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8"))
+        prompt = peticion["messages"][-1]["content"]
+        servidor = self.server
+        contenido = respuesta_enlatada(prompt, servidor.ficheros_por_etapa, servidor.bytes_por_fichero)
+        with servidor.lock: servidor.peticiones += 1
+        time.sleep(servidor.latencia)
+        base = {"id": "bench", "created": int(time.time()), "model": peticion.get("model") or "bench"}
+
+        if not peticion.get("stream"):
+            cuerpo = json.dumps({
+                **base, "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": contenido}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(contenido) // 4,
+                          "total_tokens": (len(prompt) + len(contenido)) // 4},
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for i in range(0, len(contenido), servidor.caracteres_por_trozo):
+            trozo = {**base, "object": "chat.completion.chunk", "choices": [
+                {"index": 0, "delta": {"content": contenido[i:i + servidor.caracteres_por_trozo]}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(trozo)}\n\n".encode("utf-8"))
+            if servidor.retardo_trozo: time.sleep(servidor.retardo_trozo)
+        final = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+
+    def log_message(self, format, *args):
+        pass
+
+def arrancar_servidor_llm(latencia: float, retardo_trozo: float, ficheros_por_etapa: int, bytes_por_fichero: int):
+    servidor = ThreadingHTTPServer(("0.0.0.0", 0), ManejadorLLMFalso)
+    servidor.daemon_threads = True
+    servidor.latencia, servidor.retardo_trozo, servidor.caracteres_por_trozo = latencia, retardo_trozo, 512
+    servidor.ficheros_por_etapa, servidor.bytes_por_fichero = ficheros_por_etapa, bytes_por_fichero
+    servidor.lock, servidor.peticiones = threading.Lock(), 0
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+# --- Remoto git local y GitHub falso ---
+
+def crear_remoto_bare(directorio: str, proyecto: str) -> str:
+    """Remoto bare con un commit inicial (un remoto vacío no admite 'git pull')."""
+    remoto = os.path.join(directorio, f"{proyecto}.git")
+    semilla = os.path.join(directorio, f"{proyecto}-semilla")
+    subprocess.run(["git", "init", "-q", "--bare", remoto], check=True)
+    subprocess.run(["git", "init", "-q", semilla], check=True)
+    with open(os.path.join(semilla, "README.md"), "w", encoding="utf-8") as f:
+        f.write(f"# {proyecto}\n")
+    for comando in (["git", "add", "."], ["git", "-c", "user.name=bench", "-c", "user.email=bench@local", "commit", "-q", "-m", "Inicial"],
+                    ["git", "push", "-q", remoto, "HEAD:refs/heads/main"]):
+        subprocess.run(comando, cwd=semilla, check=True)
+    subprocess.run(["git", "symbolic-ref", "HEAD", "refs/heads/main"], cwd=remoto, check=True)
+    shutil.rmtree(semilla)
+    return remoto
+
+class GithubLocal:
+    """Sustituto de github.Github: los repositorios ya existen como remotos bare."""
+    def __init__(self, *args, **kwargs): pass
+    def get_user(self): return self
+    def create_repo(self, nombre, private=True): return None
+
+# --- Cliente Docker falso: cada "contenedor" es un proceso agent_runner.py ---
+
+class ContenedorLocal:
+    _siguiente = 0
+    _lock = threading.Lock()
+
+    def __init__(self, environment: dict, volumes: dict, directorio: str):
+        with ContenedorLocal._lock:
+            ContenedorLocal._siguiente += 1
+            self.short_id = f"local{ContenedorLocal._siguiente}"
+        self.directorio = tempfile.mkdtemp(prefix=f"{self.short_id}-", dir=directorio)
+        entorno = {clave: self._ruta_en_host(str(valor), volumes or {}) for clave, valor in (environment or {}).items()}
+        self.proceso = subprocess.Popen([sys.executable, "-u", os.path.join(RAIZ, "src", "agent_runner.py")],
+                                        cwd=self.directorio, env={**os.environ, **entorno},
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+    @staticmethod
+    def _ruta_en_host(valor: str, volumes: dict) -> str:
+        """Traduce las rutas montadas (/workspace/..., /trazas, /cache) a su origen en el host."""
+        for origen, montaje in volumes.items():
+            destino = montaje["bind"]
+            if valor == destino or valor.startswith(destino + "/"):
+                return origen + valor[len(destino):]
+        return valor
+
+    def wait(self, timeout=None):
+        try:
+            return {"StatusCode": self.proceso.wait(timeout)}
+        except subprocess.TimeoutExpired:
+            import requests
+            raise requests.exceptions.ReadTimeout(f"{self.short_id} sigue en marcha")  # Igual que docker-py.
+
+    def logs(self, stream=False, follow=False):
+        if not stream:
+            return self.proceso.stdout.read()
+        return iter(lambda: self.proceso.stdout.read1(65536), b"")
+
+    def kill(self):
+        self.proceso.kill()
+
+    def remove(self):
+        self.proceso.stdout.close()
+        shutil.rmtree(self.directorio, ignore_errors=True)
+
+class ClienteDockerLocal:
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        self.containers = self
+
+    def run(self, imagen, environment=None, volumes=None, detach=True, **kwargs):
+        return ContenedorLocal(environment, volumes, self.directorio)
+
+# --- Una carga sintética (se ejecuta en un proceso hijo para medir su memoria) ---
+
+def percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p * (len(ordenados) - 1))))] if ordenados else 0.0
+
+def pico_memoria_mb():
+    """(orquestador, mayor proceso hijo) en MB; None donde 'resource' no existe (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    escala = 1024 * 1024 if sys.platform == "darwin" else 1024  # ru_maxrss: bytes en macOS, KB en Linux.
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / escala,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / escala)
+
+def ejecutar_carga(args) -> dict:
+    import orquestador
+
+    trabajo = tempfile.mkdtemp(prefix=f"bench_orquestador_{args.carga}_")
+    try:
+        for recurso in ("prompts", "resources"):
+            os.symlink(os.path.join(RAIZ, recurso), os.path.join(trabajo, recurso), target_is_directory=True)
+        os.chdir(trabajo)  # TASKS_DIR, workspace, logs... son rutas relativas del orquestador.
+        for variable, valor in (("GIT_AUTHOR_NAME", "bench"), ("GIT_AUTHOR_EMAIL", "bench@local"),
+                                ("GIT_COMMITTER_NAME", "bench"), ("GIT_COMMITTER_EMAIL", "bench@local")):
+            os.environ.setdefault(variable, valor)  # Máquinas de CI sin identidad git global.
+        os.makedirs(orquestador.TASKS_DIR)
+        remotos = os.path.join(trabajo, "remotos")
+        os.makedirs(remotos)
+
+        api_base = args.url_llm.replace("127.0.0.1", "host.docker.internal") if args.docker_real else args.url_llm
+        for i in range(args.carga):
+            proyecto = f"bench-{i:03d}"
+            tarea = {
+                "github_project": proyecto,
+                "github_repo": "file://" + crear_remoto_bare(remotos, proyecto),
+                "github_pat": "bench",
+                "objetivo": "Aplicación sintética para el benchmark.",
+                "etapas_a_ejecutar": args.etapas,
+                "llm_config": {"api_base": api_base, "api_key": "bench", "model_name": "bench"},
+            }
+            with open(os.path.join(orquestador.TASKS_DIR, f"T{i:03d}-bench.json"), "w", encoding="utf-8") as f:
+                json.dump(tarea, f, indent=2, ensure_ascii=False)
+
+        orquestador.Github = GithubLocal
+        if not args.docker_real:
+            contenedores = os.path.join(trabajo, "contenedores")
+            os.makedirs(contenedores)
+            orquestador.docker.from_env = lambda: ClienteDockerLocal(contenedores)
+
+        opciones = ["--workers", str(args.workers), "--paralelismo-etapas", str(args.paralelismo_etapas),
+                    "--sin-cache-llm", "--trazas-dir", "trazas", "--cache-venvs-dir", args.cache_venvs_dir]
+        if not args.con_qa: opciones.append("--no-qa")
+        if args.docker_real or args.volumen_compartido: opciones.append("--volumen-compartido")
+        opciones_orquestador = orquestador.crear_parser().parse_args(opciones + args.opcion_orquestador)
+
+        inicio = time.perf_counter()
+        with open(os.path.join(trabajo, "orquestador.log"), "w", encoding="utf-8") as salida:
+            salida_original, sys.stdout = sys.stdout, salida
+            try:
+                orquestador.main(opciones_orquestador)
+            finally:
+                sys.stdout = salida_original
+        duracion = time.perf_counter() - inicio
+
+        completadas = len(os.listdir(orquestador.PROCESSED_TASKS_DIR))
+        fallidas = len(os.listdir(orquestador.FAILED_TASKS_DIR))
+        etapas, spans = {}, {}
+        with open(os.path.join("trazas", "trazas.jsonl"), "r", encoding="utf-8") as f:
+            for linea in f:
+                registro = json.loads(linea)
+                spans.setdefault(f"{registro['proceso']}/{registro['tipo']}", []).append(registro["duracion_s"])
+                if registro["tipo"] == "etapa":
+                    etapas.setdefault(registro["nombre"], []).append(registro["duracion_s"])
+        memoria, memoria_hijos = pico_memoria_mb()
+        if fallidas and args.conservar:
+            print(f"Carga {args.carga}: {fallidas} tarea(s) fallidas; revisa {trabajo}/orquestador.log", file=sys.stderr)
+        return {
+            "carga": args.carga, "completadas": completadas, "fallidas": fallidas, "duracion_s": round(duracion, 3),
+            "tareas_por_hora": round(completadas / duracion * 3600, 1) if duracion else 0.0,
+            "etapas": {nombre: {"n": len(v), "media_s": round(sum(v) / len(v), 4), "p50_s": round(percentil(v, 0.5), 4),
+                                "p95_s": round(percentil(v, 0.95), 4), "max_s": round(max(v), 4)} for nombre, v in etapas.items()},
+            "spans": {clave: {"n": len(v), "total_s": round(sum(v), 3)} for clave, v in spans.items()},
+            "pico_memoria_mb": round(memoria, 1) if memoria else None,
+            "pico_memoria_agente_mb": round(memoria_hijos, 1) if memoria_hijos else None,
+        }
+    finally:
+        os.chdir(RAIZ)
+        if not args.conservar:
+            shutil.rmtree(trabajo, ignore_errors=True)
+
+# --- Informe y línea base ---
+
+def imprimir_resultado(r: dict):
+    memoria = f"{r['pico_memoria_mb']} MB (agente: {r['pico_memoria_agente_mb']} MB)" if r["pico_memoria_mb"] else "n/d"
+    print(f"\nCarga de {r['carga']} tarea(s): {r['completadas']} completadas, {r['fallidas']} fallidas en {r['duracion_s']:.1f}s")
+    print(f"  tareas/hora: {r['tareas_por_hora']:.1f}   pico de memoria: {memoria}")
+    print(f"  {'etapa':<16} {'n':>4} {'media s':>9} {'p50 s':>8} {'p95 s':>8} {'máx s':>8}")
+    for nombre, e in sorted(r["etapas"].items(), key=lambda item: -item[1]["media_s"]):
+        print(f"  {nombre:<16} {e['n']:>4} {e['media_s']:>9.3f} {e['p50_s']:>8.3f} {e['p95_s']:>8.3f} {e['max_s']:>8.3f}")
+    print(f"  {'span':<28} {'n':>5} {'total s':>9}")
+    for clave, s in sorted(r["spans"].items(), key=lambda item: -item[1]["total_s"]):
+        print(f"  {clave:<28} {s['n']:>5} {s['total_s']:>9.2f}")
+
+def regresiones(resultado: dict, base: dict, tolerancia: float) -> list:
+    """Métricas de 'resultado' que empeoran más de 'tolerancia' (fracción) respecto a 'base'."""
+    fallos = []
+    carga = resultado["carga"]
+    if resultado["fallidas"] > base.get("fallidas", 0):
+        fallos.append(f"carga {carga}: {resultado['fallidas']} tareas fallidas (línea base: {base.get('fallidas', 0)})")
+    if resultado["tareas_por_hora"] < base["tareas_por_hora"] * (1 - tolerancia):
+        fallos.append(f"carga {carga}: {resultado['tareas_por_hora']:.1f} tareas/hora (línea base: {base['tareas_por_hora']:.1f})")
+    for nombre, e in base.get("etapas", {}).items():
+        actual = resultado["etapas"].get(nombre)
+        if actual and actual["media_s"] > e["media_s"] * (1 + tolerancia) + MARGEN_LATENCIA_S:
+            fallos.append(f"carga {carga}: etapa '{nombre}' {actual['media_s']:.3f}s de media (línea base: {e['media_s']:.3f}s)")
+    if resultado["pico_memoria_mb"] and base.get("pico_memoria_mb") and resultado["pico_memoria_mb"] > base["pico_memoria_mb"] * (1 + tolerancia):
+        fallos.append(f"carga {carga}: pico de memoria {resultado['pico_memoria_mb']} MB (línea base: {base['pico_memoria_mb']} MB)")
+    return fallos
+
+def lanzar_carga(args, carga: int, url_llm: str) -> dict:
+    """Cada carga corre en un proceso nuevo: así el pico de memoria es solo suyo."""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        ruta_resultado = f.name
+    comando = [sys.executable, os.path.abspath(__file__), "--_carga", str(carga), "--_url-llm", url_llm, "--_resultado", ruta_resultado,
+               "--workers", str(args.workers), "--paralelismo-etapas", str(args.paralelismo_etapas),
+               "--etapas", ",".join(args.etapas), "--cache-venvs-dir", args.cache_venvs_dir]
+    for activada, opcion in ((args.con_qa, "--con-qa"), (args.docker_real, "--docker-real"),
+                             (args.volumen_compartido, "--volumen-compartido"), (args.conservar, "--conservar")):
+        if activada: comando.append(opcion)
+    for opcion in args.opcion_orquestador:
+        comando.append(f"--opcion-orquestador={opcion}")
+    try:
+        subprocess.run(comando, check=True)
+        with open(ruta_resultado, "r", encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.remove(ruta_resultado)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de extremo a extremo del orquestador, sin red.")
+    parser.add_argument("--cargas", default="1,4", help="Número de tareas (proyectos distintos) de cada carga, separados por comas.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--paralelismo-etapas", type=int, default=1)
+    parser.add_argument("--etapas", default=",".join(ETAPAS_POR_DEFECTO), help="Workflow de cada tarea sintética.")
+    parser.add_argument("--latencia-llm", type=float, default=0.2, help="Segundos de espera del servidor LLM falso por petición.")
+    parser.add_argument("--retardo-trozo", type=float, default=0.0, help="Segundos entre trozos de una respuesta en streaming.")
+    parser.add_argument("--ficheros-por-etapa", type=int, default=5)
+    parser.add_argument("--bytes-por-fichero", type=int, default=2000)
+    parser.add_argument("--con-qa", action="store_true", help="Ejecuta las etapas -qa (necesita poder instalar pytest en el venv de QA).")
+    parser.add_argument("--cache-venvs-dir", default=os.path.join(tempfile.gettempdir(), "bench_orquestador_venvs"))
+    parser.add_argument("--docker-real", action="store_true", help="Usa Docker y la imagen del agente en lugar del cliente falso.")
+    parser.add_argument("--volumen-compartido", action="store_true")
+    parser.add_argument("--opcion-orquestador", action="append", default=[], help="Opción extra para el orquestador (p. ej. --opcion-orquestador=--qa-impacto).")
+    parser.add_argument("--linea-base", default=LINEA_BASE_POR_DEFECTO)
+    parser.add_argument("--guardar-linea-base", action="store_true", help="Guarda los resultados como nueva línea base en lugar de compararlos.")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Empeoramiento relativo admitido antes de fallar.")
+    parser.add_argument("--json", dest="salida_json", help="Escribe también los resultados en este fichero.")
+    parser.add_argument("--conservar", action="store_true", help="No borra el directorio de trabajo de cada carga (para depurar).")
+    parser.add_argument("--_carga", type=int, dest="carga", help=argparse.SUPPRESS)
+    parser.add_argument("--_url-llm", dest="url_llm", help=argparse.SUPPRESS)
+    parser.add_argument("--_resultado", dest="resultado", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.etapas = [e for e in args.etapas.split(",") if e]
+
+    if args.carga is not None:
+        resultado = ejecutar_carga(args)
+        with open(args.resultado, "w", encoding="utf-8") as f:
+            json.dump(resultado, f)
+        return
+
+    servidor = arrancar_servidor_llm(args.latencia_llm, args.retardo_trozo, args.ficheros_por_etapa, args.bytes_por_fichero)
+    url_llm = f"http://127.0.0.1:{servidor.server_address[1]}/v1"
+    print(f"Servidor LLM falso en {url_llm} (latencia {args.latencia_llm}s); cargas: {args.cargas}")
+    resultados = {}
+    try:
+        for carga in [int(c) for c in args.cargas.split(",") if c]:
+            resultados[str(carga)] = lanzar_carga(args, carga, url_llm)
+            imprimir_resultado(resultados[str(carga)])
+    finally:
+        servidor.shutdown()
+    print(f"\nPeticiones atendidas por el LLM falso: {servidor.peticiones}")
+
+    if args.salida_json:
+        with open(args.salida_json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+    if args.guardar_linea_base:
+        with open(args.linea_base, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"Línea base guardada en '{args.linea_base}'.")
+        return
+    if not os.path.exists(args.linea_base):
+        print(f"Sin línea base en '{args.linea_base}': genera una con --guardar-linea-base.")
+        return
+
+    with open(args.linea_base, "r", encoding="utf-8") as f:
+        linea_base = json.load(f)
+    fallos = [fallo for carga, r in resultados.items() if carga in linea_base
+              for fallo in regresiones(r, linea_base[carga], args.tolerancia)]
+    if fallos:
+        print("\n❌ Regresiones respecto a la línea base:")
+        for fallo in fallos: print(f"  - {fallo}")
+        sys.exit(1)
+    print(f"\n✅ Sin regresiones respecto a la línea base (tolerancia {args.tolerancia:.0%}).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/bench_snapshot.py
+# Compara el antiguo leer_codigo_proyecto (os.walk + '+=') con el snapshot
+# incremental en un repositorio sintético de unos miles de ficheros.
+#
+#   python benchmarks/bench_snapshot.py --ficheros 3000
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import snapshot_proyecto
+
+def leer_codigo_proyecto_legacy(path: str) -> str:
+    contenido_completo = ""
+    directorios_a_ignorar = {'.git', '__pycache__', 'docs', '.venv', 'node_modules'}
+    extensiones_relevantes = ('.py', '.js', '.html', '.css', '.json', '.md', 'requirements.txt', 'Dockerfile')
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if d not in directorios_a_ignorar]
+        for file in files:
+            if file.endswith(extensiones_relevantes):
+                try:
+                    file_path = os.path.join(root, file)
+                    rel_path = os.path.relpath(file_path, path)
+                    contenido_completo += f"\n\n{'='*20}\n--- FICHERO: {rel_path} ---\n{'='*20}\n\n"
+                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                        contenido_completo += f.read()
+                except Exception: pass
+    return contenido_completo
+
+def crear_repo_sintetico(destino: str, n_ficheros: int, bytes_por_fichero: int):
+    linea = "def funcion_de_relleno(x):\n    return x * 2  # relleno\n"
+    cuerpo = linea * max(1, bytes_por_fichero // len(linea))
+    for i in range(n_ficheros):
+        carpeta = os.path.join(destino, f"modulo_{i % 50}")
+        os.makedirs(carpeta, exist_ok=True)
+        with open(os.path.join(carpeta, f"fichero_{i}.py"), "w", encoding="utf-8") as f:
+            f.write(cuerpo)
+    # Un lockfile grande, como los que antes se colaban en el prompt.
+    with open(os.path.join(destino, "package-lock.json"), "w", encoding="utf-8") as f:
+        f.write("{" + '"a": 1,' * 500000 + '"z": 0}')
+    subprocess.run(["git", "init", "-q"], cwd=destino, check=True)
+    subprocess.run(["git", "add", "."], cwd=destino, check=True)
+
+def medir(funcion, *args):
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    return time.perf_counter() - inicio, resultado
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del snapshot incremental de proyectos.")
+    parser.add_argument("--ficheros", type=int, default=3000)
+    parser.add_argument("--bytes", type=int, default=4000, help="Tamaño aproximado de cada fichero.")
+    args = parser.parse_args()
+
+    destino = tempfile.mkdtemp(prefix="bench_snapshot_")
+    try:
+        crear_repo_sintetico(destino, args.ficheros, args.bytes)
+
+        t_legacy, texto_legacy = medir(leer_codigo_proyecto_legacy, destino)
+        t_frio, texto_frio = medir(snapshot_proyecto.leer_snapshot, destino)
+        t_caliente, _ = medir(snapshot_proyecto.leer_snapshot, destino)
+
+        # Cambiamos un único fichero y volvemos a medir.
+        with open(os.path.join(destino, "modulo_0", "fichero_0.py"), "a", encoding="utf-8") as f:
+            f.write("# cambio\n")
+        t_incremental, _ = medir(snapshot_proyecto.leer_snapshot, destino)
+        indice = snapshot_proyecto.obtener_indice(destino)
+
+        print(f"Repositorio sintético: {args.ficheros} ficheros de ~{args.bytes} bytes")
+        print(f"  legacy (os.walk + '+='):        {t_legacy:8.3f}s  ({len(texto_legacy) / 1e6:.1f} MB)")
+        print(f"  snapshot en frío:               {t_frio:8.3f}s  ({len(texto_frio) / 1e6:.1f} MB)")
+        print(f"  snapshot sin cambios:           {t_caliente:8.3f}s  (x{t_legacy / t_caliente:.1f})")
+        print(f"  snapshot tras cambiar 1 fichero:{t_incremental:8.3f}s  ({indice.lecturas} fichero(s) releído(s))")
+    finally:
+        shutil.rmtree(destino, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -11,66 +11,237 @@ import errno
 import stat
 import sys
 import ast
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from github import Github, GithubException
 
+# Los módulos de src/ se importan "planos", igual que dentro de la imagen del agente (COPY src/ .).
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+from pool_agentes import PoolDeAgentes
+import llm_cache
+import snapshot_proyecto
+import documentacion_mapreduce
+import esquemas_respuesta
+import cliente_llm
+import grafo_etapas
+import sesion_git
+import entornos_qa
+import impacto_tests
+import e2e_rapido
+import cola_tareas
+import estado_ejecucion
+import memo_etapas
+import trazas
+import logs_mision
+import enrutador_llm
+import registro_prompts
+import contexto_agente
+import prefijo_prompt
+
 # --- CONFIGURACIÓN ---
 AGENT_IMAGE = "agente-constructor"
 WORKSPACE_DIR_NAME = "workspace"
 TASKS_DIR = "tasks"
 PROCESSED_TASKS_DIR = os.path.join(TASKS_DIR, "processed")
 FAILED_TASKS_DIR = os.path.join(TASKS_DIR, "failed")
+TRAZAS_DIR = "trazas"
+AGENT_TRAZAS_MOUNT = "/trazas"
+MEMO_ETAPAS_DIR = memo_etapas.DIRECTORIO_POR_DEFECTO
+MEMOIZAR_ETAPAS = True
+RUN_STATE_DIR = estado_ejecucion.DIRECTORIO_POR_DEFECTO
+COLA_SQLITE_PATH = os.path.join("cola", "tareas.db")  # Fuera de TASKS_DIR: cada cierre de conexión despertaría al vigilante.
 PLANS_DIR = "plans"
-
+TASK_LOGS_DIR = "logs_tareas"
+AGENT_LOGS_DIR = "logs"
+# Plazo de una misión de agente si su rol no define "plazo" en AGENT_INFO; la
+# tarea puede ajustarlo por rol con "plazos_mision": {"backend": 1200, ...}.
+PLAZO_MISION_SEGUNDOS = 1800
+SEGUIR_LOGS_AGENTES = False
+POLL_INTERVAL_SECONDS = 5
+
+# Pool de contenedores precalentados (se crea en main() si se pasa --pool-agentes).
+POOL_AGENTES = None
+# Modo volumen compartido: el agente escribe directamente en workspace/<proyecto>
+# (montado en AGENT_WORKSPACE_MOUNT) y el orquestador hace el único commit/push.
+MODO_VOLUMEN_COMPARTIDO = False
+AGENT_WORKSPACE_MOUNT = "/workspace"
+# Directorio de la caché de respuestas del LLM (compartido con los agentes vía AGENT_CACHE_MOUNT).
+LLM_CACHE_DIR = "cache_llm"
+AGENT_CACHE_MOUNT = "/cache"
+
+# "contexto": claves del contexto de la tarea que ve cada rol en su prompt ("*" = las
+# propias de la tarea, sin claves internas ni secretos; ver src/contexto_agente.py).
+# Un rol sin "contexto" recibe todo salvo las claves internas del orquestador.
 AGENT_INFO = {
-    "investigador": {"prompt": "prompts/investigador.txt", "output_file": "api_data.json"},
-    "arquitecto":   {"prompt": "prompts/arquitecto.txt", "output_file": "plan_construccion.json"},
-    "analista":     {"prompt": "prompts/analista.txt"},
-    "backend":      {"prompt": "prompts/backend.txt", "output_file": "backend.py"},
-    "frontend":     {"prompt": "prompts/frontend.txt", "output_file": "static/index.html"},
-    "qa":           {"prompt": "prompts/qa.txt"},
-    "e2e":       {"prompt": "prompts/e2e_tester.txt"}, # <-- Nuevo Agente!
+    "investigador": {"prompt": "prompts/investigador.txt", "output_file": "api_data.json", "contexto": ("*", "tarea_especifica")},
+    "arquitecto":   {"prompt": "prompts/arquitecto.txt", "output_file": "plan_construccion.json", "plazo": 900,
+                     "contexto": ("*", "tarea_especifica", "GUIA_ESTILO_GENERICA")},
+    "analista":     {"prompt": "prompts/analista.txt", "contexto": ("*", "tarea_especifica")},
+    "backend":      {"prompt": "prompts/backend.txt", "output_file": "backend.py",
+                     "contexto": ("*", "tarea_especifica", "GUIA_ESTILO_GENERICA", "GUIA_ESTILO_BACKEND", "API_KEY_EXTERNA", "CODIGO_ACTUAL")},
+    "frontend":     {"prompt": "prompts/frontend.txt", "output_file": "static/index.html",
+                     "contexto": ("*", "tarea_especifica", "GUIA_ESTILO_GENERICA", "GUIA_ESTILO_FRONTEND", "DOCUMENTACION_BACKEND", "CODIGO_ACTUAL")},
+    "qa":           {"prompt": "prompts/qa.txt", "contexto": ("*", "tarea_especifica")},
+    "e2e":       {"prompt": "prompts/e2e_tester.txt", "contexto": ("*", "tarea_especifica")}, # <-- Nuevo Agente!
     "jefe_de_proyecto": {"prompt": "prompts/jefe_de_proyecto.txt"},
-    "documentador": {"prompt": "prompts/documentador.txt"}
+    "documentador": {"prompt": "prompts/documentador.txt", "plazo": 900, "contexto": ("*", "FICHERO_A_GENERAR", "CONTEXTO_DEL_CODIGO")},
+    "resumidor":    {"prompt": "prompts/resumidor.txt"}
+}
+
+GUIAS_DE_ESTILO = {
+    "GUIA_ESTILO_GENERICA": "resources/generic_style_guide.md",
+    "GUIA_ESTILO_BACKEND": "resources/backend_style_guide.md",
+    "GUIA_ESTILO_FRONTEND": "resources/frontend_style_guide.md",
+}
+
+# Instrucción multi-acción que se añade a cada misión: enseña al agente a crear, actualizar, parchear y eliminar ficheros.
+INSTRUCCION_FORMATO_FICHEROS = """
+Tu respuesta DEBE ser un único objeto JSON válido que describa una lista de operaciones de fichero.
+La estructura del JSON debe ser la siguiente:
+{
+  "files": [
+    {
+      "filename": "ruta/al/fichero_a_crear.py",
+      "action": "create_or_update",
+      "code": "..."
+    },
+    {
+      "filename": "ruta/al/fichero_existente.py",
+      "action": "search_replace",
+      "edits": [{"search": "líneas exactas actuales", "replace": "líneas nuevas"}]
+    },
+    {
+      "filename": "ruta/a/otro_fichero_existente.py",
+      "action": "patch",
+      "diff": "@@ -10,3 +10,3 @@\n contexto\n-línea antigua\n+línea nueva\n contexto"
+    },
+    {
+      "filename": "fichero_a_eliminar.py",
+      "action": "delete"
+    }
+  ]
 }
 
+Donde "..." es el contenido completo del fichero que has generado.
+Para cada fichero, especifica la 'action': 'create_or_update' para crear un fichero o reescribirlo entero, y 'delete' para eliminar.
+Para cambios pequeños en un fichero existente cuyo contenido aparece en CODIGO_ACTUAL, usa 'search_replace' (cada 'search' copia literalmente un trozo del fichero)
+o 'patch' (diff unificado con unas líneas de contexto) en lugar de repetir el fichero completo.
+Si solo necesitas modificar un fichero, la lista 'files' contendrá un solo elemento.
+No incluyas ninguna otra explicación o texto fuera de este objeto JSON.
+"""
+
+# A partir de este tamaño de código, la documentación se hace en modo map-reduce
+# (resumen por fichero + documento final). La tarea puede forzarlo con "doc_mapreduce".
+E2E_CACHE_DIR = e2e_rapido.DIRECTORIO_POR_DEFECTO
+UMBRAL_MAPREDUCE_CARACTERES = 60000
+
 # --- HELPERS ---
 def handle_remove_readonly(func, path, exc):
     excvalue = exc[1]; os.chmod(path, stat.S_IRWXU| stat.S_IRWXG| stat.S_IRWXO); func(path)
 
+# Estado por hilo: en modo --workers cada hilo procesa una tarea distinta y
+# necesita su propio prefijo y su propio fichero de log.
+_contexto_hilo = threading.local()
+_lock_salida = threading.Lock()
+_lock_ficheros_tarea = threading.Lock()
+
 def log_message(message, level="INFO"):
-    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [{level.upper()}] {message}")
+    tarea = getattr(_contexto_hilo, "tarea", None)
+    prefijo = f"[{tarea}] " if tarea else ""
+    linea = f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [{level.upper()}] {prefijo}{message}"
+    with _lock_salida:
+        print(linea)
+        log_file = getattr(_contexto_hilo, "log_file", None)
+        if log_file:
+            log_file.write(linea + "\n"); log_file.flush()
+
+def usa_volumen_compartido(contexto: dict) -> bool:
+    """La tarea puede forzar el modo con 'volumen_compartido'; si no, manda el flag de la CLI."""
+    return bool(contexto.get("volumen_compartido", MODO_VOLUMEN_COMPARTIDO))
+
+_locks_git = {}
+_locks_git_lock = threading.Lock()
+
+def bloqueo_git(repo_path: str) -> threading.RLock:
+    """
+    Lock reentrante por repositorio. Con etapas en paralelo, cada secuencia de
+    sincronización (pull/add/commit/push) se hace entera bajo este lock.
+    """
+    clave = os.path.realpath(repo_path)
+    with _locks_git_lock:
+        return _locks_git.setdefault(clave, threading.RLock())
+
+def memo_de_proyecto(contexto: dict, repo_path: str):
+    """Registro de huellas de etapas del proyecto, o None si la memoización está desactivada."""
+    if not contexto.get("memoizar_etapas", MEMOIZAR_ETAPAS):
+        return None
+    return memo_etapas.obtener_memo(MEMO_ETAPAS_DIR, os.path.basename(os.path.normpath(repo_path)))
+
+def obtener_sesion_git(repo_path: str) -> sesion_git.SesionGit:
+    """
+    Sesión Git de la tarea en curso para ese repo. Fuera de una tarea se usa una
+    sesión con push en cada commit, equivalente al comportamiento clásico.
+    """
+    return sesion_git.obtener_sesion(repo_path) or sesion_git.SesionGit(
+        repo_path, checkpoints=sesion_git.CHECKPOINT_ETAPA, lock=bloqueo_git(repo_path), log=log_message)
 
 def run_git_command(command, cwd):
     try:
-        subprocess.run(command, check=True, cwd=cwd, capture_output=True, text=True, encoding='utf-8')
+        with bloqueo_git(cwd), trazas.span("git", command[1]):
+            subprocess.run(command, check=True, cwd=cwd, capture_output=True, text=True, encoding='utf-8')
     except subprocess.CalledProcessError as e:
         if "nothing to commit" in e.stdout or "no changes added to commit" in e.stdout: log_message("No hay nuevos cambios que guardar.", "GIT")
         else: log_message(f"Error ejecutando Git: {e.stderr}", "ERROR"); raise
 
-def get_llm_response_directo(prompt: str, config: dict) -> str:
+def get_llm_response_directo(prompt: str, config: dict, esquema: dict = None, clave_cache: str = None) -> str:
     # Cuando el orquestador llama directamente, necesita localhost
-    api_base = config.get("api_base", "").replace("host.docker.internal", "localhost")
-    from openai import OpenAI
-    client = OpenAI(base_url=api_base, api_key=config.get("api_key"))
-    response = client.chat.completions.create(model=config.get("model_name"), messages=[{"role": "user", "content": prompt}], temperature=0.5)
-    return response.choices[0].message.content
+    local = lambda api_base: api_base.replace("host.docker.internal", "localhost")
+    # 'clave_cache' agrupa los prompts de la misma plantilla en la caché de prefijo del servidor.
+    opciones = esquemas_respuesta.opciones_salida_estructurada(config, esquema)
+    extra = {**opciones, **prefijo_prompt.opciones_cache(config, clave_cache)}
+    # Solo se cachea una respuesta completa ("stop") que cumpla el esquema.
+    fin = {}
+    cacheable = lambda texto: llm_cache.terminada_con_normalidad(fin.get("motivo")) and esquemas_respuesta.respuesta_valida(texto, esquema)
+    # Cliente compartido con conexión keep-alive; el enrutador elige backend y limita las peticiones en vuelo.
+    llamar = lambda api_base: cliente_llm.completar(prompt, config, local(api_base), 0.5, fin, **extra)
+    if enrutador_llm.endpoints_de(config):
+        generar = lambda: enrutador_llm.obtener_enrutador(config, log_message).ejecutar(llamar)
+    else:
+        generar = lambda: llamar("")
+    with trazas.span("llm", "orquestador", modelo=config.get("model_name"), prompt_caracteres=len(prompt)) as span:
+        # La clave usa el api_base original para compartir entradas con los agentes.
+        respuesta = llm_cache.respuesta_con_cache(config, 0.5, prompt, generar, opciones, cacheable)
+        span.anotar(respuesta_caracteres=len(respuesta or ""))
+    return respuesta
+
+async def get_llm_response_directo_async(prompt: str, config: dict, esquema: dict = None, clave_cache: str = None) -> str:
+    """Versión asyncio de get_llm_response_directo, para lanzar varias llamadas a la vez."""
+    return await cliente_llm.ejecutar_async(get_llm_response_directo, prompt, config, esquema, clave_cache)
+
+def plazo_de_mision(role: str, contexto: dict) -> float:
+    """Segundos que puede durar la misión de 'role' antes de matar su contenedor."""
+    return (contexto.get("plazos_mision") or {}).get(role) or AGENT_INFO.get(role, {}).get("plazo") or PLAZO_MISION_SEGUNDOS
+
+def opciones_cache_para_agente():
+    """Variables de entorno y volúmenes que dan acceso a la caché LLM a un contenedor de agente."""
+    cache = llm_cache.obtener_cache()
+    if not cache:
+        return {}, {}
+    environment = {"LLM_CACHE_DIR": AGENT_CACHE_MOUNT, "LLM_CACHE_MAX_MB": str(cache.max_bytes // (1024 * 1024))}
+    volumes = {os.path.abspath(cache.directorio): {"bind": AGENT_CACHE_MOUNT, "mode": "rw"}}
+    return environment, volumes
+
+def opciones_trazas_para_agente():
+    """Variables de entorno y volúmenes para que el agente escriba sus spans en el mismo trazas.jsonl."""
+    trazador = trazas.obtener()
+    if not trazador:
+        return {}, {}
+    return {"TRAZAS_DIR": AGENT_TRAZAS_MOUNT}, {os.path.abspath(trazador.directorio): {"bind": AGENT_TRAZAS_MOUNT, "mode": "rw"}}
 
 def leer_codigo_proyecto(path: str) -> str:
-    contenido_completo = ""
-    directorios_a_ignorar = {'.git', '__pycache__', 'docs', '.venv', 'node_modules'}
-    extensiones_relevantes = ('.py', '.js', '.html', '.css', '.json', '.md', 'requirements.txt', 'Dockerfile')
-    for root, dirs, files in os.walk(path):
-        dirs[:] = [d for d in dirs if d not in directorios_a_ignorar]
-        for file in files:
-            if file.endswith(extensiones_relevantes):
-                try:
-                    file_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(file_path, path)
-                    contenido_completo += f"\n\n{'='*20}\n--- FICHERO: {rel_path} ---\n{'='*20}\n\n"
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        contenido_completo += f.read()
-                except Exception: pass
-    return contenido_completo
+    # Snapshot incremental: solo se releen los ficheros modificados desde la última llamada.
+    return snapshot_proyecto.leer_snapshot(path)
 
 def limpiar_workspace(repo_local_path: str):
     """
@@ -92,6 +263,8 @@ def limpiar_workspace(repo_local_path: str):
                 os.remove(item_path)
         except Exception as e:
             log_message(f"No se pudo borrar {item_path}: {e}", "WARNING")
+    # Las etapas memoizadas apuntaban a ficheros que ya no están en disco.
+    memo_etapas.obtener_memo(MEMO_ETAPAS_DIR, os.path.basename(os.path.normpath(repo_local_path))).olvidar()
     log_message("Directorio local limpiado. Listo para una construcción desde cero.", "SUCCESS")
 
 def preparar_repositorio(config: dict, repo_local_path: str):
@@ -129,32 +302,48 @@ def preparar_repositorio(config: dict, repo_local_path: str):
         run_git_command(["git", "pull"], repo_local_path)
     return True
 
+def contexto_para_prompt(rol: str, contexto: dict) -> str:
+    """JSON compacto con solo las claves del contexto que el rol declara en AGENT_INFO."""
+    return contexto_agente.serializar(contexto_agente.proyectar(contexto, AGENT_INFO.get(rol, {}).get("contexto")))
+
+def segmentos_de_mision(rol: str, contexto: dict) -> tuple:
+    """
+    Lo que sigue a la plantilla del rol en el prompt de misión, de lo más estable
+    a lo más volátil: guías de estilo, instrucción de formato y el contexto de la
+    tarea (con la tarea concreta al final). Así misiones sucesivas del mismo rol
+    comparten un prefijo largo que el servidor LLM puede servir desde su caché.
+    """
+    estables, volatil = contexto_agente.separar_estables(contexto_agente.proyectar(contexto, AGENT_INFO.get(rol, {}).get("contexto")))
+    segmentos = []
+    for clave, texto in estables.items():
+        segmentos += [f"\n\n{clave}:\n", texto]
+    segmentos += ["\n", INSTRUCCION_FORMATO_FICHEROS, "\nCONTEXTO:\n", contexto_agente.serializar(volatil)]
+    return tuple(segmentos)
+
 def inyectar_guias_de_estilo(rol_agente: str, contexto: dict):
     """
     Lee las guías de estilo relevantes del directorio /resources y
     las añade al contexto de un agente según su rol.
     """
     guias = {}
+    registro = registro_prompts.obtener_registro(log_message)
     
     # La guía genérica se carga para casi todos los agentes clave.
     if rol_agente in ["arquitecto", "jefe_de_proyecto", "backend", "frontend"]:
         try:
-            with open("resources/generic_style_guide.md", 'r', encoding='utf-8') as f:
-                guias["GUIA_ESTILO_GENERICA"] = f.read()
+            guias["GUIA_ESTILO_GENERICA"] = registro.texto(GUIAS_DE_ESTILO["GUIA_ESTILO_GENERICA"])
         except FileNotFoundError:
-            log_message("Advertencia: No se encontró 'resources/generic_style_guide.md'.", "WARNING")
+            log_message(f"Advertencia: No se encontró '{GUIAS_DE_ESTILO['GUIA_ESTILO_GENERICA']}'.", "WARNING")
 
     # Las guías específicas se cargan solo para el rol correspondiente.
     if rol_agente == "backend":
         try:
-            with open("resources/backend_style_guide.md", 'r', encoding='utf-8') as f:
-                guias["GUIA_ESTILO_BACKEND"] = f.read()
+            guias["GUIA_ESTILO_BACKEND"] = registro.texto(GUIAS_DE_ESTILO["GUIA_ESTILO_BACKEND"])
         except FileNotFoundError: pass # No es un error si no existe
 
     if rol_agente == "frontend":
         try:
-            with open("resources/frontend_style_guide.md", 'r', encoding='utf-8') as f:
-                guias["GUIA_ESTILO_FRONTEND"] = f.read()
+            guias["GUIA_ESTILO_FRONTEND"] = registro.texto(GUIAS_DE_ESTILO["GUIA_ESTILO_FRONTEND"])
         except FileNotFoundError: pass
 
     if guias:
@@ -207,13 +396,11 @@ module.exports = defineConfig({
             **contexto_global,
             "tarea_especifica": "Generar un test de Cypress. Tareas:\n- " + "\n- ".join(tareas)
         }
-        prompt_path = AGENT_INFO['e2e']['prompt']
-        with open(prompt_path, 'r', encoding='utf-8') as f:
-            prompt_template = f.read()
-        prompt_final = f"{prompt_template}\n\nCONTEXTO:\n{json.dumps(contexto_e2e, indent=2)}"
+        prompt_final = registro_prompts.obtener_registro(log_message).renderizar(
+            AGENT_INFO['e2e']['prompt'], anexos=("\n\nCONTEXTO:\n", contexto_para_prompt('e2e', contexto_e2e)))
         
         log_message("   - [E2E-Tester] Solicitando generación del código del test al LLM...", "INFO")
-        test_code = get_llm_response_directo(prompt_final, contexto_global.get("llm_config"))
+        test_code = get_llm_response_directo(prompt_final, contexto_global.get("llm_config"), clave_cache="e2e")
         test_code = re.sub(r'^```(?:javascript)?\n|\n```$', '', test_code).strip()
 
         # Guardar el fichero de test
@@ -225,11 +412,8 @@ module.exports = defineConfig({
             f.write(test_code)
         log_message(f"   ✅ Fichero de test E2E guardado en: {output_path}")
 
-        # Sincronizar con GitHub
-        run_git_command(["git", "add", "."], repo_local_path)
-        run_git_command(["git", "commit", "-m", "Agente [E2E-Tester]: Genera ficheros de prueba"], repo_local_path)
-        run_git_command(["git", "push"], repo_local_path)
-        run_git_command(["git", "pull"], repo_local_path)
+        # Commit local; el push se agrupa en la sesión Git de la tarea.
+        obtener_sesion_git(repo_local_path).commit_etapa("Agente [E2E-Tester]: Genera ficheros de prueba")
         return True
     except Exception as e:
         log_message(f"   - ❌ Fallo crítico en la etapa E2E-DEV: {e}", "FATAL")
@@ -237,23 +421,22 @@ module.exports = defineConfig({
     
 def ejecutar_etapa_e2e_qa(repo_local_path, contexto_global):
     log_message("--- 🧪 Iniciando Etapa de Pruebas End-to-End (E2E) ---", "SYSTEM")
-    server_process = None
     try:
         # --- PASO 1: El Orquestador crea los ficheros de configuración ---
         log_message("   - Creando ficheros de configuración para Cypress...", "SETUP")
         
-        # Plantilla para package.json
+        # Plantilla para package.json (solo se reescribe si cambia: su hash es la clave de la caché de node_modules)
         package_json_content = {
             "name": os.path.basename(repo_local_path),
             "version": "1.0.0",
             "scripts": { "cypress:run": "cypress run" },
             "devDependencies": { "cypress": "^13.0.0" }
         }
-        with open(os.path.join(repo_local_path, "package.json"), "w") as f:
-            json.dump(package_json_content, f, indent=2)
+        e2e_rapido.escribir_si_cambia(os.path.join(repo_local_path, "package.json"), json.dumps(package_json_content, indent=2))
 
         # --- ¡CONFIGURACIÓN CORREGIDA! ---
         # Plantilla para cypress.config.js que deshabilita el fichero de soporte.
+        # El baseUrl real de cada worker se pasa con --config.
         cypress_config_content = """
 const { defineConfig } = require('cypress');
 
@@ -267,21 +450,47 @@ module.exports = defineConfig({
   },
 });
 """
-        with open(os.path.join(repo_local_path, "cypress.config.js"), "w") as f:
-            f.write(cypress_config_content)
+        e2e_rapido.escribir_si_cambia(os.path.join(repo_local_path, "cypress.config.js"), cypress_config_content)
         
-        # --- PASO 2: Instalar dependencias de Cypress ---
-        log_message("   - Instalando dependencias de Node.js con 'npm install'...", "QA")
-        subprocess.run(["npm", "install"], cwd=repo_local_path, check=True, shell=(os.name == 'nt'))
-        
-        # --- PASO 3: Levantar el servidor Flask ---
-        log_message("   - Levantando el servidor Flask en segundo plano...", "INFO")
-        server_process = subprocess.Popen([sys.executable, "app.py"], cwd=repo_local_path)
-        time.sleep(5)
+        # --- PASO 2: Dependencias de Cypress desde la caché ---
+        directorio_cache = contexto_global.get("e2e_cache_dir", E2E_CACHE_DIR)
+        e2e_rapido.preparar_node_modules(repo_local_path, directorio_cache, log=log_message)
+        python_app = entornos_qa.obtener_cache().obtener(os.path.join(repo_local_path, "requirements.txt"), log=log_message)
+
+        # --- PASO 3 y 4: Un servidor Flask en un puerto libre por worker y specs repartidas ---
+        specs = e2e_rapido.listar_specs(repo_local_path)
+        if not specs:
+            log_message("   - No hay specs de Cypress en cypress/e2e. Marcando como exitoso.", "INFO")
+            return True
+        grupos = e2e_rapido.repartir_specs(specs, int(contexto_global.get("e2e_workers", 2)))
+        timeout_arranque = contexto_global.get("e2e_timeout_arranque", e2e_rapido.TIMEOUT_ARRANQUE_POR_DEFECTO)
+        log_message(f"   - Ejecutando {len(specs)} spec(s) de Cypress en {len(grupos)} worker(s)...", "QA")
 
-        # --- PASO 4: Ejecutar las pruebas de Cypress ---
-        log_message("   - Ejecutando Cypress...", "QA")
-        subprocess.run(["npx", "cypress", "run"], cwd=repo_local_path, check=True, shell=(os.name == 'nt'))
+        def ejecutar_worker(indice, grupo):
+            server_process = None
+            try:
+                with trazas.span("servidor", "arranque"):
+                    server_process, url = e2e_rapido.levantar_servidor(python_app, repo_local_path, timeout_arranque, log=log_message)
+                config_cypress = f"baseUrl={url},video=false,screenshotsFolder=cypress/screenshots/worker-{indice}"
+                with trazas.span("cypress", f"worker-{indice}", specs=len(grupo)) as span:
+                    resultado = subprocess.run(["npx", "cypress", "run", "--spec", ",".join(grupo), "--config", config_cypress],
+                                               cwd=repo_local_path, capture_output=True, text=True, encoding='utf-8',
+                                               env=e2e_rapido.entorno_node(directorio_cache), shell=(os.name == 'nt'))
+                    if resultado.returncode != 0: span.resultado = "fallo"
+                return resultado
+            finally:
+                if server_process:
+                    e2e_rapido.detener_servidor(server_process)
+
+        contexto_trazas = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=len(grupos)) as pool:
+            resultados = list(pool.map(lambda i, g: contexto_trazas.copy().run(ejecutar_worker, i, g), range(len(grupos)), grupos))
+
+        fallidos = [(grupo, r) for grupo, r in zip(grupos, resultados) if r.returncode != 0]
+        for grupo, r in fallidos:
+            log_message(f"   - Specs fallidas {grupo}:\n{(r.stdout or '')[-3000:]}{(r.stderr or '')[-1000:]}", "FAIL")
+        if fallidos:
+            raise RuntimeError(f"{len(fallidos)} de {len(grupos)} worker(s) de Cypress fallaron.")
 
         log_message("   - ✅ Pruebas E2E han pasado.", "SUCCESS")
         return True
@@ -289,10 +498,6 @@ module.exports = defineConfig({
     except Exception as e:
         log_message(f"   - ❌ Las pruebas E2E han fallado: {e}", "FAIL")
         return False
-    finally:
-        if server_process:
-            log_message("   - Deteniendo el servidor Flask.", "INFO")
-            server_process.terminate()
 
 def ejecutar_etapa_e2e_qa_old(repo_local_path, contexto_global):
     log_message("--- 🧪 Iniciando Etapa de Pruebas End-to-End (E2E) ---", "SYSTEM")
@@ -320,108 +525,128 @@ def ejecutar_etapa_e2e_qa_old(repo_local_path, contexto_global):
             log_message("   - Deteniendo el servidor Flask.", "INFO")
             server_process.terminate()
 
-def run_agent_mission(client, role: str, context: dict):
+def run_agent_mission(client, role: str, context: dict, repo_local_path: str = None):
     """
     Lanza un agente constructor en un contenedor Docker con un prompt robusto
     que fuerza un formato de salida JSON multi-archivo y multi-acción.
+    Si se pasa 'repo_local_path' y el modo volumen compartido está activo, el
+    agente escribe en ese checkout en lugar de clonar y hacer push.
     """
     log_message(f"🚀 Despachando Agente: {role.upper()}...")
     
-    prompt_path = AGENT_INFO[role]["prompt"]
-    with open(prompt_path, 'r', encoding='utf-8') as f: system_prompt = f.read()
-    
-    mission_prompt = f"{system_prompt}\n\nCONTEXTO:\n{json.dumps(context, indent=2)}"
-    
-    # --- ¡NUEVO PROMPT MULTI-ACCIÓN! ---
-    # Este prompt le enseña al agente a crear, actualizar y eliminar ficheros.
-    json_format_instruction = f"""
-Tu respuesta DEBE ser un único objeto JSON válido que describa una lista de operaciones de fichero.
-La estructura del JSON debe ser la siguiente:
-{{
-  "files": [
-    {{
-      "filename": "ruta/al/fichero_a_crear.py",
-      "action": "create_or_update",
-      "code": "..."
-    }},
-    {{
-      "filename": "fichero_a_eliminar.py",
-      "action": "delete"
-    }}
-  ]
-}}
-
-Donde "..." es el contenido completo del fichero que has generado.
-Para cada fichero, especifica la 'action': 'create_or_update' para crear o modificar, y 'delete' para eliminar.
-Si solo necesitas modificar un fichero, la lista 'files' contendrá un solo elemento.
-No incluyas ninguna otra explicación o texto fuera de este objeto JSON.
-"""
-    mission_prompt += json_format_instruction
-    # --- FIN DEL NUEVO PROMPT ---
+    # Plantilla del rol + guías + instrucción multi-acción + su parte del contexto, unidos de una vez.
+    mission_prompt = registro_prompts.obtener_registro(log_message).renderizar(AGENT_INFO[role]["prompt"], anexos=segmentos_de_mision(role, context))
+    llm_config = context.get("llm_config", {})
+    if llm_config.get("cache_prefijo"):
+        llm_config = {**llm_config, "clave_cache_prefijo": role} # Misiones del mismo rol, misma caché de prefijo.
 
     environment = {
-        "LLM_CONFIG": json.dumps(context.get("llm_config", {})),
+        "LLM_CONFIG": json.dumps(llm_config),
         "TASK_PROMPT": mission_prompt,
         "GIT_REPO_URL": context.get("github_repo"),
         "GITHUB_PAT": context.get("github_pat"),
     }
+    environment_cache, volumes = opciones_cache_para_agente()
+    environment.update(environment_cache)
+    if not POOL_AGENTES:
+        environment_trazas, volumes_trazas = opciones_trazas_para_agente()
+        environment.update(environment_trazas); volumes.update(volumes_trazas)
+    if repo_local_path and not usa_volumen_compartido(context):
+        # El agente clona desde GitHub: antes publicamos los commits locales pendientes (checkpoint).
+        obtener_sesion_git(repo_local_path).publicar_pendientes()
+    if repo_local_path and usa_volumen_compartido(context):
+        repo_en_contenedor = f"{AGENT_WORKSPACE_MOUNT}/{os.path.basename(repo_local_path)}"
+        environment["AGENT_REPO_DIR"] = repo_en_contenedor
+        volumes[repo_local_path] = {"bind": repo_en_contenedor, "mode": "rw"}
     
     container = None
-    try:
-        container = client.containers.run(
-            AGENT_IMAGE, 
-            environment=environment, 
-            detach=True
-        )
-        
-        result = container.wait()
-        log_output = container.logs().decode('utf-8')
-
-        os.makedirs("logs", exist_ok=True)
-        timestamp = time.strftime('%Y%m%d-%H%M%S')
-        log_filename = f"{timestamp}-{role}.log"
-        
-        if result['StatusCode'] != 0:
-            log_filename = log_filename.replace(".log", "-ERROR.log")
-            log_message(f"El agente '{role}' ha fallado. Guardando su log en 'logs/{log_filename}'", "ERROR")
-
-        with open(os.path.join("logs", log_filename), "w", encoding="utf-8") as f:
-            f.write(log_output)
-
-        if result['StatusCode'] != 0:   
-            raise Exception(f"El contenedor finalizó con error {result['StatusCode']}. Revisa el log: logs/{log_filename}")
-
-        log_message(f"✅ Misión del Agente {role.upper()} finalizada.", "SUCCESS")
-        return True
+    registro = None
+    reserva_llm = None
+    plazo = plazo_de_mision(role, context)
+    timestamp = time.strftime('%Y%m%d-%H%M%S')
+    # El proyecto forma parte del nombre para que misiones concurrentes del mismo rol no se pisen.
+    proyecto = context.get("github_project", "sin-proyecto")
+    eco = (lambda linea: log_message(f"[{role}] {linea}", "AGENT")) if SEGUIR_LOGS_AGENTES else None
+    with trazas.span("agente", role, prompt_caracteres=len(mission_prompt), prompt_tokens_estimados=registro_prompts.estimar_tokens(mission_prompt),
+                     pool=bool(POOL_AGENTES)) as span:
+        try:
+            environment.update(trazas.entorno_para_agente()) # El agente cuelga sus spans de este.
+            if len(enrutador_llm.endpoints_de(llm_config)) > 1:
+                # Con varios backends LLM, la misión cuenta como en vuelo en el elegido y el agente lo prueba primero.
+                reserva_llm = enrutador_llm.obtener_enrutador(llm_config, log_message).reservar()
+                environment["LLM_CONFIG"] = json.dumps(enrutador_llm.config_con_preferido(llm_config, reserva_llm.api_base))
+            if POOL_AGENTES:
+                # Modo pool: el contenedor ya está arrancado y con las librerías cargadas.
+                mission_id = f"pool{int(time.time() * 1000) % 100000}"
+                registro = logs_mision.RegistroMision(os.path.join(AGENT_LOGS_DIR, f"{timestamp}-{proyecto}-{role}-{mission_id}.log"), eco=eco)
+                with trazas.span("contenedor", "mision_pool"):
+                    try:
+                        result = POOL_AGENTES.ejecutar_mision(environment, timeout=plazo)
+                    except TimeoutError:
+                        result = {"StatusCode": logs_mision.CODIGO_PLAZO_AGOTADO, "logs": ""}
+                registro.escribir(result.get("logs", "").encode("utf-8"))
+            else:
+                with trazas.span("contenedor", "arranque"):
+                    container = client.containers.run(
+                        AGENT_IMAGE, 
+                        environment=environment, 
+                        volumes=volumes or None,
+                        detach=True
+                    )
+                mission_id = container.short_id
+                # La salida va a disco mientras el contenedor corre; en memoria solo quedan las últimas líneas.
+                registro = logs_mision.RegistroMision(os.path.join(AGENT_LOGS_DIR, f"{timestamp}-{proyecto}-{role}-{mission_id}.log"), eco=eco)
+                lector = logs_mision.seguir_logs(container, registro)
+                with trazas.span("contenedor", "espera", plazo=plazo):
+                    result = logs_mision.esperar(container, plazo) or {"StatusCode": logs_mision.CODIGO_PLAZO_AGOTADO}
+                with trazas.span("contenedor", "logs"):
+                    lector.join(timeout=30)
+            span.anotar(codigo_salida=result['StatusCode'], log_bytes=registro.bytes_totales)
+
+            if result['StatusCode'] == logs_mision.CODIGO_PLAZO_AGOTADO:
+                span.anotar(plazo_agotado=True)
+                log_message(f"⏰ El agente '{role}' superó su plazo de {plazo}s y se ha detenido. Últimas líneas:\n{registro.ultimas_lineas()}", "ERROR")
+            if result['StatusCode'] != 0:
+                ruta_log = registro.cerrar(registro.ruta[:-len(".log")] + "-ERROR.log")
+                log_message(f"El agente '{role}' ha fallado. Su log está en '{ruta_log}'", "ERROR")
+                raise Exception(f"El contenedor finalizó con error {result['StatusCode']}. Revisa el log: {ruta_log}")
+            registro.cerrar()
+
+            log_message(f"✅ Misión del Agente {role.upper()} finalizada.", "SUCCESS")
+            return True
         
-    except Exception as e:
-        log_message(f"ERROR FATAL al ejecutar el agente '{role}': {e}", "FATAL")
-        return False
-    finally:
-        if container:
-            try: container.remove()
-            except docker.errors.NotFound: pass
+        except Exception as e:
+            log_message(f"ERROR FATAL al ejecutar el agente '{role}': {e}", "FATAL")
+            span.resultado = "fallo"
+            return False
+        finally:
+            if reserva_llm: enrutador_llm.obtener_enrutador(llm_config).liberar(reserva_llm)
+            if registro: registro.cerrar()
+            if container:
+                with trazas.span("contenedor", "borrado"):
+                    try: container.remove()
+                    except docker.errors.NotFound: pass
 
 def run_jefe_de_proyecto_agent(contexto_global: dict, requisito: str, codigo_fallido: str, razon_fallo: str, plan_path: str, doc_content: str = ""):
     log_message("Despachando Agente [JEFE DE PROYECTO] para crear tarea de corrección...", "AGENT")
     try:
-        prompt_path = AGENT_INFO['jefe_de_proyecto']['prompt']
-        with open(prompt_path, 'r', encoding='utf-8') as f: prompt_template = f.read()
-        
-        prompt_final = prompt_template.replace("{REQUISITO}", requisito)
-        prompt_final = prompt_final.replace("{CODIGO_FALLIDO}", codigo_fallido)
-        prompt_final = prompt_final.replace("{RAZON_FALLO}", razon_fallo)
-        prompt_final = prompt_final.replace("{DOCUMENTACION_EXISTENTE}", doc_content)
-
-        respuesta_str = get_llm_response_directo(prompt_final, contexto_global.get("llm_config"))
+        prompt_final = registro_prompts.obtener_registro(log_message).renderizar(AGENT_INFO['jefe_de_proyecto']['prompt'], {
+            "REQUISITO": requisito, "CODIGO_FALLIDO": codigo_fallido,
+            "RAZON_FALLO": razon_fallo, "DOCUMENTACION_EXISTENTE": doc_content,
+        })
+
+        llm_config = contexto_global.get("llm_config")
+        esquema = esquemas_respuesta.ESQUEMA_JEFE_DE_PROYECTO
+        respuesta_str = get_llm_response_directo(prompt_final, llm_config, esquema, clave_cache="jefe_de_proyecto")
         log_message(f"Respuesta cruda del Jefe de Proyecto: {respuesta_str}", "DEBUG")
 
-        json_extraido = re.search(r'\{.*\}', respuesta_str, re.DOTALL).group(0)
-        respuesta_json = None
-        try:
-            respuesta_json = json.loads(json_extraido)
-        except json.JSONDecodeError:
-            respuesta_json = ast.literal_eval(json_extraido)
+        # Si la respuesta no cumple el esquema, se pide una reparación corta antes de rendirse.
+        respuesta_json = esquemas_respuesta.obtener_json_valido(
+            respuesta_str, esquema,
+            lambda prompt: get_llm_response_directo(prompt, {**llm_config, "cache": "bypass"}, esquema),
+            intentos=llm_config.get("reintentos_reparacion", esquemas_respuesta.REINTENTOS_REPARACION_POR_DEFECTO),
+            log=log_message,
+        )
 
         nuevo_objetivo = respuesta_json.get("nuevo_objetivo")
         if not nuevo_objetivo: raise ValueError("El Jefe de Proyecto no devolvió un 'nuevo_objetivo' válido.")
@@ -436,10 +661,15 @@ def run_jefe_de_proyecto_agent(contexto_global: dict, requisito: str, codigo_fal
         nueva_tarea_config.pop("fase_ejecucion", None)
 
         timestamp = time.strftime('%Y%m%d-%H%M%S')
-        nuevo_fichero_tarea = os.path.join(TASKS_DIR, f"T{timestamp}-FIX-{etapa_fallida}.json")
-        
-        with open(nuevo_fichero_tarea, 'w', encoding='utf-8') as f:
-            json.dump(nueva_tarea_config, f, indent=2, ensure_ascii=False)
+        # Con varios workers dos proyectos pueden fallar en el mismo segundo: evitamos colisiones de nombre.
+        with _lock_ficheros_tarea:
+            nuevo_fichero_tarea = os.path.join(TASKS_DIR, f"T{timestamp}-FIX-{etapa_fallida}.json")
+            sufijo = 1
+            while os.path.exists(nuevo_fichero_tarea):
+                nuevo_fichero_tarea = os.path.join(TASKS_DIR, f"T{timestamp}-{sufijo}-FIX-{etapa_fallida}.json")
+                sufijo += 1
+            with open(nuevo_fichero_tarea, 'w', encoding='utf-8') as f:
+                json.dump(nueva_tarea_config, f, indent=2, ensure_ascii=False)
             
         log_message(f"Nueva tarea de corrección generada en: {nuevo_fichero_tarea}", "SUCCESS")
         log_message(f"Objetivo de la nueva tarea: '{nuevo_objetivo}'", "INFO")
@@ -475,14 +705,17 @@ def ejecutar_etapa_documentacion_docker(client, contexto_global: dict, repo_path
         }
 
         # Usamos la función genérica run_agent_mission, que sabe cómo guardar ficheros.
-        if not run_agent_mission(client, "documentador", contexto_documentador):
+        if not run_agent_mission(client, "documentador", contexto_documentador, repo_path):
             log_message(f"El agente documentador para '{componente}' falló.", "ERROR")
             return False
         
-        # --- ¡NUEVA LÓGICA DE SINCRONIZACIÓN! ---
-        log_message(f"Sincronizando workspace tras la documentación de [{componente.upper()}]...", "GIT")
-        run_git_command(["git", "pull"], repo_path)
-        # --- FIN DE LA NUEVA LÓGICA ---
+        if usa_volumen_compartido(contexto_global):
+            obtener_sesion_git(repo_path).commit_etapa(f"Agente [Documentador]: Genera/actualiza documentación para {componente}")
+        else:
+            # --- ¡NUEVA LÓGICA DE SINCRONIZACIÓN! ---
+            log_message(f"Sincronizando workspace tras la documentación de [{componente.upper()}]...", "GIT")
+            obtener_sesion_git(repo_path).pull()
+            # --- FIN DE LA NUEVA LÓGICA ---
         
         log_message(f"Documentación para '{componente}' generada con éxito.", "SUCCESS")
         return True
@@ -513,16 +746,49 @@ def ejecutar_etapa_documentacion(client, context: dict, repo_path: str, componen
     except Exception as e:
         log_message(f"   - ❌ Error leyendo el código del proyecto: {e}"); return False
 
+    # La documentación generada no cuenta como entrada (si no, la huella cambiaría en cada ejecución).
+    salida_rel = "README.md" if componente == "full" else f"docs/{componente}_documentation.md"
+    clave_memo = "documentacion" if componente == "full" else f"{componente}-doc"
+    memo = memo_de_proyecto(context, repo_path)
+    if memo:
+        prefijo = "" if componente == "full" else f"{componente}/"
+        entradas = [(rel, contenido) for rel, contenido in snapshot_proyecto.obtener_indice(ruta_codigo).actualizar()
+                    if f"{prefijo}{rel}" != salida_rel and not f"{prefijo}{rel}".startswith("docs/")]
+        plantillas = [registro_prompts.obtener_registro(log_message).texto(AGENT_INFO[rol]["prompt"]) for rol in ("documentador", "resumidor")]
+        configuracion = memo_etapas.contexto_relevante({"llm_config": context.get("llm_config"), "doc_mapreduce": context.get("doc_mapreduce", "auto")})
+        huella = memo_etapas.huella(entradas, plantillas, configuracion)
+        if memo.vigente(clave_memo, huella, repo_path):
+            trazas.anotar(memoizada=True)
+            log_message(f"♻️ Documentación de [{componente.upper()}] sin cambios en el código ni en el prompt: cacheada, no se regenera.", "SUCCESS")
+            return True
+
     # --- Fase 2: Documentador ---
     log_message("   - [Documentador] Generando prompt para el LLM...")
     try:
-        prompt_path = AGENT_INFO['documentador']['prompt']
-        with open(prompt_path, 'r', encoding='utf-8') as f: prompt_template = f.read()
+        registro = registro_prompts.obtener_registro(log_message)
         
-        prompt_final = prompt_template.replace("{CONTEXTO_DEL_CODIGO}", codigo_del_proyecto)
+        modo_mapreduce = context.get("doc_mapreduce", "auto")
+        if modo_mapreduce == "siempre" or (modo_mapreduce == "auto" and len(codigo_del_proyecto) > UMBRAL_MAPREDUCE_CARACTERES):
+            log_message(f"   - [Documentador] Código grande: resumiendo fichero a fichero (map-reduce)...")
+            plantilla_resumen = registro.texto(AGENT_INFO['resumidor']['prompt'])
+            llm_config = context.get("llm_config") or {}
+            resumenes = documentacion_mapreduce.resumir_ficheros(
+                snapshot_proyecto.obtener_indice(ruta_codigo).actualizar(),
+                plantilla_resumen,
+                lambda prompt: get_llm_response_directo_async(prompt, llm_config, clave_cache="resumidor"),
+                model_name=llm_config.get("model_name"),
+                max_paralelo=context.get("doc_resumenes_en_paralelo", documentacion_mapreduce.MAX_RESUMENES_EN_PARALELO),
+                log=log_message,
+            )
+            contexto_del_codigo = documentacion_mapreduce.combinar_resumenes(resumenes)
+            log_message(f"   - [Documentador] ✅ {len(resumenes)} resúmenes combinados ({len(contexto_del_codigo)} caracteres).")
+        else:
+            contexto_del_codigo = codigo_del_proyecto
+
+        prompt_final = registro.renderizar(AGENT_INFO['documentador']['prompt'], {"CONTEXTO_DEL_CODIGO": contexto_del_codigo})
         
         log_message("   - [Documentador] Solicitando generación de la documentación al LLM...")
-        documentacion_md = get_llm_response_directo(prompt_final, context.get("llm_config"))
+        documentacion_md = get_llm_response_directo(prompt_final, context.get("llm_config"), clave_cache="documentador")
         
         documentacion_md = re.sub(r'^```(?:markdown)?\n', '', documentacion_md)
         documentacion_md = re.sub(r'\n```$', '', documentacion_md)
@@ -543,12 +809,12 @@ def ejecutar_etapa_documentacion(client, context: dict, repo_path: str, componen
         with open(output_path, "w", encoding="utf-8") as f: f.write(documentacion_md)
         log_message(f"   ✅ Documentación guardada en: {output_path}")
 
-        log_message("   - Guardando la nueva documentación en GitHub...")
+        log_message("   - Guardando la nueva documentación en Git...")
         git_add_path = os.path.relpath(output_path, repo_path)
-        run_git_command(["git", "add", git_add_path], repo_path)
-        run_git_command(["git", "commit", "-m", f"Agente [Documentador]: Genera/actualiza documentación para {componente}"], repo_path)
-        run_git_command(["git", "push"], repo_path)
-        log_message("   ✅ Documentación subida a GitHub.")
+        obtener_sesion_git(repo_path).commit_etapa(f"Agente [Documentador]: Genera/actualiza documentación para {componente}", [git_add_path])
+        if memo:
+            memo.registrar(clave_memo, huella, repo_path, None, salidas=[salida_rel])
+        log_message("   ✅ Documentación registrada (se publicará en el próximo checkpoint).")
         return True
     except Exception as e:
         log_message(f"   - ❌ Error guardando el fichero o haciendo commit: {e}"); return False
@@ -575,25 +841,75 @@ def ejecutar_etapa_construccion(client, etapa_info, repo_local_path, contexto_gl
             with open(doc_backend_path, 'r', encoding='utf-8') as f:
                 contexto_obrero["DOCUMENTACION_BACKEND"] = f.read()
 
-    if not run_agent_mission(client, rol_obrero, contexto_obrero):
+    # En correcciones (o si la tarea lo pide) el agente ve el código actual y puede devolver parches en vez de ficheros enteros.
+    if contexto_global.get("ediciones_incrementales", bool(contexto_global.get("plan_de_origen"))):
+        codigo_actual = leer_codigo_proyecto(repo_local_path)
+        if codigo_actual.strip():
+            log_message(f"Modo incremental: inyectando el código actual ({len(codigo_actual)} caracteres) para que [{etapa.upper()}] pueda parchear.", "INFO")
+            contexto_obrero["CODIGO_ACTUAL"] = codigo_actual
+
+    memo = memo_de_proyecto(contexto_global, repo_local_path)
+    if memo:
+        plantilla = registro_prompts.obtener_registro(log_message).texto(AGENT_INFO[rol_obrero]["prompt"])
+        huella = memo_etapas.huella(memo_etapas.contexto_relevante(contexto_obrero), plantilla)
+        if memo.vigente(f"{etapa}-dev", huella, repo_local_path):
+            trazas.anotar(memoizada=True)
+            log_message(f"♻️ Etapa [{etapa.upper()}-DEV] sin cambios en sus entradas ni en sus ficheros: cacheada, no se regenera.", "SUCCESS")
+            return True
+        arbol_antes = memo_etapas.arbol_actual(repo_local_path)
+
+    if not run_agent_mission(client, rol_obrero, contexto_obrero, repo_local_path):
         log_message(f"El agente constructor '{rol_obrero}' falló. Abortando construcción.", "ERROR")
         return False
 
-    log_message(f"Actualizando workspace tras la construcción de [{etapa.upper()}]...", "GIT")
-    run_git_command(["git", "pull"], repo_local_path)
-    run_git_command(["git", "add", "."], repo_local_path)
-    run_git_command(["git", "commit", "-m", f"Agente [{etapa.upper()}]: Completa la construcción de la etapa"], repo_local_path)
-    run_git_command(["git", "push"], repo_local_path)
-    
-
-    # --- ¡NUEVA LÓGICA DE SINCRONIZACIÓN! ---
-    log_message(f"Sincronizando workspace tras la construcción de [{etapa.upper()}]...", "GIT")
-    run_git_command(["git", "pull"], repo_local_path)
-    # --- FIN DE LA NUEVA LÓGICA ---
-
-    log_message(f"✅ Construcción de la etapa [{etapa.upper()}] finalizada y subida.", "SUCCESS")
+    sesion = obtener_sesion_git(repo_local_path)
+    if usa_volumen_compartido(contexto_global):
+        # El agente ya escribió en nuestro checkout: un único commit y push, sin pulls.
+        log_message(f"Guardando los cambios de [{etapa.upper()}] escritos en el volumen compartido...", "GIT")
+        sesion.commit_etapa(f"Agente [{etapa.upper()}]: Completa la construcción de la etapa")
+    else:
+        # El agente ya hizo push: basta un pull. El commit solo se crea si quedan cambios locales.
+        log_message(f"Actualizando workspace tras la construcción de [{etapa.upper()}]...", "GIT")
+        with sesion.lock:
+            sesion.pull()
+            sesion.commit_etapa(f"Agente [{etapa.upper()}]: Completa la construcción de la etapa")
+
+    if memo:
+        memo.registrar(f"{etapa}-dev", huella, repo_local_path, arbol_antes)
+    log_message(f"✅ Construcción de la etapa [{etapa.upper()}] finalizada.", "SUCCESS")
     return True
 
+def ejecutar_pytest_qa(python_qa: str, repo_local_path: str, contexto_global: dict) -> subprocess.CompletedProcess:
+    """
+    Con "qa_modo": "impacto" se ejecutan primero solo los tests afectados
+    por los cambios; si fallan se devuelve ya ese resultado para que el Jefe de
+    Proyecto actúe antes. Si pasan, la suite completa confirma (salvo
+    "qa_confirmacion_completa": false). En modo "completo" solo se hace esto último.
+    Con "qa_shards": N los tests se reparten en N procesos; por defecto, un único pytest.
+    """
+    with trazas.span("pytest", contexto_global.get("qa_modo", "completo")) as span:
+        resultado = _ejecutar_pytest_qa(python_qa, repo_local_path, contexto_global)
+        if resultado.returncode != 0: span.resultado = "fallo"
+    return resultado
+
+def _ejecutar_pytest_qa(python_qa: str, repo_local_path: str, contexto_global: dict) -> subprocess.CompletedProcess:
+    shards = contexto_global.get("qa_shards") or 1  # Repartir en varios procesos es opt-in: la suite puede no ser paralelizable.
+    if contexto_global.get("qa_modo") == "impacto":
+        tests, base = impacto_tests.seleccionar_tests(repo_local_path)
+        if tests:
+            log_message(f"QA por impacto ({base}): {len(tests)} fichero(s) de test afectados.", "QA")
+            resultado = impacto_tests.ejecutar_pytest(python_qa, repo_local_path, tests, shards)
+            fallo = resultado.returncode not in (0, impacto_tests.SIN_TESTS)
+            if fallo or not contexto_global.get("qa_confirmacion_completa", True):
+                impacto_tests.registrar_resultado(repo_local_path, resultado, suite_completa=False)
+                return resultado
+            log_message("Tests afectados en verde. Ejecutando la suite completa como confirmación...", "QA")
+        else:
+            log_message(f"QA por impacto ({base}): sin tests afectados identificables, se ejecuta la suite completa.", "QA")
+    resultado = impacto_tests.ejecutar_pytest(python_qa, repo_local_path, None, shards)
+    impacto_tests.registrar_resultado(repo_local_path, resultado, suite_completa=True)
+    return resultado
+
 def ejecutar_etapa_qa(client, etapa_info, repo_local_path, contexto_global, no_qa, plan_path):
     """
     Ejecuta la fase de QA. Si falla, busca la documentación específica del componente
@@ -606,28 +922,32 @@ def ejecutar_etapa_qa(client, etapa_info, repo_local_path, contexto_global, no_q
     etapa = etapa_info.get("etapa") # ej: "backend"
     log_message(f"--- 🧐 Fase de QA para la Etapa [{etapa.upper()}] ---", "STAGE")
     
-    try:
-        codigo_actual = leer_codigo_proyecto(repo_local_path)
-    except Exception as e:
-        log_message(f"ERROR CRÍTICO: No se pudo leer el código del proyecto para QA: {e}", "FATAL")
-        return False
-
     if etapa == "backend":
-        requirements_path = os.path.join(repo_local_path, "requirements.txt")
-        if os.path.exists(requirements_path):
-            log_message("Fichero 'requirements.txt' encontrado. Instalando dependencias...", "SYSTEM")
+        # Pytest corre sobre una instantánea de HEAD: las etapas en paralelo pueden seguir escribiendo en el checkout.
+        with obtener_sesion_git(repo_local_path).instantanea() as copia_qa:
+            try:
+                codigo_actual = leer_codigo_proyecto(copia_qa)
+            except Exception as e:
+                log_message(f"ERROR CRÍTICO: No se pudo leer el código del proyecto para QA: {e}", "FATAL")
+                return False
+            finally:
+                snapshot_proyecto.olvidar_indice(copia_qa) # La instantánea se borra al salir: su índice no se reutiliza.
+
+            requirements_path = os.path.join(copia_qa, "requirements.txt")
+            if not os.path.exists(requirements_path):
+                log_message("Advertencia: No se encontró 'requirements.txt' para la etapa de backend.", "WARNING")
             try:
-                subprocess.run([sys.executable, "-m", "pip", "install", "-r", requirements_path], check=True, capture_output=True, text=True)
-                log_message("Dependencias instaladas correctamente.", "SUCCESS")
+                # Venv propio por hash de requirements: no ensucia el intérprete del orquestador y se reutiliza entre tareas.
+                python_qa = entornos_qa.obtener_cache().obtener(requirements_path, log=log_message)
             except subprocess.CalledProcessError as e:
                 log_message(f"Fallo al instalar dependencias: {e.stderr}", "FATAL")
                 return False
-        else:
-            log_message("Advertencia: No se encontró 'requirements.txt' para la etapa de backend.", "WARNING")
 
-        try:
             log_message(f"Ejecutando pruebas unitarias para [{etapa.upper()}] con pytest...", "QA")
-            resultado_tests = subprocess.run(["pytest"], cwd=repo_local_path, check=True, capture_output=True, text=True, encoding='utf-8')
+            resultado_tests = ejecutar_pytest_qa(python_qa, copia_qa, contexto_global)
+
+        try:
+            resultado_tests.check_returncode()
             log_message(f"Todas las pruebas para [{etapa.upper()}] han pasado.", "SUCCESS")
             return True
         except subprocess.CalledProcessError as e:
@@ -638,7 +958,8 @@ def ejecutar_etapa_qa(client, etapa_info, repo_local_path, contexto_global, no_q
             log_message(f"Las pruebas para [{etapa.upper()}] han fallado.", "FAIL")
             razon_fallo = f"PYTEST FALLÓ:\n--- STDOUT ---\n{e.stdout}\n--- STDERR ---\n{e.stderr}"
             
-            contexto_global["etapa_actual"] = etapa
+            # Copia local: con etapas en paralelo el contexto global lo comparten varias etapas.
+            contexto_global = {**contexto_global, "etapa_actual": etapa}
             requisito_completo = f"Corregir la etapa de '{etapa}' que falló las pruebas de QA."
             
             # --- ¡NUEVA LÓGICA! Buscar y cargar la documentación específica del componente ---
@@ -662,131 +983,466 @@ def ejecutar_etapa_qa(client, etapa_info, repo_local_path, contexto_global, no_q
         return True
 
     
-def main(args):
-    log_message("🧠 Orquestador V12 (Workflows por Etapas): Iniciando colmena...", "SYSTEM")
-    client = docker.from_env()
-    os.makedirs(PROCESSED_TASKS_DIR, exist_ok=True)
-    os.makedirs(FAILED_TASKS_DIR, exist_ok=True)
-    os.makedirs(PLANS_DIR, exist_ok=True)
-
-    while True:
-        task_files = sorted([f for f in os.listdir(TASKS_DIR) if f.endswith('.json')])
+def ejecutar_etapa(client, etapa_actual: str, estado: dict, args) -> bool:
+    """
+    Ejecuta una única etapa del workflow. 'estado' guarda lo que comparten las
+    etapas de una tarea (contexto, ruta del repo, plan). Devuelve True si tuvo éxito.
+    """
+    log_message(f"--- Ejecutando Etapa: [{etapa_actual.upper()}] ---", "SYSTEM")
+    contexto_global = estado["contexto_global"]
+    repo_local_path = estado["repo_local_path"]
+    plan, plan_path = estado["plan"], estado["plan_path"]
+    current_task_file = estado["task_file"]
+
+    if etapa_actual == "planificacion":
+        limpiar_workspace(repo_local_path)
+        contexto_arquitecto = { **contexto_global, "tarea_especifica": "Generar plan de construcción." }
+        if not run_agent_mission(client, "arquitecto", contexto_arquitecto, repo_local_path):
+            return False
         
-        if not task_files:
-            log_message("No hay más tareas en la cola. La Colmena finaliza su trabajo.", "SYSTEM")
-            break
-
-        current_task_file = task_files[0]
-        task_path = os.path.join(TASKS_DIR, current_task_file)
-        log_message(f"--- 📬 Nueva Tarea Encontrada: {current_task_file} ---", "TASK")
+        if not usa_volumen_compartido(contexto_global):
+            obtener_sesion_git(repo_local_path).pull()
+        plan_original_path = os.path.join(repo_local_path, "plan_construccion.json")
+        if os.path.exists(plan_original_path):
+            nombre_base_tarea = os.path.splitext(current_task_file)[0]
+            nuevo_nombre_plan = f"{nombre_base_tarea}_plan_construccion.json"
+            plan_path = os.path.join(PLANS_DIR, nuevo_nombre_plan)
+            shutil.move(plan_original_path, plan_path)
+            # Recargamos el plan por si se usa en la misma ejecución
+            with open(plan_path, 'r', encoding='utf-8') as f: plan = json.load(f)
+            validar_plan(plan, plan_path)
+            estado["plan"], estado["plan_path"] = plan, plan_path
+        else:
+            raise FileNotFoundError("El arquitecto no generó 'plan_construccion.json'.")
+    
+    elif etapa_actual.endswith(("-dev")): # MODIFICADO para unificar
+        componente, fase = etapa_actual.split('-')
+        etapa_info = next((e for e in plan.get('plan', []) if e.get("etapa") == componente), None)
+        if not etapa_info: raise ValueError(f"No se encontró la etapa '{componente}' en el plan.")
         
-        exito_mision = True
+        if componente == 'e2e':
+            if not ejecutar_etapa_e2e_dev(client, etapa_info, repo_local_path, contexto_global): return False
+        else: # Para backend y frontend, usamos la función estándar
+            if not ejecutar_etapa_construccion(client, etapa_info, repo_local_path, contexto_global): return False
+    
+    elif etapa_actual.endswith(("-qa")):
+        # ... (código sin cambios)
+        if etapa_actual == "e2e-qa":
+            if not ejecutar_etapa_e2e_qa(repo_local_path, contexto_global): return False
+        else:
+            componente, fase = etapa_actual.split('-')
+            etapa_info = next((e for e in plan.get('plan', []) if e.get("etapa") == componente), None)
+            if not etapa_info: raise ValueError(f"No se encontró la etapa '{componente}' en el plan.")
+            if not ejecutar_etapa_qa(client, etapa_info, repo_local_path, contexto_global, args.no_qa, plan_path): return False
+        # --- FIN DE LA LÓGICA MODIFICADA ---
+    elif etapa_actual.endswith("-doc"):
+        componente = etapa_actual.split('-')[0]
+        if not ejecutar_etapa_documentacion(client, contexto_global, repo_local_path, componente):
+            return False
+    
+    elif etapa_actual == "documentacion":
+        if not ejecutar_etapa_documentacion(client, contexto_global, repo_local_path, "full"):
+            return False
+
+    else:
+        log_message(f"Etapa desconocida: '{etapa_actual}'. Saltando.", "WARNING")
+    return True
+
+def ejecutar_workflow(client, etapas_a_ejecutar: list, estado: dict, args, paralelismo: int = 1) -> bool:
+    """
+    Ejecuta las etapas en orden (paralelismo 1) o como grafo de dependencias,
+    lanzando a la vez las etapas independientes. Cada 'planificacion' parte el
+    workflow en tramos, porque las dependencias declaradas en el plan solo se
+    conocen después de generarlo.
+    """
+    checkpoints = estado.get("checkpoints")
+    def ejecutar_y_registrar(etapa):
+        with trazas.span("etapa", etapa) as span:
+            if not ejecutar_etapa(client, etapa, estado, args):
+                span.resultado = "fallo"
+                return False
+        if checkpoints:
+            checkpoints.registrar(etapa, commit_actual(estado["repo_local_path"]))
+        return True
+
+    if paralelismo <= 1:
+        return all(ejecutar_y_registrar(etapa) for etapa in etapas_a_ejecutar)
+
+    # Los hilos de las etapas heredan el prefijo y el fichero de log de la tarea.
+    tarea, log_file = getattr(_contexto_hilo, "tarea", None), getattr(_contexto_hilo, "log_file", None)
+    contexto_trazas = contextvars.copy_context()
+    def ejecutar_en_hilo(etapa):
+        _contexto_hilo.tarea, _contexto_hilo.log_file = tarea, log_file
         try:
-            with open(task_path, 'r', encoding='utf-8') as f: config = json.load(f)
-            
-            project_name = config.get("github_project")
-            if not project_name: raise ValueError(f"La tarea {current_task_file} no especifica un 'github_project'.")
+            return contexto_trazas.copy().run(ejecutar_y_registrar, etapa)
+        finally:
+            _contexto_hilo.tarea, _contexto_hilo.log_file = None, None
+
+    tramo = []
+    for etapa in etapas_a_ejecutar + [None]:
+        if etapa in ("planificacion", None):
+            if tramo:
+                dependencias = grafo_etapas.construir_dependencias(tramo, estado["plan"])
+                if not grafo_etapas.ejecutar_grafo(tramo, dependencias, ejecutar_en_hilo, paralelismo, log=lambda m: log_message(m, "SYSTEM")):
+                    return False
+                tramo = []
+            if etapa and not ejecutar_y_registrar(etapa):
+                return False
+        else:
+            tramo.append(etapa)
+    return True
 
-            workspace_dir = os.path.abspath(WORKSPACE_DIR_NAME)
-            repo_local_path = os.path.join(workspace_dir, project_name)
-            contexto_global = config.copy()
-            
-            etapas_a_ejecutar = contexto_global.get("etapas_a_ejecutar", [])
-            log_message(f"Workflow solicitado: {etapas_a_ejecutar}", "INFO")
+def commit_actual(repo_path: str) -> str:
+    with bloqueo_git(repo_path):
+        resultado = subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo_path, capture_output=True, text=True)
+    return resultado.stdout.strip()
 
-            preparar_repositorio(config, repo_local_path)
+def commit_presente(repo_path: str, commit: str) -> bool:
+    """¿Está 'commit' en la historia de HEAD? (Si se perdió, la etapa que lo produjo hay que repetirla.)"""
+    if not commit: return False
+    return subprocess.run(["git", "merge-base", "--is-ancestor", commit, "HEAD"], cwd=repo_path, capture_output=True).returncode == 0
 
-            plan_path = ""
-            plan = {}
-            
-            # --- ¡LÓGICA CORREGIDA! ---
-            # Cargamos el plan solo si el workflow NO empieza con la planificación.
-            if etapas_a_ejecutar and etapas_a_ejecutar[0] != "planificacion":
-                plan_de_origen = contexto_global.get("plan_de_origen")
-                if plan_de_origen:
-                    plan_path = os.path.join(PLANS_DIR, plan_de_origen)
-                else:
-                    nombre_base_tarea = os.path.splitext(current_task_file)[0]
-                    nombre_plan_a_buscar = f"{nombre_base_tarea.split('-FIX-')[0]}_plan_construccion.json"
-                    plan_path = os.path.join(PLANS_DIR, nombre_plan_a_buscar)
-                
-                if not os.path.exists(plan_path): raise FileNotFoundError(f"Se requiere un plan para este workflow, pero no se encontró en '{plan_path}'")
-                log_message(f"Usando plan de ejecución: '{plan_path}'", "INFO")
-                with open(plan_path, 'r', encoding='utf-8') as f: plan = json.load(f)
+def aplicar_checkpoints(checkpoints, etapas: list, repo_local_path: str, args, contexto_global: dict) -> list:
+    """
+    Devuelve las etapas que quedan por ejecutar según los checkpoints de la tarea
+    (con --no-resume, todas) o a partir de --from-stage / "reanudar_desde".
+    """
+    desde = contexto_global.get("reanudar_desde") or args.from_stage
+    if not args.resume and not desde:
+        checkpoints.conservar([])
+        return etapas
+    pendientes = checkpoints.pendientes(etapas, lambda commit: commit_presente(repo_local_path, commit), desde)
+    saltadas = etapas[:len(etapas) - len(pendientes)]
+    checkpoints.conservar(saltadas)
+    if saltadas:
+        log_message(f"Reanudando la tarea: se saltan las etapas ya completadas {saltadas}.", "SYSTEM")
+    return pendientes
+
+def validar_plan(plan: dict, plan_path: str):
+    errores = esquemas_respuesta.validar(plan, esquemas_respuesta.ESQUEMA_PLAN)
+    if errores: raise ValueError(f"El plan '{plan_path}' no cumple el esquema esperado: {errores[:3]}")
+
+def cerrar_sesion_git_de_tarea(repo_local_path: str):
+    sesion = sesion_git.cerrar_sesion(repo_local_path)
+    if sesion: log_message(sesion.resumen(), "GIT")
+
+def procesar_tarea(client, current_task_file: str, args):
+    """
+    Ejecuta el workflow completo de un fichero de tarea y lo archiva en
+    'processed' o 'failed' según el resultado. Devuelve True si tuvo éxito.
+    Todos los spans de la tarea se agrupan bajo su nombre y al final se
+    muestra la tabla de tiempos por etapa, llamada al LLM, contenedor, git...
+    """
+    tarea = os.path.splitext(current_task_file)[0]
+    trazador = trazas.obtener()
+    inicio_trazas = trazador.tamano_jsonl() if trazador else 0
+    with trazas.contexto_tarea(tarea):
+        with trazas.span("tarea", tarea) as span:
+            exito_mision = _procesar_tarea(client, current_task_file, args)
+            if not exito_mision: span.resultado = "fallo"
+        resumen = trazas.resumen_tarea(tarea, inicio_trazas)
+    if resumen:
+        log_message(f"Resumen de tiempos de '{current_task_file}':\n{resumen}", "SYSTEM")
+    return exito_mision
+
+def _procesar_tarea(client, current_task_file: str, args):
+    task_path = os.path.join(TASKS_DIR, current_task_file)
+    log_message(f"--- 📬 Nueva Tarea Encontrada: {current_task_file} ---", "TASK")
+    
+    exito_mision = True
+    repo_local_path = None
+    try:
+        with open(task_path, 'rb') as f: contenido_tarea = f.read()
+        config = json.loads(contenido_tarea.decode('utf-8'))
+        
+        project_name = config.get("github_project")
+        if not project_name: raise ValueError(f"La tarea {current_task_file} no especifica un 'github_project'.")
+
+        workspace_dir = os.path.abspath(WORKSPACE_DIR_NAME)
+        repo_local_path = os.path.join(workspace_dir, project_name)
+        contexto_global = config.copy()
+        # 'cache_llm' de la tarea ("bypass" / "refrescar") viaja dentro de llm_config para llegar también a los agentes.
+        modo_cache = contexto_global.get("cache_llm")
+        if modo_cache:
+            if modo_cache not in llm_cache.MODOS_VALIDOS: raise ValueError(f"'cache_llm' debe ser uno de {llm_cache.MODOS_VALIDOS}.")
+            contexto_global["llm_config"] = {**contexto_global.get("llm_config", {}), "cache": modo_cache}
+        contexto_global.setdefault("qa_modo", "impacto" if args.qa_impacto else "completo")
+        
+        etapas_a_ejecutar = contexto_global.get("etapas_a_ejecutar", [])
+        log_message(f"Workflow solicitado: {etapas_a_ejecutar}", "INFO")
 
-            for etapa_actual in etapas_a_ejecutar:
-                log_message(f"--- Ejecutando Etapa: [{etapa_actual.upper()}] ---", "SYSTEM")
-                
-                if etapa_actual == "planificacion":
-                    limpiar_workspace(repo_local_path)
-                    contexto_arquitecto = { **contexto_global, "tarea_especifica": "Generar plan de construcción." }
-                    if not run_agent_mission(client, "arquitecto", contexto_arquitecto):
-                        exito_mision = False; break
-                    
-                    run_git_command(["git", "pull"], repo_local_path)
-                    plan_original_path = os.path.join(repo_local_path, "plan_construccion.json")
-                    if os.path.exists(plan_original_path):
-                        nombre_base_tarea = os.path.splitext(current_task_file)[0]
-                        nuevo_nombre_plan = f"{nombre_base_tarea}_plan_construccion.json"
-                        plan_path = os.path.join(PLANS_DIR, nuevo_nombre_plan)
-                        shutil.move(plan_original_path, plan_path)
-                        # Recargamos el plan por si se usa en la misma ejecución
-                        with open(plan_path, 'r', encoding='utf-8') as f: plan = json.load(f)
-                    else:
-                        raise FileNotFoundError("El arquitecto no generó 'plan_construccion.json'.")
-                
-                elif etapa_actual.endswith(("-dev")): # MODIFICADO para unificar
-                    componente, fase = etapa_actual.split('-')
-                    etapa_info = next((e for e in plan.get('plan', []) if e.get("etapa") == componente), None)
-                    if not etapa_info: raise ValueError(f"No se encontró la etapa '{componente}' en el plan.")
-                    
-                    if componente == 'e2e':
-                        if not ejecutar_etapa_e2e_dev(client, etapa_info, repo_local_path, contexto_global): exito_mision = False; break
-                    else: # Para backend y frontend, usamos la función estándar
-                        if not ejecutar_etapa_construccion(client, etapa_info, repo_local_path, contexto_global): exito_mision = False; break
-                
-                elif etapa_actual.endswith(("-qa")):
-                    # ... (código sin cambios)
-                    if etapa_actual == "e2e-qa":
-                        if not ejecutar_etapa_e2e_qa(repo_local_path, contexto_global): exito_mision = False; break
-                    else:
-                        componente, fase = etapa_actual.split('-')
-                        etapa_info = next((e for e in plan.get('plan', []) if e.get("etapa") == componente), None)
-                        if not etapa_info: raise ValueError(f"No se encontró la etapa '{componente}' en el plan.")
-                        if not ejecutar_etapa_qa(client, etapa_info, repo_local_path, contexto_global, args.no_qa, plan_path): exito_mision = False; break
-                    # --- FIN DE LA LÓGICA MODIFICADA ---
-                elif etapa_actual.endswith("-doc"):
-                    componente = etapa_actual.split('-')[0]
-                    if not ejecutar_etapa_documentacion(client, contexto_global, repo_local_path, componente):
-                        exito_mision = False; break
-                
-                elif etapa_actual == "documentacion":
-                    if not ejecutar_etapa_documentacion(client, contexto_global, repo_local_path, "full"):
-                        exito_mision = False; break
- 
-                else:
-                    log_message(f"Etapa desconocida: '{etapa_actual}'. Saltando.", "WARNING")
-
-            if exito_mision: log_message("✅ Workflow completado con éxito.", "SUCCESS")
-                
-        except Exception as e:
-            exito_mision = False
-            log_message(f"Error fatal procesando la tarea {current_task_file}: {e}", "FATAL")
+        preparar_repositorio(config, repo_local_path)
+        sesion_git.iniciar_sesion(
+            repo_local_path, checkpoints=contexto_global.get("git_checkpoints", args.git_checkpoints),
+            lock=bloqueo_git(repo_local_path), log=log_message)
+
+        # Checkpoints de una ejecución anterior interrumpida: se retoma en la primera etapa pendiente.
+        checkpoints = estado_ejecucion.EstadoEjecucion.cargar(RUN_STATE_DIR, current_task_file, contenido_tarea, log=log_message)
+        etapas_a_ejecutar = aplicar_checkpoints(checkpoints, etapas_a_ejecutar, repo_local_path, args, contexto_global)
+
+        plan_path = ""
+        plan = {}
         
-        if os.path.exists(task_path):
-            if exito_mision:
-                log_message(f"Archivando tarea completada '{current_task_file}'...", "SYSTEM")
-                shutil.move(task_path, os.path.join(PROCESSED_TASKS_DIR, current_task_file))
+        # --- ¡LÓGICA CORREGIDA! ---
+        # Cargamos el plan solo si el workflow NO empieza con la planificación.
+        if etapas_a_ejecutar and etapas_a_ejecutar[0] != "planificacion":
+            plan_de_origen = contexto_global.get("plan_de_origen")
+            if plan_de_origen:
+                plan_path = os.path.join(PLANS_DIR, plan_de_origen)
             else:
-                log_message(f"Moviendo tarea fallida '{current_task_file}' a cuarentena...", "WARNING")
-                shutil.move(task_path, os.path.join(FAILED_TASKS_DIR, current_task_file))
+                nombre_base_tarea = os.path.splitext(current_task_file)[0]
+                nombre_plan_a_buscar = f"{nombre_base_tarea.split('-FIX-')[0]}_plan_construccion.json"
+                plan_path = os.path.join(PLANS_DIR, nombre_plan_a_buscar)
+            
+            if not os.path.exists(plan_path): raise FileNotFoundError(f"Se requiere un plan para este workflow, pero no se encontró en '{plan_path}'")
+            log_message(f"Usando plan de ejecución: '{plan_path}'", "INFO")
+            with open(plan_path, 'r', encoding='utf-8') as f: plan = json.load(f)
+            validar_plan(plan, plan_path)
+
+        estado = {
+            "contexto_global": contexto_global, "repo_local_path": repo_local_path,
+            "plan": plan, "plan_path": plan_path, "task_file": current_task_file,
+            "checkpoints": checkpoints,
+        }
+        paralelismo = int(contexto_global.get("paralelismo_etapas", args.paralelismo_etapas))
+        if paralelismo > 1 and usa_volumen_compartido(contexto_global):
+            # Con el volumen compartido los agentes escriben en este checkout y el commit de cada etapa
+            # recoge todo el árbol: se llevaría ficheros a medio escribir de otra etapa en curso.
+            log_message("Volumen compartido: las etapas se ejecutan en orden (sin paralelismo).", "WARNING")
+            paralelismo = 1
+        exito_mision = ejecutar_workflow(client, etapas_a_ejecutar, estado, args, paralelismo)
+        # Checkpoint final: un único push con todos los commits de la tarea.
+        cerrar_sesion_git_de_tarea(repo_local_path)
+
+        if exito_mision:
+            checkpoints.borrar()
+            log_message("✅ Workflow completado con éxito.", "SUCCESS")
+            
+    except Exception as e:
+        exito_mision = False
+        log_message(f"Error fatal procesando la tarea {current_task_file}: {e}", "FATAL")
+        if repo_local_path:
+            # Publicamos igualmente lo que las etapas completadas dejaron en local.
+            try: cerrar_sesion_git_de_tarea(repo_local_path)
+            except Exception as e_git: log_message(f"No se pudo publicar el trabajo parcial: {e_git}", "ERROR")
+    
+    if os.path.exists(task_path):
+        if exito_mision:
+            log_message(f"Archivando tarea completada '{current_task_file}'...", "SYSTEM")
+            shutil.move(task_path, os.path.join(PROCESSED_TASKS_DIR, current_task_file))
+        else:
+            log_message(f"Moviendo tarea fallida '{current_task_file}' a cuarentena...", "WARNING")
+            shutil.move(task_path, os.path.join(FAILED_TASKS_DIR, current_task_file))
+
+    log_message(f"Misión para '{current_task_file}' finalizada.", "TASK")
+    return exito_mision
+
+def leer_proyecto_de_tarea(task_file: str):
+    """Devuelve el 'github_project' de un fichero de tarea, o None si no se puede leer."""
+    try:
+        with open(os.path.join(TASKS_DIR, task_file), 'r', encoding='utf-8') as f:
+            return json.load(f).get("github_project")
+    except (OSError, ValueError):
+        return None
+
+def procesar_tarea_en_worker(client, task_file: str, args, lock_proyecto: threading.Lock = None):
+    """
+    Envoltorio de procesar_tarea para el pool: etiqueta los logs del hilo con el
+    nombre de la tarea, los duplica en logs_tareas/<tarea>.log y libera el lock
+    del proyecto al terminar (si lo hay; con la cola SQLite lo gestiona la cola).
+    """
+    os.makedirs(TASK_LOGS_DIR, exist_ok=True)
+    log_path = os.path.join(TASK_LOGS_DIR, task_file.replace(".json", ".log"))
+    try:
+        with open(log_path, "a", encoding="utf-8") as log_file:
+            _contexto_hilo.tarea = os.path.splitext(task_file)[0]
+            _contexto_hilo.log_file = log_file
+            try:
+                return procesar_tarea(client, task_file, args)
+            finally:
+                _contexto_hilo.tarea = None
+                _contexto_hilo.log_file = None
+    finally:
+        if lock_proyecto: lock_proyecto.release()
+
+def ejecutar_pool_de_tareas(client, args):
+    """
+    Procesa la cola con 'args.workers' hilos. Las tareas de proyectos distintos
+    corren en paralelo; las de un mismo proyecto se serializan con un lock por
+    proyecto y respetan el orden alfabético de la cola.
+    """
+    locks_por_proyecto = {}
+    en_vuelo = {}  # fichero de tarea -> future
+
+    with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="colmena") as pool:
+        while True:
+            for task_file, future in list(en_vuelo.items()):
+                if future.done():
+                    del en_vuelo[task_file]
+                    if future.exception():
+                        log_message(f"El worker de '{task_file}' terminó con una excepción: {future.exception()}", "FATAL")
+
+            task_files = sorted([f for f in os.listdir(TASKS_DIR) if f.endswith('.json')])
+            pendientes = [f for f in task_files if f not in en_vuelo]
+
+            if not pendientes and not en_vuelo:
+                log_message("No hay más tareas en la cola. La Colmena finaliza su trabajo.", "SYSTEM")
+                break
+
+            for task_file in pendientes:
+                if len(en_vuelo) >= args.workers: break
+                # Las tareas ilegibles o sin proyecto se despachan igualmente para que procesar_tarea las mande a 'failed'.
+                proyecto = leer_proyecto_de_tarea(task_file) or f"__tarea__{task_file}"
+                lock = locks_por_proyecto.setdefault(proyecto, threading.Lock())
+                if not lock.acquire(blocking=False):
+                    continue # Ya hay una tarea de este proyecto en curso.
+                log_message(f"Asignando '{task_file}' (proyecto '{proyecto}') a un worker.", "SYSTEM")
+                en_vuelo[task_file] = pool.submit(procesar_tarea_en_worker, client, task_file, args, lock)
+
+            if en_vuelo:
+                wait(list(en_vuelo.values()), timeout=POLL_INTERVAL_SECONDS, return_when=FIRST_COMPLETED)
+
+def ejecutar_cola_sqlite(client, args):
+    """
+    Consume la cola persistente de 'args.cola_sqlite' con 'args.workers' hilos.
+    tasks/*.json se ingiere en la cola (vigilando la carpeta con inotify cuando
+    es posible); varios procesos pueden compartir la misma base de datos.
+    """
+    cola = cola_tareas.ColaTareas(args.cola_sqlite, lease_segundos=args.lease_segundos)
+    vigilante = cola_tareas.VigilanteDirectorio(TASKS_DIR, sufijo=".json")
+    parar_latido = cola.iniciar_latido()
+    log_message(f"Cola SQLite '{args.cola_sqlite}' (worker {cola.propietario}, "
+                f"{'inotify' if vigilante.usa_inotify else 'sondeo'} sobre '{TASKS_DIR}').", "SYSTEM")
+
+    def al_terminar(task_file, future):
+        exito = not future.exception() and bool(future.result())
+        if future.exception():
+            log_message(f"El worker de '{task_file}' terminó con una excepción: {future.exception()}", "FATAL")
+        cola.completar(task_file, exito)
+        vigilante.despertar()
+
+    en_vuelo = {}
+    nombres = None  # None = listar la carpeta entera.
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="colmena") as pool:
+            while True:
+                for task_file in [t for t, f in en_vuelo.items() if f.done()]:
+                    del en_vuelo[task_file]
+                cola.ingerir(TASKS_DIR, leer_proyecto_de_tarea, nombres)
+
+                while len(en_vuelo) < args.workers:
+                    reservada = cola.reservar()
+                    if not reservada: break
+                    task_file, proyecto = reservada
+                    if not os.path.exists(os.path.join(TASKS_DIR, task_file)):
+                        cola.completar(task_file, False) # Otro proceso la archivó o alguien la borró.
+                        continue
+                    log_message(f"Asignando '{task_file}' (proyecto '{proyecto}') a un worker.", "SYSTEM")
+                    future = pool.submit(procesar_tarea_en_worker, client, task_file, args)
+                    en_vuelo[task_file] = future
+                    future.add_done_callback(lambda f, t=task_file: al_terminar(t, f))
+
+                if not en_vuelo and not args.vigilar and not cola.hay_trabajo():
+                    log_message("No hay más tareas en la cola. La Colmena finaliza su trabajo.", "SYSTEM")
+                    break
+                # Despierta con un fichero nuevo, al acabar una tarea o, como mucho, al caducar un lease ajeno.
+                nombres = vigilante.esperar(min(POLL_INTERVAL_SECONDS * 6, args.lease_segundos / 3))
+    finally:
+        parar_latido.set()
+        vigilante.cerrar()
+
+def main(args):
+    log_message("🧠 Orquestador V12 (Workflows por Etapas): Iniciando colmena...", "SYSTEM")
+    client = docker.from_env()
+    os.makedirs(PROCESSED_TASKS_DIR, exist_ok=True)
+    os.makedirs(FAILED_TASKS_DIR, exist_ok=True)
+    os.makedirs(PLANS_DIR, exist_ok=True)
 
-        log_message(f"Misión para '{current_task_file}' finalizada.", "TASK")
+    global POOL_AGENTES, MODO_VOLUMEN_COMPARTIDO, MEMOIZAR_ETAPAS, PLAZO_MISION_SEGUNDOS, SEGUIR_LOGS_AGENTES
+    MODO_VOLUMEN_COMPARTIDO = args.volumen_compartido
+    SEGUIR_LOGS_AGENTES = args.seguir_logs
+    if args.plazo_mision: PLAZO_MISION_SEGUNDOS = args.plazo_mision
+    MEMOIZAR_ETAPAS = not args.sin_memo_etapas
+    os.makedirs(WORKSPACE_DIR_NAME, exist_ok=True)
+    if not args.sin_cache_llm:
+        llm_cache.configurar_cache(args.cache_llm_dir, args.cache_llm_max_mb)
+        log_message(f"Caché de respuestas LLM activa en '{args.cache_llm_dir}' (máx. {args.cache_llm_max_mb} MB).", "SYSTEM")
+    entornos_qa.configurar_cache(args.cache_venvs_dir, args.max_venvs)
+    # Plantillas y guías se leen una vez; después solo se releen si cambian en disco.
+    registro_prompts.obtener_registro(log_message).precargar([info["prompt"] for info in AGENT_INFO.values()] + list(GUIAS_DE_ESTILO.values()))
+    if not args.sin_trazas:
+        trazas.configurar(args.trazas_dir)
+        log_message(f"Trazas en '{args.trazas_dir}/{trazas.FICHERO_TRAZAS}' y métricas en '{args.trazas_dir}/{trazas.FICHERO_PROMETHEUS}'.", "SYSTEM")
+    if args.pool_agentes > 0:
+        # En modo volumen compartido los contenedores del pool sirven a cualquier proyecto: montamos todo el workspace.
+        environment, volumes = opciones_cache_para_agente()
+        environment_trazas, volumes_trazas = opciones_trazas_para_agente()
+        environment.update(environment_trazas); volumes.update(volumes_trazas)
+        if args.volumen_compartido:
+            volumes[os.path.abspath(WORKSPACE_DIR_NAME)] = {"bind": AGENT_WORKSPACE_MOUNT, "mode": "rw"}
+        POOL_AGENTES = PoolDeAgentes(client, AGENT_IMAGE, tamano=args.pool_agentes, reciclar_tras=args.reciclar_tras, volumes=volumes or None, environment=environment)
+        POOL_AGENTES.iniciar()
 
+    try:
+        if args.cola_sqlite:
+            ejecutar_cola_sqlite(client, args)
+        elif args.workers > 1:
+            log_message(f"Modo concurrente: {args.workers} workers (un proyecto por worker a la vez).", "SYSTEM")
+            ejecutar_pool_de_tareas(client, args)
+        else:
+            while True:
+                task_files = sorted([f for f in os.listdir(TASKS_DIR) if f.endswith('.json')])
+                
+                if not task_files:
+                    log_message("No hay más tareas en la cola. La Colmena finaliza su trabajo.", "SYSTEM")
+                    break
+
+                procesar_tarea(client, task_files[0], args)
+    finally:
+        if POOL_AGENTES:
+            POOL_AGENTES.cerrar()
+            POOL_AGENTES = None
+
+    cliente_llm.cerrar_clientes()
+    if llm_cache.obtener_cache():
+        log_message(llm_cache.obtener_cache().resumen(), "SYSTEM")
+    log_message(entornos_qa.obtener_cache().resumen(), "SYSTEM")
+    if registro_prompts.obtener_registro().resumen():
+        log_message(f"Tamaño de los prompts renderizados:\n{registro_prompts.obtener_registro().resumen()}", "SYSTEM")
+    if enrutador_llm.resumen():
+        log_message(f"Backends LLM:\n{enrutador_llm.resumen()}", "SYSTEM")
+    if trazas.obtener():
+        trazas.obtener().cerrar()
     log_message("🏁 Colmena finalizada.", "SYSTEM")
     
-if __name__ == '__main__':
+def crear_parser() -> argparse.ArgumentParser:
+    """Opciones de la CLI; los benchmarks las reutilizan para lanzar main() con la misma configuración."""
     parser = argparse.ArgumentParser(description="Orquestador de la Colmena de Agentes IA V9 (Autónomo).")
     parser.add_argument("--no-qa", action="store_true", help="Desactiva el ciclo de QA para una ejecución rápida.")
-    args = parser.parse_args()
+    parser.add_argument("--workers", type=int, default=1, help="Número de tareas de proyectos distintos a procesar en paralelo.")
+    parser.add_argument("--cola-sqlite", nargs="?", const=COLA_SQLITE_PATH, default=None, help="Usa una cola persistente en SQLite con leases (compartible entre procesos y máquinas).")
+    parser.add_argument("--lease-segundos", type=int, default=cola_tareas.LEASE_POR_DEFECTO, help="Duración del lease de una tarea de la cola SQLite; se renueva con un latido.")
+    parser.add_argument("--vigilar", action="store_true", help="Con --cola-sqlite, no terminar al vaciarse la cola: seguir esperando tareas nuevas.")
+    parser.add_argument("--resume", action=argparse.BooleanOptionalAction, default=True, help="Retomar cada tarea desde su primera etapa no completada (--no-resume: desde el principio).")
+    parser.add_argument("--from-stage", default=None, help="Empezar el workflow en esta etapa, saltando las anteriores.")
+    parser.add_argument("--sin-memo-etapas", action="store_true", help="Regenera siempre las etapas -dev y -doc aunque sus entradas no hayan cambiado.")
+    parser.add_argument("--trazas-dir", default=TRAZAS_DIR, help="Directorio del fichero de trazas JSONL y del textfile de Prometheus.")
+    parser.add_argument("--sin-trazas", action="store_true", help="Desactiva las trazas y métricas.")
+    parser.add_argument("--plazo-mision", type=int, default=None, help=f"Segundos máximos de una misión de agente para los roles sin plazo propio (por defecto {PLAZO_MISION_SEGUNDOS}).")
+    parser.add_argument("--seguir-logs", action="store_true", help="Muestra en vivo la salida de los agentes mientras trabajan.")
+    parser.add_argument("--pool-agentes", type=int, default=0, help="Número de contenedores de agente precalentados (0 = un contenedor nuevo por misión).")
+    parser.add_argument("--volumen-compartido", action="store_true", help="Monta workspace/<proyecto> en el agente: sin clone/push en el contenedor ni pull en el orquestador.")
+    parser.add_argument("--cache-llm-dir", default=LLM_CACHE_DIR, help="Directorio de la caché persistente de respuestas del LLM.")
+    parser.add_argument("--cache-llm-max-mb", type=int, default=llm_cache.MAX_MB_POR_DEFECTO, help="Tamaño máximo de la caché LLM antes de desalojar por LRU.")
+    parser.add_argument("--sin-cache-llm", action="store_true", help="Desactiva la caché de respuestas del LLM.")
+    parser.add_argument("--cache-venvs-dir", default=entornos_qa.DIRECTORIO_POR_DEFECTO, help="Directorio de los virtualenvs cacheados para el QA de backend.")
+    parser.add_argument("--max-venvs", type=int, default=entornos_qa.MAX_ENTORNOS_POR_DEFECTO, help="Virtualenvs de QA que se conservan antes de desalojar por LRU.")
+    parser.add_argument("--qa-impacto", action="store_true", help="QA de backend por impacto: primero los tests afectados por los cambios, en paralelo, y luego la suite completa.")
+    parser.add_argument("--paralelismo-etapas", type=int, default=1, help="Etapas independientes de una misma tarea que pueden ejecutarse a la vez (1 = en orden). No aplica con --volumen-compartido.")
+    parser.add_argument("--git-checkpoints", choices=[sesion_git.CHECKPOINT_FINAL, sesion_git.CHECKPOINT_ETAPA], default=sesion_git.CHECKPOINT_FINAL, help="Cuándo hacer push: una vez al final de la tarea o tras cada etapa.")
+    parser.add_argument("--reciclar-tras", type=int, default=20, help="Misiones que atiende un contenedor del pool antes de reciclarse.")
+    return parser
+
+if __name__ == '__main__':
+    args = crear_parser().parse_args()
     main(args)
@@ -2,55 +2,347 @@
 import os
 import sys
 import json
-import re
+import time
 import subprocess
 import google.generativeai as genai
-import ast # <-- AÑADIR ESTA LÍNEA
+import llm_cache
+from llm_cache import respuesta_con_cache, stream_con_cache, obtener_cache
+from parser_files_incremental import ParserFilesIncremental
+import parches
+import esquemas_respuesta
+import trazas
+import enrutador_llm
+import prefijo_prompt
 
-def get_llm_response(prompt: str, config: dict) -> str:
+# Cada cuántos caracteres recibidos se informa del progreso del streaming.
+INTERVALO_PROGRESO = 4000
+# Intentos de push cuando otra etapa en paralelo publicó antes que este agente.
+INTENTOS_PUSH = 3
+
+def get_llm_response(prompt: str, config: dict, esquema: dict = None) -> str:
     """
     Obtiene una respuesta de un LLM, detectando si es una API de Google
-    o una compatible con OpenAI (como LM Studio).
-    """
-    api_base = config.get("api_base")
-
-    if api_base: # Si existe api_base, usamos el cliente de OpenAI
-        print("   - Detectado servidor local (OpenAI compatible). Conectando...")
-        from openai import OpenAI
-        client = OpenAI(base_url=api_base, api_key=config.get("api_key"))
-        
-        response = client.chat.completions.create(
-            model=config.get("model_name"),
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-        )
-        return response.choices[0].message.content
+    o una compatible con OpenAI (como LM Studio). Con 'esquema' y
+    "salida_estructurada" en la config, se pide salida JSON estructurada.
+    """
+    opciones = esquemas_respuesta.opciones_salida_estructurada(config, esquema)
+    extra = dict(opciones)
+    # Solo se cachea una respuesta completa ("stop") que cumpla el esquema.
+    fin = {}
+    cacheable = lambda texto: llm_cache.terminada_con_normalidad(fin.get("motivo")) and esquemas_respuesta.respuesta_valida(texto, esquema)
+
+    if enrutador_llm.endpoints_de(config): # Si hay api_base (uno o varios), usamos el cliente de OpenAI
+        extra.update(prefijo_prompt.opciones_cache(config))
+        def llamar(api_base):
+            print(f"   - Detectado servidor local (OpenAI compatible). Conectando a {api_base}...")
+            from openai import OpenAI
+            client = OpenAI(base_url=api_base, api_key=config.get("api_key"))
+            
+            response = client.chat.completions.create(
+                model=config.get("model_name"),
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.7,
+                **extra,
+            )
+            if getattr(response, "usage", None):
+                trazas.anotar(tokens_entrada=response.usage.prompt_tokens, tokens_salida=response.usage.completion_tokens,
+                              tokens_cacheados=prefijo_prompt.tokens_cacheados(response.usage))
+            fin["motivo"] = response.choices[0].finish_reason
+            return response.choices[0].message.content
+        generar = lambda: enrutador_llm.obtener_enrutador(config).ejecutar(llamar)
+        return respuesta_con_cache(config, 0.7, prompt, generar, opciones, cacheable)
     
     else: # Si no, usamos el cliente de Google Gemini
-        print("   - Detectado API de Google Gemini. Conectando...")
-        import google.generativeai as genai
-        genai.configure(api_key=config.get("api_key"))
-        model = genai.GenerativeModel(config.get("model_name"))
-        
-        response = model.generate_content(prompt)
-        return response.text
+        def generar():
+            print("   - Detectado API de Google Gemini. Conectando...")
+            import google.generativeai as genai
+            genai.configure(api_key=config.get("api_key"))
+            model = genai.GenerativeModel(config.get("model_name"))
+            
+            response = model.generate_content(prompt, **extra)
+            uso = getattr(response, "usage_metadata", None)
+            if uso:
+                trazas.anotar(tokens_entrada=uso.prompt_token_count, tokens_salida=uso.candidates_token_count)
+            if response.candidates: fin["motivo"] = response.candidates[0].finish_reason
+            return response.text
+        return respuesta_con_cache(config, None, prompt, generar, opciones, cacheable)
+
+def stream_llm_response(prompt: str, config: dict, esquema: dict = None):
+    """
+    Igual que get_llm_response pero devuelve un iterador con los trozos de la
+    respuesta a medida que el modelo los genera (OpenAI compatible y Gemini).
+    """
+    opciones = esquemas_respuesta.opciones_salida_estructurada(config, esquema)
+    extra = dict(opciones)
+    fin = {}
+    cacheable = lambda texto: llm_cache.terminada_con_normalidad(fin.get("motivo")) and esquemas_respuesta.respuesta_valida(texto, esquema)
+
+    if enrutador_llm.endpoints_de(config):
+        extra.update(prefijo_prompt.opciones_cache(config))
+        def llamar_stream(api_base):
+            print(f"   - Detectado servidor local (OpenAI compatible). Conectando en modo streaming a {api_base}...")
+            from openai import OpenAI
+            client = OpenAI(base_url=api_base, api_key=config.get("api_key"))
+            stream = client.chat.completions.create(
+                model=config.get("model_name"),
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.7,
+                stream=True,
+                **extra,
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    fin["motivo"] = chunk.choices[0].finish_reason
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        generar_stream = lambda: enrutador_llm.obtener_enrutador(config).ejecutar_stream(llamar_stream)
+        return stream_con_cache(config, 0.7, prompt, generar_stream, opciones, cacheable)
+
+    else:
+        def generar_stream():
+            print("   - Detectado API de Google Gemini. Conectando en modo streaming...")
+            import google.generativeai as genai
+            genai.configure(api_key=config.get("api_key"))
+            model = genai.GenerativeModel(config.get("model_name"))
+            for chunk in model.generate_content(prompt, stream=True, **extra):
+                if chunk.candidates and chunk.candidates[0].finish_reason:
+                    fin["motivo"] = chunk.candidates[0].finish_reason
+                if chunk.text:
+                    yield chunk.text
+        return stream_con_cache(config, None, prompt, generar_stream, opciones, cacheable)
+
+def escribir_fichero(repo_dir: str, file_info: dict) -> bool:
+    """
+    Aplica una entrada de 'files' sobre el repo: create_or_update, delete, patch
+    (diff unificado) o search_replace. Devuelve False si no trae 'filename' o
+    apunta fuera del repo. Lanza parches.ParcheNoAplicable si un parche no encaja.
+    """
+    filename = file_info.get('filename')
+    action = file_info.get('action', 'create_or_update')
+    code_content = file_info.get('code', '')
+    if not filename: return False
+
+    file_path = os.path.join(repo_dir, filename)
+    raiz = os.path.realpath(repo_dir)
+    if os.path.commonpath([raiz, os.path.realpath(file_path)]) != raiz:
+        print(f"   - ⚠️  Se ignora '{filename}': está fuera del repositorio.")
+        return False
+
+    if action == "delete":
+        if os.path.isfile(file_path):
+            os.remove(file_path)
+            print(f"   - Archivo '{filename}' eliminado.")
+        else:
+            print(f"   - Archivo '{filename}' ya no existía; nada que eliminar.")
+        return True
+
+    if action in ("patch", "search_replace"):
+        contenido_actual = ""
+        if os.path.isfile(file_path):
+            with open(file_path, "r", encoding="utf-8") as f: contenido_actual = f.read()
+        if action == "patch":
+            content_to_write = parches.aplicar_diff(contenido_actual, file_info.get("diff", ""))
+        else:
+            content_to_write = parches.aplicar_reemplazos(contenido_actual, file_info.get("edits", []))
+    # Lógica de ensamblaje de código (esta parte ya la tenías bien)
+    elif isinstance(code_content, list):
+        content_to_write = "\n".join(code_content)
+    elif isinstance(code_content, dict):
+        content_to_write = json.dumps(code_content, indent=2, ensure_ascii=False)
+    else:
+        content_to_write = str(code_content)
+    
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w", encoding="utf-8") as f: f.write(content_to_write)
+    print(f"   - Archivo '{filename}' {'parcheado' if action in ('patch', 'search_replace') else 'guardado'} correctamente.")
+    return True
+
+def aplicar_entrada(repo_dir: str, file_info: dict, parches_fallidos: list):
+    """escribir_fichero() que, si un parche no encaja, lo aparta en 'parches_fallidos' para rehacerlo al final."""
+    try:
+        escribir_fichero(repo_dir, file_info)
+    except parches.ParcheNoAplicable as e:
+        print(f"   - ⚠️  El parche de '{file_info.get('filename')}' no se pudo aplicar ({e}); se pedirá el fichero completo.")
+        parches_fallidos.append(file_info)
+
+def _rehacer_parches_fallidos(parches_fallidos: list, llm_config: dict, repo_dir: str):
+    """
+    Pide en una sola llamada el contenido completo de los ficheros cuyo parche
+    no encajó, enseñando al LLM su contenido actual y el cambio que intentó.
+    """
+    secciones = []
+    for file_info in parches_fallidos:
+        ruta = os.path.join(repo_dir, file_info["filename"])
+        actual = ""
+        if os.path.isfile(ruta):
+            with open(ruta, "r", encoding="utf-8") as f: actual = f.read()
+        cambio = {k: v for k, v in file_info.items() if k in ("diff", "edits")}
+        secciones.append(f"FICHERO: {file_info['filename']}\nCONTENIDO ACTUAL:\n{actual}\n"
+                         f"CAMBIO QUE NO SE PUDO APLICAR:\n{json.dumps(cambio, ensure_ascii=False)}")
+    prompt = (
+        "Los siguientes cambios no se pudieron aplicar como parche sobre el contenido actual de sus ficheros. "
+        "Para cada fichero, devuelve su contenido COMPLETO con el cambio ya aplicado, como un objeto JSON "
+        '{"files": [{"filename": "...", "action": "create_or_update", "code": "..."}]}. '
+        "No incluyas ninguna otra explicación.\n\n" + "\n\n".join(secciones)
+    )
+    with trazas.span("llm", "parches_completos", prompt_caracteres=len(prompt), ficheros=len(parches_fallidos)):
+        respuesta = _pedir_reparacion(llm_config)(prompt)
+    for file_info in _obtener_files_validos(respuesta, llm_config):
+        try:
+            escribir_fichero(repo_dir, file_info)
+        except parches.ParcheNoAplicable as e:
+            print(f"   - ❌ '{file_info.get('filename')}' sigue sin poder aplicarse ({e}).")
+
+def _pedir_reparacion(llm_config: dict):
+    """Llamada corta y sin streaming para corregir una respuesta que no cumple el esquema."""
+    config_reparacion = {**llm_config, "streaming": False, "cache": "bypass"}
+    return lambda prompt: get_llm_response(prompt, config_reparacion, esquemas_respuesta.ESQUEMA_FILES)
+
+def _obtener_files_validos(texto: str, llm_config: dict) -> list:
+    payload = esquemas_respuesta.obtener_json_valido(
+        texto, esquemas_respuesta.ESQUEMA_FILES, _pedir_reparacion(llm_config),
+        intentos=llm_config.get("reintentos_reparacion", esquemas_respuesta.REINTENTOS_REPARACION_POR_DEFECTO),
+        validador=esquemas_respuesta.validar_payload_files,
+    )
+    return payload["files"]
+
+def generar_y_aplicar_ficheros(task_prompt: str, llm_config: dict, repo_dir: str) -> int:
+    """
+    Pide la respuesta al LLM y escribe cada fichero en cuanto llega. Con
+    llm_config["streaming"] = False se espera a la respuesta completa.
+    Las entradas que no cumplen el esquema se reparan con una llamada extra.
+    Devuelve el número de entradas de 'files' procesadas.
+    """
+    esquema = esquemas_respuesta.ESQUEMA_FILES
+    if not llm_config.get("streaming", True):
+        with trazas.span("llm", "respuesta", prompt_caracteres=len(task_prompt)) as span:
+            llm_response_text = get_llm_response(task_prompt, llm_config, esquema)
+            span.anotar(respuesta_caracteres=len(llm_response_text or ""))
+        print(f"   - Respuesta recibida del LLM.")
+        files_to_create = _obtener_files_validos(llm_response_text, llm_config)
+        parches_fallidos = []
+        for file_info in files_to_create: aplicar_entrada(repo_dir, file_info, parches_fallidos)
+        if parches_fallidos: _rehacer_parches_fallidos(parches_fallidos, llm_config, repo_dir)
+        return len(files_to_create)
+
+    parser = ParserFilesIncremental()
+    entradas_invalidas = []
+    parches_fallidos = []
+    siguiente_aviso = INTERVALO_PROGRESO
+    with trazas.span("llm", "stream", prompt_caracteres=len(task_prompt)) as span:
+        inicio = time.perf_counter()
+        for trozo in stream_llm_response(task_prompt, llm_config, esquema):
+            if "primer_trozo_s" not in span.atributos:
+                span.anotar(primer_trozo_s=round(time.perf_counter() - inicio, 3))
+            for file_info in parser.alimentar(trozo):
+                # Una entrada que no se pudo decodificar llega como texto: va a la reparación, el stream sigue.
+                errores = esquemas_respuesta.validar_entrada_files(file_info) if isinstance(file_info, dict) else ["no es un objeto JSON válido"]
+                if errores:
+                    print(f"   - ⚠️  Entrada de 'files' no válida, se reparará al final: {errores[0]}")
+                    entradas_invalidas.append(file_info)
+                else:
+                    aplicar_entrada(repo_dir, file_info, parches_fallidos)
+            if parser.caracteres_recibidos >= siguiente_aviso:
+                print(f"   - ... {parser.caracteres_recibidos} caracteres recibidos, {parser.ficheros_emitidos} fichero(s) escritos.", flush=True)
+                siguiente_aviso = parser.caracteres_recibidos + INTERVALO_PROGRESO
+        span.anotar(respuesta_caracteres=parser.caracteres_recibidos, ficheros=parser.ficheros_emitidos)
+    print(f"   - Respuesta recibida del LLM ({parser.caracteres_recibidos} caracteres).")
+
+    if parser.ficheros_emitidos == 0 and not parser.terminado:
+        # El formato no encajó con el parser incremental: parser completo + reparación.
+        print("   - El parser incremental no encontró ficheros. Usando el parser completo de respaldo...")
+        files_to_create = _obtener_files_validos(parser.texto_completo(), llm_config)
+        for file_info in files_to_create: aplicar_entrada(repo_dir, file_info, parches_fallidos)
+        if parches_fallidos: _rehacer_parches_fallidos(parches_fallidos, llm_config, repo_dir)
+        return len(files_to_create)
+    if not parser.terminado:
+        print("   - ⚠️  La lista 'files' no llegó a cerrarse: la respuesta del LLM parece truncada.")
+
+    if entradas_invalidas:
+        # Solo reenviamos las entradas defectuosas, no la respuesta entera.
+        reparadas = _obtener_files_validos(json.dumps({"files": entradas_invalidas}, ensure_ascii=False), llm_config)
+        for file_info in reparadas: aplicar_entrada(repo_dir, file_info, parches_fallidos)
+    if parches_fallidos:
+        _rehacer_parches_fallidos(parches_fallidos, llm_config, repo_dir)
+    return parser.ficheros_emitidos
 
 def run_command(command, cwd):
-    """Ejecuta un comando de terminal, ahora sin lanzar excepción en error de push."""
+    """Ejecuta un comando de terminal. Lanza CalledProcessError si falla."""
     print(f"▶️ Ejecutando: '{' '.join(command)}'")
     try:
         # Usamos encoding utf-8 para compatibilidad
-        result = subprocess.run(command, capture_output=True, text=True, cwd=cwd, check=True, encoding='utf-8')
+        with trazas.span(command[0], command[1] if len(command) > 1 else command[0]):
+            result = subprocess.run(command, capture_output=True, text=True, cwd=cwd, check=True, encoding='utf-8')
         if result.stdout: print(f"✅ Éxito:\n{result.stdout}")
         return result.stdout
     except subprocess.CalledProcessError as e:
-        # El error de "fetch first" en push no debe detener la misión si el commit se hizo.
         print(f"⚠️  ADVERTENCIA durante la ejecución del comando:\n{e.stderr}")
-        if "git push" in " ".join(command) and ("fetch first" in e.stderr or "pull" in e.stderr):
-             print("   - Se ignora el error de push por posible conflicto de concurrencia (lo resolverá el orquestador).")
-             return e.stderr
         raise e
 
+def publicar_commit(repo_dir: str):
+    """
+    Sube el commit de la misión. Si otra etapa en paralelo empujó antes, el push
+    se rechaza: se rebasa el commit sobre lo publicado y se reintenta. Un
+    conflicto real o agotar los intentos lanza la excepción (la misión falla).
+    """
+    for intento in range(1, INTENTOS_PUSH + 1):
+        try:
+            return run_command(["git", "push"], cwd=repo_dir)
+        except subprocess.CalledProcessError as e:
+            rechazado = "fetch first" in e.stderr or "non-fast-forward" in e.stderr
+            if not rechazado or intento == INTENTOS_PUSH:
+                raise
+            print(f"   - Push rechazado (intento {intento}/{INTENTOS_PUSH}): rebasando sobre el remoto...")
+            try:
+                run_command(["git", "pull", "--rebase"], cwd=repo_dir)
+            except subprocess.CalledProcessError:
+                subprocess.run(["git", "rebase", "--abort"], capture_output=True, cwd=repo_dir)
+                raise
+
+def preparar_repositorio_agente(git_repo_url: str, github_pat: str, repo_dir: str, reutilizar: bool = False):
+    """
+    Deja en 'repo_dir' una copia actualizada del repositorio. Si 'reutilizar' es True
+    y el clon ya existe (modo pool), se sincroniza con fetch + reset en lugar de clonar.
+    """
+    auth_url = git_repo_url.replace("https://", f"https://{github_pat}@")
+    if reutilizar and os.path.isdir(os.path.join(repo_dir, ".git")):
+        run_command(["git", "remote", "set-url", "origin", auth_url], cwd=repo_dir)
+        run_command(["git", "fetch", "origin"], cwd=repo_dir)
+        run_command(["git", "reset", "--hard", "@{u}"], cwd=repo_dir)
+        run_command(["git", "clean", "-fd"], cwd=repo_dir)
+    else:
+        run_command(["git", "clone", auth_url, repo_dir], cwd=os.path.dirname(os.path.abspath(repo_dir)))
+    run_command(["git", "config", "user.email", "agente@colmena.ai"], cwd=repo_dir)
+    run_command(["git", "config", "user.name", "Agente Autónomo"], cwd=repo_dir)
+
+def ejecutar_mision(llm_config: dict, task_prompt: str, git_repo_url: str, github_pat: str, repo_dir: str, reutilizar_repo: bool = False, volumen_compartido: bool = False):
+    """
+    Ejecuta una misión completa: prepara el repo, pide el JSON de ficheros al LLM,
+    los escribe y sube el resultado. Lanza una excepción si algo falla.
+    Con 'volumen_compartido', 'repo_dir' es el checkout del orquestador montado en
+    el contenedor: no se clona ni se hace commit/push (lo hace el orquestador).
+    """
+    if volumen_compartido:
+        if not os.path.isdir(repo_dir):
+            raise ValueError(f"El volumen compartido '{repo_dir}' no está montado en el contenedor.")
+        print(f"   - Modo volumen compartido: escribiendo directamente en '{repo_dir}'.")
+    else:
+        preparar_repositorio_agente(git_repo_url, github_pat, repo_dir, reutilizar_repo)
+
+    print(f"\n   - Tarea para LLM...")
+    num_ficheros = generar_y_aplicar_ficheros(task_prompt, llm_config, repo_dir)
+    if obtener_cache(): print(f"   - {obtener_cache().resumen()}")
+
+    if volumen_compartido:
+        print(f"\n   - {num_ficheros} archivo(s) escritos en el volumen compartido. El orquestador hará el commit.")
+        return
+
+    print("\n   - Subiendo trabajo a GitHub...")
+    run_command(["git", "add", "."], cwd=repo_dir)
+    commit_message = f"Agente completa tarea generando {num_ficheros} archivo(s)"
+    run_command(["git", "commit", "-m", commit_message], cwd=repo_dir)
+    publicar_commit(repo_dir)
+
 def main():
     print("--- 🏁 AGENTE AUTÓNOMO (Multi-Archivo) INICIADO ---")
     
@@ -58,68 +350,12 @@ def main():
     task_prompt = os.environ.get("TASK_PROMPT")
     git_repo_url = os.environ.get("GIT_REPO_URL")
     github_pat = os.environ.get("GITHUB_PAT")
-    repo_dir = "repo_de_trabajo_agente"
+    repo_compartido = os.environ.get("AGENT_REPO_DIR")
+    repo_dir = repo_compartido or "repo_de_trabajo_agente"
     
     try:
-        auth_url = git_repo_url.replace("https://", f"https://{github_pat}@")
-        run_command(["git", "clone", auth_url, repo_dir], cwd="/app")
-        run_command(["git", "config", "user.email", "agente@colmena.ai"], cwd=repo_dir)
-        run_command(["git", "config", "user.name", "Agente Autónomo"], cwd=repo_dir)
-        
-        print(f"\n   - Tarea para LLM...")
-        llm_response_text = get_llm_response(task_prompt, llm_config)
-        print(f"   - Respuesta recibida del LLM.")
-
-        # --- INICIO DEL PARSER "TRADUCTOR UNIVERSAL" (VERSIÓN FINAL) ---
-        json_extraido_match = re.search(r'\{.*\}', llm_response_text, re.DOTALL)
-        if not json_extraido_match:
-            raise ValueError("Respuesta del LLM no contiene un bloque JSON identificable.")
-
-        json_extraido_str = json_extraido_match.group(0)
-        
-        respuesta_json = None
-        try:
-            # Intento 1: Parseo estricto de JSON (el ideal)
-            respuesta_json = json.loads(json_extraido_str)
-        except json.JSONDecodeError as e:
-            print(f"   - Fallo el parseo JSON estricto: {e}. Intentando parseo flexible con ast.literal_eval...")
-            try:
-                # Intento 2: Parseo flexible para diccionarios de Python (ej. comillas simples)
-                respuesta_json = ast.literal_eval(json_extraido_str)
-            except Exception as ast_error:
-                print(f"   - El parseo flexible también falló: {ast_error}")
-                raise ValueError("La respuesta del LLM no es ni JSON válido ni un diccionario de Python interpretable.")
-        # --- FIN DEL PARSER ---
-
-        files_to_create = respuesta_json.get("files")
-
-        if not isinstance(files_to_create, list):
-            raise ValueError("La respuesta JSON debe tener una clave 'files' que contenga una lista.")
-
-        for file_info in files_to_create:
-            filename = file_info.get('filename')
-            code_content = file_info.get('code', '')
-            if not filename: continue
-
-            # Lógica de ensamblaje de código (esta parte ya la tenías bien)
-            if isinstance(code_content, list):
-                content_to_write = "\n".join(code_content)
-            elif isinstance(code_content, dict):
-                content_to_write = json.dumps(code_content, indent=2, ensure_ascii=False)
-            else:
-                content_to_write = str(code_content)
-            
-            file_path = os.path.join(repo_dir, filename)
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, "w", encoding="utf-8") as f: f.write(content_to_write)
-            print(f"   - Archivo '{filename}' guardado correctamente.")
-
-        print("\n   - Subiendo trabajo a GitHub...")
-        run_command(["git", "add", "."], cwd=repo_dir)
-        commit_message = f"Agente completa tarea generando {len(files_to_create)} archivo(s)"
-        run_command(["git", "commit", "-m", commit_message], cwd=repo_dir)
-        run_command(["git", "push"], cwd=repo_dir)
-
+        with trazas.contexto_tarea(os.environ.get("TRAZA_TAREA"), os.environ.get("TRAZA_PADRE")), trazas.span("mision", "agente"):
+            ejecutar_mision(llm_config, task_prompt, git_repo_url, github_pat, repo_dir, volumen_compartido=bool(repo_compartido))
         print("\n🎉 ¡MISIÓN COMPLETADA CON ÉXITO!")
 
     except Exception as e:
@@ -127,4 +363,9 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if "--servir" in sys.argv:
+        # Modo pool: el contenedor queda vivo y recibe misiones por HTTP (ver agent_server.py).
+        from agent_server import servir
+        servir()
+    else:
+        main()
@@ -0,0 +1,115 @@
+# src/agent_server.py (Modo Pool: agente precalentado que recibe misiones por HTTP)
+import io
+import os
+import sys
+import json
+import collections
+import hashlib
+import contextlib
+import traceback
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import agent_runner
+import trazas
+
+PUERTO_POR_DEFECTO = 8000
+REPOS_DIR = "/app/repos"
+# Caracteres de log que se devuelven al orquestador; la salida completa sigue en 'docker logs'.
+MAX_LOGS_RESPUESTA = 1024 * 1024
+
+class _ColaAcotada:
+    """Buffer de texto que solo conserva los últimos 'maximo' caracteres."""
+    def __init__(self, maximo: int = MAX_LOGS_RESPUESTA):
+        self.maximo = maximo
+        self._trozos = collections.deque()
+        self._tamano = 0
+        self.omitidos = 0
+
+    def write(self, texto: str):
+        self._trozos.append(texto)
+        self._tamano += len(texto)
+        while self._tamano > self.maximo and len(self._trozos) > 1:
+            descartado = self._trozos.popleft()
+            self._tamano -= len(descartado)
+            self.omitidos += len(descartado)
+
+    def getvalue(self) -> str:
+        cabecera = f"[... {self.omitidos} caracteres anteriores omitidos ...]\n" if self.omitidos else ""
+        return cabecera + "".join(self._trozos)
+
+class _EscritorDoble(io.TextIOBase):
+    """Escribe a la vez en el buffer de la misión y en la salida real del contenedor."""
+    def __init__(self, buffer, original):
+        self.buffer_mision = buffer
+        self.original = original
+
+    def write(self, texto):
+        self.buffer_mision.write(texto)
+        self.original.write(texto)
+        return len(texto)
+
+    def flush(self):
+        self.original.flush()
+
+class ManejadorMisiones(BaseHTTPRequestHandler):
+    misiones_completadas = 0
+
+    def _responder(self, codigo: int, cuerpo: dict):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        if self.path == "/salud":
+            self._responder(200, {"estado": "ok", "misiones": ManejadorMisiones.misiones_completadas})
+        else:
+            self._responder(404, {"error": "ruta desconocida"})
+
+    def do_POST(self):
+        if self.path != "/mision":
+            self._responder(404, {"error": "ruta desconocida"}); return
+
+        longitud = int(self.headers.get("Content-Length", 0))
+        mision = json.loads(self.rfile.read(longitud).decode("utf-8"))
+
+        # Un clon por repositorio: las misiones siguientes solo hacen fetch + reset.
+        # En modo volumen compartido se usa el checkout montado del orquestador.
+        git_repo_url = mision.get("GIT_REPO_URL") or ""
+        repo_compartido = mision.get("AGENT_REPO_DIR")
+        repo_dir = repo_compartido or os.path.join(REPOS_DIR, hashlib.sha1(git_repo_url.encode("utf-8")).hexdigest()[:12])
+        os.makedirs(REPOS_DIR, exist_ok=True)
+
+        salida = _ColaAcotada()
+        exito = True
+        with contextlib.redirect_stdout(_EscritorDoble(salida, sys.__stdout__)):
+            print("--- 🏁 AGENTE PRECALENTADO: nueva misión recibida ---")
+            try:
+                with trazas.contexto_tarea(mision.get("TRAZA_TAREA"), mision.get("TRAZA_PADRE")), trazas.span("mision", "agente_pool"):
+                    agent_runner.ejecutar_mision(
+                        json.loads(mision.get("LLM_CONFIG") or "{}"),
+                        mision.get("TASK_PROMPT"),
+                        git_repo_url,
+                        mision.get("GITHUB_PAT"),
+                        repo_dir,
+                        reutilizar_repo=True,
+                        volumen_compartido=bool(repo_compartido),
+                    )
+                print("\n🎉 ¡MISIÓN COMPLETADA CON ÉXITO!")
+            except Exception as e:
+                exito = False
+                print(f"❌ ERROR INESPERADO EN LA MISIÓN DEL AGENTE: {e}")
+                traceback.print_exc(file=sys.stdout)
+
+        ManejadorMisiones.misiones_completadas += 1
+        self._responder(200, {"StatusCode": 0 if exito else 1, "logs": salida.getvalue()})
+
+    def log_message(self, format, *args):
+        pass # Silenciamos el log de acceso de http.server; el log útil es el de la misión.
+
+def servir(puerto: int = None):
+    puerto = puerto or int(os.environ.get("AGENT_PORT", PUERTO_POR_DEFECTO))
+    print(f"--- 🔥 AGENTE EN MODO POOL escuchando en el puerto {puerto} ---", flush=True)
+    HTTPServer(("0.0.0.0", puerto), ManejadorMisiones).serve_forever()
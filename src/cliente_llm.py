@@ -0,0 +1,54 @@
+# src/cliente_llm.py (Capa de clientes LLM compartida por el orquestador)
+# Un cliente OpenAI por (api_base, api_key) con pool de conexiones keep-alive y
+# una API asyncio encima. El límite de peticiones en vuelo por backend lo pone
+# enrutador_llm, que además reparte entre varios backends.
+import asyncio
+import threading
+
+import trazas
+from prefijo_prompt import tokens_cacheados
+
+TIMEOUT_POR_DEFECTO = 600
+
+_clientes = {}
+_lock = threading.Lock()
+
+def _obtener_cliente(api_base: str, api_key: str):
+    """El cliente OpenAI mantiene su propio pool de conexiones keep-alive; basta con reutilizarlo."""
+    clave = (api_base, api_key)
+    with _lock:
+        if clave not in _clientes:
+            from openai import OpenAI
+            _clientes[clave] = OpenAI(base_url=api_base, api_key=api_key, timeout=TIMEOUT_POR_DEFECTO)
+        return _clientes[clave]
+
+def completar(prompt: str, config: dict, api_base: str, temperature: float = 0.5, fin: dict = None, **extra) -> str:
+    """Chat completion bloqueante contra 'api_base' reutilizando su conexión. Deja el finish_reason en fin["motivo"]."""
+    client = _obtener_cliente(api_base, config.get("api_key"))
+    response = client.chat.completions.create(
+        model=config.get("model_name"),
+        messages=[{"role": "user", "content": prompt}],
+        temperature=temperature,
+        **extra,
+    )
+    uso = getattr(response, "usage", None)
+    if uso is not None:
+        trazas.anotar(tokens_entrada=getattr(uso, "prompt_tokens", None), tokens_salida=getattr(uso, "completion_tokens", None),
+                      tokens_cacheados=tokens_cacheados(uso))
+    if fin is not None:
+        fin["motivo"] = response.choices[0].finish_reason
+    return response.choices[0].message.content
+
+async def ejecutar_async(funcion, *args, **kwargs):
+    """Ejecuta una llamada LLM bloqueante sin bloquear el event loop."""
+    return await asyncio.to_thread(funcion, *args, **kwargs)
+
+async def completar_async(prompt: str, config: dict, api_base: str, temperature: float = 0.5, **extra) -> str:
+    return await ejecutar_async(completar, prompt, config, api_base, temperature, **extra)
+
+def cerrar_clientes():
+    with _lock:
+        for client in _clientes.values():
+            try: client.close()
+            except Exception: pass
+        _clientes.clear()
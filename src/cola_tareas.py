@@ -0,0 +1,224 @@
+# src/cola_tareas.py (Cola de tareas persistente en SQLite con leases)
+# La carpeta tasks/*.json sigue siendo la vía de entrada: cada fichero nuevo se
+# registra en la base de datos y los workers (hilos o procesos, incluso en otras
+# máquinas que compartan el sistema de ficheros) lo reservan de forma atómica.
+# Una reserva caduca si su worker deja de renovarla; entonces vuelve a la cola.
+import os
+import sys
+import time
+import uuid
+import select
+import socket
+import ctypes
+import sqlite3
+import threading
+
+LEASE_POR_DEFECTO = 120
+MAX_INTENTOS_POR_DEFECTO = 3
+
+PENDIENTE = "pendiente"
+EN_CURSO = "en_curso"
+HECHA = "hecha"
+FALLIDA = "fallida"
+ABANDONADA = "abandonada"  # Su lease caducó demasiadas veces: no se reintenta sola.
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tareas (
+    nombre TEXT PRIMARY KEY,
+    proyecto TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    propietario TEXT,
+    lease_hasta REAL,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    creada REAL NOT NULL,
+    actualizada REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tareas_estado ON tareas (estado, nombre);
+"""
+
+class ColaTareas:
+    """
+    Las tareas de un mismo proyecto nunca están en curso a la vez, tampoco entre
+    procesos distintos. Se usa el journal clásico de SQLite (no WAL) porque WAL no
+    funciona sobre sistemas de ficheros en red.
+    """
+    def __init__(self, ruta_db: str, lease_segundos: int = LEASE_POR_DEFECTO, max_intentos: int = MAX_INTENTOS_POR_DEFECTO):
+        self.ruta_db = ruta_db
+        self.lease_segundos = lease_segundos
+        self.max_intentos = max_intentos
+        self.propietario = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        os.makedirs(os.path.dirname(os.path.abspath(ruta_db)), exist_ok=True)
+        with self._conexion() as db:
+            db.executescript(_ESQUEMA)
+
+    def _conexion(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.ruta_db, timeout=30, isolation_level=None)
+        return _ConexionCerrable(db)
+
+    def ingerir(self, directorio: str, leer_proyecto, nombres=None) -> int:
+        """
+        Registra los .json de 'directorio' (o solo 'nombres') que aún no estén en
+        la cola. Un nombre ya terminado cuyo fichero reaparece vuelve a pendiente.
+        Devuelve cuántas tareas quedaron pendientes de nuevo.
+        """
+        if nombres is None:
+            nombres = os.listdir(directorio)
+        nombres = sorted(n for n in nombres if n.endswith(".json") and os.path.isfile(os.path.join(directorio, n)))
+        if not nombres:
+            return 0
+        ahora = time.time()
+        with self._conexion() as db:
+            conocidas = {fila[0]: fila[1] for fila in db.execute(
+                f"SELECT nombre, estado FROM tareas WHERE nombre IN ({','.join('?' * len(nombres))})", nombres)}
+            nuevas = [n for n in nombres if conocidas.get(n) in (None, HECHA, FALLIDA)]
+            filas = [(n, leer_proyecto(n) or f"__tarea__{n}", PENDIENTE, ahora, ahora) for n in nuevas]
+            db.executemany(
+                "INSERT INTO tareas (nombre, proyecto, estado, creada, actualizada) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(nombre) DO UPDATE SET proyecto = excluded.proyecto, estado = excluded.estado, "
+                "intentos = 0, propietario = NULL, lease_hasta = NULL, actualizada = excluded.actualizada "
+                "WHERE tareas.estado IN ('hecha', 'fallida')", filas)
+        return len(filas)
+
+    def _recuperar_caducadas(self, db, ahora: float):
+        db.execute("UPDATE tareas SET estado = ?, propietario = NULL, actualizada = ? "
+                   "WHERE estado = ? AND lease_hasta < ? AND intentos >= ?",
+                   (ABANDONADA, ahora, EN_CURSO, ahora, self.max_intentos))
+        db.execute("UPDATE tareas SET estado = ?, propietario = NULL, actualizada = ? WHERE estado = ? AND lease_hasta < ?",
+                   (PENDIENTE, ahora, EN_CURSO, ahora))
+
+    def reservar(self):
+        """
+        Reserva atómicamente la primera tarea pendiente (por nombre) cuyo proyecto
+        no tenga otra tarea en curso. Devuelve (nombre, proyecto) o None.
+        """
+        ahora = time.time()
+        with self._conexion() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                self._recuperar_caducadas(db, ahora)
+                fila = db.execute(
+                    "SELECT nombre, proyecto FROM tareas WHERE estado = ? AND proyecto NOT IN "
+                    "(SELECT proyecto FROM tareas WHERE estado = ?) ORDER BY nombre LIMIT 1",
+                    (PENDIENTE, EN_CURSO)).fetchone()
+                if fila:
+                    db.execute("UPDATE tareas SET estado = ?, propietario = ?, lease_hasta = ?, intentos = intentos + 1, "
+                               "actualizada = ? WHERE nombre = ?",
+                               (EN_CURSO, self.propietario, ahora + self.lease_segundos, ahora, fila[0]))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        return fila
+
+    def renovar(self) -> int:
+        """Latido: alarga el lease de todas las tareas en curso de este worker."""
+        ahora = time.time()
+        with self._conexion() as db:
+            return db.execute("UPDATE tareas SET lease_hasta = ?, actualizada = ? WHERE propietario = ? AND estado = ?",
+                              (ahora + self.lease_segundos, ahora, self.propietario, EN_CURSO)).rowcount
+
+    def completar(self, nombre: str, exito: bool):
+        with self._conexion() as db:
+            db.execute("UPDATE tareas SET estado = ?, propietario = NULL, lease_hasta = NULL, actualizada = ? "
+                       "WHERE nombre = ? AND propietario = ?", (HECHA if exito else FALLIDA, time.time(), nombre, self.propietario))
+
+    def hay_trabajo(self) -> bool:
+        """¿Quedan tareas pendientes o en curso (de cualquier worker)?"""
+        with self._conexion() as db:
+            return db.execute("SELECT 1 FROM tareas WHERE estado IN (?, ?) LIMIT 1", (PENDIENTE, EN_CURSO)).fetchone() is not None
+
+    def iniciar_latido(self) -> threading.Event:
+        """Renueva los leases cada tercio de su duración hasta que se active el evento devuelto."""
+        parar = threading.Event()
+        def latido():
+            while not parar.wait(self.lease_segundos / 3):
+                try: self.renovar()
+                except sqlite3.Error as e: print(f"No se pudo renovar el lease de la cola: {e}")
+        threading.Thread(target=latido, name="cola-latido", daemon=True).start()
+        return parar
+
+class _ConexionCerrable:
+    """sqlite3.Connection como context manager que además cierra la conexión."""
+    def __init__(self, db):
+        self.db = db
+    def __enter__(self):
+        return self.db
+    def __exit__(self, *exc):
+        self.db.close()
+
+# --- Vigilancia de la carpeta de entrada ---
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_NONBLOCK = 0o4000
+
+class VigilanteDirectorio:
+    """
+    Espera a que aparezcan ficheros en 'directorio' (solo los que acaban en
+    'sufijo', si se indica). En Linux usa inotify (vía ctypes, sin dependencias);
+    en otros sistemas se degrada a esperar 'timeout'. despertar() interrumpe la
+    espera desde otro hilo (p. ej. al acabar una tarea).
+    """
+    def __init__(self, directorio: str, sufijo: str = ""):
+        self.directorio = directorio
+        self.sufijo = sufijo
+        self._fd = None
+        self._evento = threading.Event()
+        try:
+            libc = ctypes.CDLL("libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(_IN_NONBLOCK)
+            if fd >= 0 and libc.inotify_add_watch(fd, os.fsencode(os.path.abspath(directorio)), _IN_CLOSE_WRITE | _IN_MOVED_TO) >= 0:
+                self._fd = fd
+            elif fd >= 0:
+                os.close(fd)
+        except (OSError, AttributeError):
+            pass
+        if self._fd is not None:
+            self._tubo_r, self._tubo_w = os.pipe()
+
+    @property
+    def usa_inotify(self) -> bool:
+        return self._fd is not None
+
+    def despertar(self):
+        if self._fd is None:
+            self._evento.set()
+        else:
+            os.write(self._tubo_w, b"x")
+
+    def esperar(self, timeout: float):
+        """
+        Bloquea hasta un evento de un fichero con 'sufijo', despertar() o 'timeout'.
+        Devuelve los nombres de fichero creados, o None si no se sabe (sin
+        inotify): hay que listar el directorio. Los eventos de otros ficheros
+        (temporales, journals de SQLite...) no interrumpen la espera.
+        """
+        if self._fd is None:
+            self._evento.wait(timeout)
+            self._evento.clear()
+            return None
+        limite = time.monotonic() + timeout
+        while True:
+            listos, _, _ = select.select([self._tubo_r, self._fd], [], [], max(0, limite - time.monotonic()))
+            despertado = self._tubo_r in listos
+            if despertado:
+                os.read(self._tubo_r, 4096)
+            nombres = []
+            if self._fd in listos:
+                datos = os.read(self._fd, 65536)
+                i = 0
+                while i + 16 <= len(datos):  # struct inotify_event: wd, mask, cookie, len, name[len]
+                    longitud = int.from_bytes(datos[i + 12:i + 16], sys.byteorder)
+                    nombre = os.fsdecode(datos[i + 16:i + 16 + longitud].rstrip(b"\0"))
+                    if nombre and nombre.endswith(self.sufijo): nombres.append(nombre)
+                    i += 16 + longitud
+            if nombres or despertado or not listos or time.monotonic() >= limite:
+                return nombres
+
+    def cerrar(self):
+        if self._fd is None:
+            return
+        for fd in (self._fd, self._tubo_r, self._tubo_w):
+            if fd is not None:
+                try: os.close(fd)
+                except OSError: pass
@@ -0,0 +1,60 @@
+# src/contexto_agente.py (Proyección del contexto que ve cada rol)
+# En lugar de volcar el contexto completo de la tarea en cada prompt, cada rol
+# declara en AGENT_INFO["contexto"] las claves que necesita. "*" representa
+# las claves propias de la tarea (la descripción del proyecto que escribe el
+# usuario); nunca incluye las claves de operación del orquestador ni las que
+# parecen secretos, que solo pasan si el rol las nombra explícitamente.
+import re
+import json
+
+TODAS_LAS_DE_TAREA = "*"
+# Claves que solo usa el orquestador: no aportan nada al LLM.
+CLAVES_INTERNAS = {
+    "github_pat", "github_repo", "github_org", "llm_config", "etapas_a_ejecutar", "etapa_actual", "plan_de_origen",
+    "cache_llm", "paralelismo_etapas", "git_checkpoints", "reanudar_desde", "memoizar_etapas",
+    "volumen_compartido", "doc_resumenes_en_paralelo", "plazos_mision", "ediciones_incrementales",
+}
+PREFIJOS_INTERNOS = ("qa_", "e2e_")
+# Claves que el orquestador añade al contexto para roles concretos; "*" no las arrastra.
+CLAVES_INYECTADAS = {
+    "tarea_especifica", "GUIA_ESTILO_GENERICA", "GUIA_ESTILO_BACKEND", "GUIA_ESTILO_FRONTEND",
+    "DOCUMENTACION_BACKEND", "CONTEXTO_DEL_CODIGO", "FICHERO_A_GENERAR", "CODIGO_ACTUAL",
+}
+# Las guías no cambian entre misiones del mismo rol: van antes del contexto volátil
+# para que el servidor pueda reutilizar el prefijo. La tarea concreta va siempre al final.
+CLAVES_ESTABLES = ("GUIA_ESTILO_GENERICA", "GUIA_ESTILO_BACKEND", "GUIA_ESTILO_FRONTEND")
+CLAVES_FINALES = ("tarea_especifica",)
+PATRON_SECRETO = re.compile(r"(^|_)(pat|token|secret|password|passwd|api_?key)($|_)", re.IGNORECASE)
+
+def es_interna(clave: str) -> bool:
+    return clave in CLAVES_INTERNAS or clave.startswith(PREFIJOS_INTERNOS)
+
+def proyectar(contexto: dict, claves) -> dict:
+    """
+    Subconjunto de 'contexto' con las claves de 'claves' (en su orden, salvo
+    CLAVES_FINALES, que van al final) y, si aparece "*", las de la tarea que no
+    sean internas, inyectadas ni secretas. Con 'claves' a None se devuelve el
+    contexto sin las internas.
+    """
+    if claves is None:
+        proyectado = {k: v for k, v in contexto.items() if not es_interna(k)}
+    else:
+        proyectado = {}
+        for clave in claves:
+            if clave == TODAS_LAS_DE_TAREA:
+                proyectado.update({k: v for k, v in contexto.items()
+                                   if k not in proyectado and not es_interna(k) and k not in CLAVES_INYECTADAS and not PATRON_SECRETO.search(k)})
+            elif clave in contexto:
+                proyectado[clave] = contexto[clave]
+    for clave in CLAVES_FINALES:
+        if clave in proyectado: proyectado[clave] = proyectado.pop(clave)
+    return proyectado
+
+def separar_estables(proyectado: dict) -> tuple:
+    """(claves estables, resto) de un contexto ya proyectado."""
+    estables = {k: proyectado[k] for k in CLAVES_ESTABLES if k in proyectado}
+    return estables, {k: v for k, v in proyectado.items() if k not in estables}
+
+def serializar(contexto: dict) -> str:
+    """JSON compacto y sin escapar acentos: mismos datos, bastantes menos tokens que indent=2."""
+    return json.dumps(contexto, ensure_ascii=False, separators=(",", ":"), default=str)
@@ -0,0 +1,80 @@
+# src/documentacion_mapreduce.py (Documentación map-reduce para repositorios grandes)
+# Fase "map": un resumen por fichero, en paralelo y cacheado por el hash de su
+# contenido. Fase "reduce": el documentador recibe los resúmenes en lugar del código.
+import os
+import json
+import hashlib
+import asyncio
+import tempfile
+
+import registro_prompts
+
+DIRECTORIO_CACHE_RESUMENES = "cache_resumenes"
+MAX_RESUMENES_EN_PARALELO = 4
+
+def clave_resumen(rel_path: str, contenido: str, plantilla: str, model_name: str) -> str:
+    """El resumen depende del fichero, de la plantilla del resumidor y del modelo."""
+    material = json.dumps([rel_path, contenido, plantilla, model_name or ""], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def _leer_resumen_cacheado(directorio: str, clave: str):
+    try:
+        with open(os.path.join(directorio, f"{clave}.md"), "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def _guardar_resumen(directorio: str, clave: str, resumen: str):
+    os.makedirs(directorio, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directorio, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(resumen)
+    os.replace(tmp, os.path.join(directorio, f"{clave}.md"))
+
+def resumir_ficheros(ficheros, plantilla: str, generar_async, model_name: str = None,
+                     directorio_cache: str = DIRECTORIO_CACHE_RESUMENES, max_paralelo: int = MAX_RESUMENES_EN_PARALELO, log=print):
+    """
+    Resume cada (ruta, contenido) de 'ficheros' con la corrutina
+    'generar_async(prompt) -> str', como mucho 'max_paralelo' a la vez.
+    Solo llama al LLM para los ficheros cuyo contenido no tiene resumen cacheado.
+    Devuelve la lista [(ruta, resumen)] en el mismo orden de entrada.
+    """
+    compilada = registro_prompts.Plantilla(plantilla)
+    resumenes = {}
+    pendientes = []
+    for rel_path, contenido in ficheros:
+        clave = clave_resumen(rel_path, contenido, plantilla, model_name)
+        cacheado = _leer_resumen_cacheado(directorio_cache, clave)
+        if cacheado is not None:
+            resumenes[rel_path] = cacheado
+        else:
+            pendientes.append((rel_path, contenido, clave))
+
+    log(f"   - [Map] {len(ficheros) - len(pendientes)} resumen(es) en caché, {len(pendientes)} por generar.")
+
+    async def resumir(pendiente, semaforo):
+        rel_path, contenido, clave = pendiente
+        prompt = compilada.renderizar({"RUTA_FICHERO": rel_path, "CONTENIDO_FICHERO": contenido})
+        async with semaforo:
+            resumen = (await generar_async(prompt)).strip()
+        _guardar_resumen(directorio_cache, clave, resumen)
+        return rel_path, resumen
+
+    async def resumir_todos():
+        semaforo = asyncio.Semaphore(max(1, max_paralelo))
+        return await asyncio.gather(*(resumir(p, semaforo) for p in pendientes))
+
+    if pendientes:
+        for rel_path, resumen in asyncio.run(resumir_todos()):
+            resumenes[rel_path] = resumen
+
+    return [(rel_path, resumenes[rel_path]) for rel_path, _ in ficheros]
+
+def combinar_resumenes(resumenes) -> str:
+    """Construye el contexto de la fase 'reduce' a partir de los resúmenes por fichero."""
+    partes = ["NOTA: El proyecto es demasiado grande para incluir su código completo. "
+              "A continuación tienes un resumen técnico de cada fichero; úsalos como si fueran el código fuente."]
+    separador = '=' * 20
+    for rel_path, resumen in resumenes:
+        partes.append(f"\n{separador}\n--- RESUMEN DEL FICHERO: {rel_path} ---\n{separador}\n\n{resumen}")
+    return "\n".join(partes)
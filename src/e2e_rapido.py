@@ -0,0 +1,166 @@
+# src/e2e_rapido.py (Soporte para la QA E2E: caché de node_modules, puertos y arranque)
+# node_modules se instala una vez por hash de package.json y se enlaza en cada
+# proyecto; el binario de Cypress vive en una caché común. Cada worker levanta
+# su propio servidor Flask en un puerto libre y espera a que responda por HTTP.
+import os
+import time
+import glob
+import shutil
+import socket
+import hashlib
+import subprocess
+import threading
+import urllib.error
+import urllib.request
+
+import trazas
+
+DIRECTORIO_POR_DEFECTO = "cache_e2e"
+TIMEOUT_ARRANQUE_POR_DEFECTO = 30
+MARCA_LISTO = ".listo"
+PATRONES_SPECS = ("cypress/e2e/**/*.cy.js", "cypress/e2e/**/*.cy.ts")
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+def _lock_de(clave: str) -> threading.Lock:
+    with _locks_lock:
+        return _locks.setdefault(clave, threading.Lock())
+
+def _shell() -> bool:
+    return os.name == 'nt'
+
+def entorno_node(directorio_cache: str) -> dict:
+    """Variables de entorno para npm/npx: el binario de Cypress se comparte entre proyectos."""
+    return {**os.environ, "CYPRESS_CACHE_FOLDER": os.path.join(os.path.abspath(directorio_cache), "cypress")}
+
+def escribir_si_cambia(ruta: str, contenido: str) -> bool:
+    """Evita reescribir (y ensuciar el árbol de git) ficheros de configuración idénticos."""
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            if f.read() == contenido: return False
+    except FileNotFoundError:
+        pass
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write(contenido)
+    return True
+
+def _excluir_de_git(repo_path: str, patron: str):
+    """Añade 'patron' a .git/info/exclude (ignorado en local, sin tocar el .gitignore del proyecto)."""
+    exclude = os.path.join(repo_path, ".git", "info", "exclude")
+    if not os.path.isdir(os.path.dirname(exclude)): return
+    try:
+        with open(exclude, "r", encoding="utf-8") as f:
+            if patron in f.read().splitlines(): return
+    except FileNotFoundError:
+        pass
+    with open(exclude, "a", encoding="utf-8") as f:
+        f.write(f"\n{patron}\n")
+
+def preparar_node_modules(repo_path: str, directorio_cache: str = DIRECTORIO_POR_DEFECTO, log=print):
+    """
+    Instala las dependencias de package.json en la caché (una vez por hash de
+    package.json y versión de Node) y enlaza node_modules en el proyecto.
+    """
+    with open(os.path.join(repo_path, "package.json"), "rb") as f:
+        contenido = f.read()
+    version_node = subprocess.run(["node", "--version"], capture_output=True, text=True, shell=_shell()).stdout.strip()
+    clave = hashlib.sha256(version_node.encode() + b"\n" + contenido).hexdigest()[:24]
+    directorio_cache = os.path.abspath(directorio_cache)
+    destino = os.path.join(directorio_cache, "node_modules", clave)
+
+    with _lock_de(clave):
+        if os.path.exists(os.path.join(destino, MARCA_LISTO)):
+            log(f"   - node_modules cacheado ({clave[:12]}); se omite 'npm install'.", "QA")
+        else:
+            log("   - Instalando dependencias de Node.js en la caché con 'npm install'...", "QA")
+            temporal = f"{destino}.tmp-{os.getpid()}"
+            shutil.rmtree(temporal, ignore_errors=True)
+            os.makedirs(temporal)
+            shutil.copy(os.path.join(repo_path, "package.json"), temporal)
+            try:
+                with trazas.span("npm", "install"):
+                    subprocess.run(["npm", "install", "--no-audit", "--no-fund"], cwd=temporal, check=True,
+                                   env=entorno_node(directorio_cache), shell=_shell())
+                open(os.path.join(temporal, MARCA_LISTO), "w").close()
+                shutil.rmtree(destino, ignore_errors=True)
+                os.replace(temporal, destino)
+            except Exception:
+                shutil.rmtree(temporal, ignore_errors=True)
+                raise
+        os.utime(os.path.join(destino, MARCA_LISTO))
+
+    enlace = os.path.join(repo_path, "node_modules")
+    origen = os.path.join(destino, "node_modules")
+    if os.path.islink(enlace):
+        if os.path.realpath(enlace) == os.path.realpath(origen): return
+        os.unlink(enlace)
+    elif os.path.isdir(enlace):
+        shutil.rmtree(enlace)
+    try:
+        os.symlink(origen, enlace, target_is_directory=True)
+    except OSError:
+        shutil.copytree(origen, enlace, symlinks=True)  # Sin permisos para enlaces (Windows).
+    _excluir_de_git(repo_path, "node_modules")
+
+def puerto_libre() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def esperar_http(url: str, timeout: float, proceso: subprocess.Popen = None) -> bool:
+    """Sondea 'url' hasta obtener cualquier respuesta HTTP (incluido un 404) o agotar el timeout."""
+    limite = time.monotonic() + timeout
+    espera = 0.1
+    while time.monotonic() < limite:
+        if proceso is not None and proceso.poll() is not None:
+            return False  # El servidor murió al arrancar: no tiene sentido seguir esperando.
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return True
+        except urllib.error.HTTPError:
+            return True
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(espera)
+            espera = min(espera * 2, 1.0)
+    return False
+
+def levantar_servidor(python: str, repo_path: str, timeout: float = TIMEOUT_ARRANQUE_POR_DEFECTO, log=print):
+    """
+    Arranca la app Flask del proyecto en un puerto libre y espera a que responda.
+    Primero con 'flask --app app run --port N'; si no arranca, con 'python app.py'
+    y PORT=N. Devuelve (proceso, url_base). Lanza RuntimeError si no responde.
+    """
+    comandos = [
+        [python, "-m", "flask", "--app", "app", "run", "--no-reload", "--port"],
+        [python, "app.py"],
+    ]
+    for comando in comandos:
+        puerto = puerto_libre()
+        if comando[-1] == "--port": comando = [*comando, str(puerto)]
+        proceso = subprocess.Popen(comando, cwd=repo_path, env={**os.environ, "PORT": str(puerto), "FLASK_RUN_PORT": str(puerto)},
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        url = f"http://127.0.0.1:{puerto}"
+        inicio = time.monotonic()
+        if esperar_http(url, timeout, proceso):
+            log(f"   - Servidor listo en {url} en {time.monotonic() - inicio:.1f}s.", "INFO")
+            return proceso, url
+        detener_servidor(proceso)
+        log(f"   - El servidor no respondió con {' '.join(comando[1:4])}...; probando alternativa.", "WARNING")
+    raise RuntimeError(f"El servidor Flask no respondió en {timeout}s.")
+
+def detener_servidor(proceso: subprocess.Popen):
+    if proceso and proceso.poll() is None:
+        proceso.terminate()
+        try: proceso.wait(timeout=10)
+        except subprocess.TimeoutExpired: proceso.kill()
+
+def listar_specs(repo_path: str) -> list:
+    specs = set()
+    for patron in PATRONES_SPECS:
+        specs.update(os.path.relpath(p, repo_path).replace("\\", "/") for p in glob.glob(os.path.join(repo_path, patron), recursive=True))
+    return sorted(specs)
+
+def repartir_specs(specs: list, workers: int) -> list:
+    grupos = [specs[i::max(1, workers)] for i in range(max(1, min(workers, len(specs))))]
+    return [g for g in grupos if g]
@@ -0,0 +1,199 @@
+# src/enrutador_llm.py (Reparto de peticiones LLM entre varios backends)
+# llm_config puede declarar varios servidores OpenAI compatibles en "api_bases"
+# (o una lista en "api_base"). Cada petición va al backend con menos peticiones
+# en vuelo ponderadas por su latencia observada. Cada backend tiene un límite de
+# concurrencia adaptativo (AIMD: +1/límite por respuesta rápida, x0.7 si la
+# latencia se dispara, x0.5 si falla) y se expulsa un tiempo tras varios errores
+# seguidos. Lo usan igual el orquestador y el agente dentro del contenedor.
+import time
+import threading
+
+import trazas
+
+MAX_EN_VUELO_POR_DEFECTO = 4
+FACTOR_LATENCIA = 2.0          # Latencia normalizada por encima de FACTOR x la mínima = saturación.
+DECREMENTO_LATENCIA = 0.7
+DECREMENTO_ERROR = 0.5
+ERRORES_PARA_EXPULSAR = 3
+EXPULSION_BASE_S = 30
+EXPULSION_MAX_S = 300
+ALFA_EWMA = 0.3
+
+def _log(mensaje, nivel="INFO"):
+    print(f"   - [{nivel}] {mensaje}", flush=True)
+
+def endpoints_de(config: dict) -> list:
+    """Lista de api_base de la config: "api_bases", o "api_base" como texto o lista. Vacía = Gemini."""
+    endpoints = config.get("api_bases") or config.get("api_base") or []
+    return [endpoints] if isinstance(endpoints, str) else list(endpoints)
+
+class Endpoint:
+    def __init__(self, api_base: str, orden: int, limite_max: int):
+        self.api_base = api_base
+        self.orden = orden
+        self.limite_max = limite_max
+        self.limite = max(1.0, limite_max / 2)
+        self.en_vuelo = 0
+        self.latencia = None          # EWMA de segundos por unidad (1000 caracteres de respuesta).
+        self.latencia_minima = None
+        self.errores_seguidos = 0
+        self.expulsiones = 0
+        self.expulsado_hasta = 0.0
+        self.peticiones = 0
+        self.fallos = 0
+
+    def disponible(self, ahora: float) -> bool:
+        return self.expulsado_hasta <= ahora
+
+    def coste(self) -> float:
+        """Menos peticiones en vuelo y menor latencia = mejor. Sin medidas aún, cuenta solo el orden."""
+        return (self.en_vuelo + 1) * (self.latencia or 0.0)
+
+class Enrutador:
+    def __init__(self, endpoints: list, limite_max: int = MAX_EN_VUELO_POR_DEFECTO, log=_log):
+        self.endpoints = [Endpoint(api_base, i, limite_max) for i, api_base in enumerate(endpoints)]
+        self.log = log
+        self._condicion = threading.Condition()
+
+    def _candidatos(self, excluidos) -> list:
+        ahora = time.monotonic()
+        candidatos = [e for e in self.endpoints if e not in excluidos and e.disponible(ahora)]
+        if not candidatos:
+            # Todos expulsados: se prueba el que antes vuelve, mejor que no responder nunca.
+            restantes = [e for e in self.endpoints if e not in excluidos] or self.endpoints
+            candidatos = [min(restantes, key=lambda e: e.expulsado_hasta)]
+        return candidatos
+
+    def adquirir(self, excluidos=(), respetar_limite: bool = True) -> Endpoint:
+        """Reserva un hueco en el mejor backend; espera si todos están en su límite."""
+        with self._condicion:
+            while True:
+                candidatos = self._candidatos(excluidos)
+                libres = [e for e in candidatos if not respetar_limite or e.en_vuelo < int(e.limite)]
+                if libres:
+                    elegido = min(libres, key=lambda e: (e.coste(), e.en_vuelo, e.orden))
+                    elegido.en_vuelo += 1
+                    return elegido
+                self._condicion.wait(timeout=1.0)
+
+    def liberar(self, endpoint: Endpoint, duracion: float = None, exito: bool = True, unidades: float = 1.0):
+        """Devuelve el hueco y, si hay medida ('duracion'), ajusta el límite del backend (AIMD)."""
+        with self._condicion:
+            endpoint.en_vuelo -= 1
+            if duracion is not None:
+                self._ajustar(endpoint, duracion, exito, unidades)
+            self._condicion.notify_all()
+
+    def _ajustar(self, e: Endpoint, duracion: float, exito: bool, unidades: float):
+        e.peticiones += 1
+        if not exito:
+            e.fallos += 1
+            e.errores_seguidos += 1
+            e.limite = max(1.0, e.limite * DECREMENTO_ERROR)
+            if e.errores_seguidos >= ERRORES_PARA_EXPULSAR:
+                e.expulsiones += 1
+                segundos = min(EXPULSION_MAX_S, EXPULSION_BASE_S * 2 ** (e.expulsiones - 1))
+                e.expulsado_hasta = time.monotonic() + segundos
+                e.errores_seguidos = 0
+                e.limite = 1.0  # Al volver, una única petición de prueba.
+                self.log(f"Backend LLM {e.api_base} expulsado {segundos}s tras {ERRORES_PARA_EXPULSAR} errores seguidos.", "WARNING")
+            return
+        e.errores_seguidos = 0
+        if e.expulsiones and e.expulsado_hasta:
+            e.expulsado_hasta = 0.0
+            self.log(f"Backend LLM {e.api_base} vuelve a responder.", "INFO")
+        normalizada = duracion / max(1.0, unidades)
+        e.latencia = normalizada if e.latencia is None else (1 - ALFA_EWMA) * e.latencia + ALFA_EWMA * normalizada
+        e.latencia_minima = normalizada if e.latencia_minima is None else min(e.latencia_minima, normalizada)
+        if normalizada > e.latencia_minima * FACTOR_LATENCIA:
+            e.limite = max(1.0, e.limite * DECREMENTO_LATENCIA)
+        else:
+            e.limite = min(float(e.limite_max), e.limite + 1.0 / e.limite)
+
+    def ejecutar(self, llamar):
+        """
+        llamar(api_base) -> texto. Si falla, se reintenta en los demás backends
+        (una vez en cada uno) antes de propagar el último error.
+        """
+        probados = []
+        while True:
+            endpoint = self.adquirir(probados)
+            inicio = time.perf_counter()
+            try:
+                resultado = llamar(endpoint.api_base)
+            except Exception:
+                self.liberar(endpoint, time.perf_counter() - inicio, exito=False)
+                probados.append(endpoint)
+                if len(probados) >= len(self.endpoints): raise
+                self.log(f"Fallo en el backend LLM {endpoint.api_base}; reintentando en otro.", "WARNING")
+                continue
+            self.liberar(endpoint, time.perf_counter() - inicio, unidades=len(resultado or "") / 1000)
+            trazas.anotar(endpoint=endpoint.api_base)
+            return resultado
+
+    def ejecutar_stream(self, llamar_stream):
+        """
+        Como ejecutar() para un iterador de trozos. Solo se cambia de backend si
+        falla antes del primer trozo; el hueco se mantiene hasta agotar el stream.
+        """
+        probados = []
+        while True:
+            endpoint = self.adquirir(probados)
+            inicio = time.perf_counter()
+            caracteres, empezado = 0, False
+            try:
+                for trozo in llamar_stream(endpoint.api_base):
+                    empezado = True
+                    caracteres += len(trozo)
+                    yield trozo
+            except GeneratorExit:
+                self.liberar(endpoint)
+                raise
+            except Exception:
+                self.liberar(endpoint, time.perf_counter() - inicio, exito=False)
+                probados.append(endpoint)
+                if empezado or len(probados) >= len(self.endpoints): raise
+                self.log(f"Fallo en el backend LLM {endpoint.api_base}; reintentando en otro.", "WARNING")
+                continue
+            self.liberar(endpoint, time.perf_counter() - inicio, unidades=caracteres / 1000)
+            trazas.anotar(endpoint=endpoint.api_base)
+            return
+
+    def reservar(self) -> Endpoint:
+        """
+        Cuenta como en vuelo, sin esperar al límite ni medir latencia, una misión
+        de agente que usará este backend desde su contenedor. Se devuelve con liberar().
+        """
+        return self.adquirir(respetar_limite=False)
+
+    def resumen(self) -> str:
+        lineas = []
+        with self._condicion:
+            for e in self.endpoints:
+                latencia = f"{e.latencia:.2f}s/1k car." if e.latencia is not None else "sin medidas"
+                lineas.append(f"  {e.api_base}: {e.peticiones} peticiones, {e.fallos} fallos, límite {e.limite:.1f}, "
+                              f"latencia {latencia}, {e.expulsiones} expulsión(es)")
+        return "\n".join(lineas)
+
+_enrutadores = {}
+_enrutadores_lock = threading.Lock()
+
+def obtener_enrutador(config: dict, log=_log) -> Enrutador:
+    """Un enrutador por conjunto de backends y proceso, compartido por todas las llamadas."""
+    endpoints = endpoints_de(config)
+    clave = tuple(sorted(endpoints))
+    with _enrutadores_lock:
+        if clave not in _enrutadores:
+            limite_max = int(config.get("max_peticiones_en_vuelo", MAX_EN_VUELO_POR_DEFECTO))
+            _enrutadores[clave] = Enrutador(endpoints, limite_max, log)
+        return _enrutadores[clave]
+
+def config_con_preferido(config: dict, api_base: str) -> dict:
+    """Copia de la config con 'api_base' primero: el agente lo elige mientras no tenga medidas propias."""
+    endpoints = endpoints_de(config)
+    return {**config, "api_bases": [api_base] + [e for e in endpoints if e != api_base]}
+
+def resumen() -> str:
+    with _enrutadores_lock:
+        enrutadores = [e for e in _enrutadores.values() if len(e.endpoints) > 1 or e.endpoints[0].peticiones]
+    return "\n".join(e.resumen() for e in enrutadores)
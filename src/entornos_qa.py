@@ -0,0 +1,132 @@
+# src/entornos_qa.py (Virtualenvs cacheados para el QA de backend)
+# Un venv por (hash de requirements.txt, versión de Python), compartido entre
+# tareas y proyectos. Se construye una sola vez con una caché de wheels común
+# y se desaloja por LRU cuando hay demasiados.
+import os
+import sys
+import time
+import shutil
+import hashlib
+import subprocess
+import threading
+
+import trazas
+
+DIRECTORIO_POR_DEFECTO = "cache_venvs"
+MAX_ENTORNOS_POR_DEFECTO = 8
+DIRECTORIO_WHEELS = "_wheels"
+MARCA_LISTO = ".listo"  # Se crea al terminar la instalación; su mtime hace de marca LRU.
+PAQUETES_QA = ["pytest"]
+
+class CacheEntornos:
+    def __init__(self, directorio: str, max_entornos: int = MAX_ENTORNOS_POR_DEFECTO):
+        self.directorio = os.path.abspath(directorio)
+        self.max_entornos = max_entornos
+        self.construidos = 0
+        self.reutilizados = 0
+        self._lock = threading.Lock()
+        self._locks_clave = {}
+        os.makedirs(os.path.join(self.directorio, DIRECTORIO_WHEELS), exist_ok=True)
+
+    @staticmethod
+    def clave(requirements: str) -> str:
+        version = f"{sys.implementation.name}-{sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}"
+        material = "\n".join([version, *PAQUETES_QA, requirements])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()[:24]
+
+    @staticmethod
+    def python_de(ruta_entorno: str) -> str:
+        if os.name == "nt":
+            return os.path.join(ruta_entorno, "Scripts", "python.exe")
+        return os.path.join(ruta_entorno, "bin", "python")
+
+    def _lock_de(self, clave: str) -> threading.Lock:
+        with self._lock:
+            return self._locks_clave.setdefault(clave, threading.Lock())
+
+    def _entornos(self):
+        """Devuelve (ruta, último uso) de los entornos terminados."""
+        entornos = []
+        for nombre in os.listdir(self.directorio):
+            marca = os.path.join(self.directorio, nombre, MARCA_LISTO)
+            try: entornos.append((os.path.join(self.directorio, nombre), os.stat(marca).st_mtime))
+            except (FileNotFoundError, NotADirectoryError): pass
+        return entornos
+
+    def obtener(self, requirements_path: str = None, log=print) -> str:
+        """
+        Devuelve el intérprete del venv para ese requirements.txt (None = sin
+        dependencias del proyecto), construyéndolo si no existe. Lanza
+        subprocess.CalledProcessError si la instalación falla.
+        """
+        requirements = ""
+        if requirements_path and os.path.exists(requirements_path):
+            with open(requirements_path, "r", encoding="utf-8") as f: requirements = f.read()
+        clave = self.clave(requirements)
+        ruta = os.path.join(self.directorio, clave)
+
+        with self._lock_de(clave):
+            if os.path.exists(os.path.join(ruta, MARCA_LISTO)):
+                os.utime(os.path.join(ruta, MARCA_LISTO))
+                with self._lock: self.reutilizados += 1
+                log(f"Reutilizando entorno de QA cacheado ({clave[:12]}); no se instala nada.", "SYSTEM")
+                return self.python_de(ruta)
+            self._construir(ruta, requirements_path if requirements else None, log)
+            with self._lock: self.construidos += 1
+
+        self._desalojar(conservar=ruta)
+        return self.python_de(ruta)
+
+    def _construir(self, ruta: str, requirements_path: str, log):
+        # Se construye en un directorio temporal y se renombra al final: un venv a medias nunca se reutiliza.
+        temporal = f"{ruta}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(temporal, ignore_errors=True)
+        inicio = time.perf_counter()
+        log(f"Creando entorno de QA {os.path.basename(ruta)[:12]}...", "SYSTEM")
+        with trazas.span("pip", "venv", requirements=bool(requirements_path)):
+            try:
+                subprocess.run([sys.executable, "-m", "venv", temporal], check=True, capture_output=True, text=True)
+                python = self.python_de(temporal)
+                entorno_pip = {**os.environ, "PIP_CACHE_DIR": os.path.join(self.directorio, DIRECTORIO_WHEELS),
+                               "PIP_DISABLE_PIP_VERSION_CHECK": "1"}
+                instalar = [python, "-m", "pip", "install", "--quiet", *PAQUETES_QA]
+                if requirements_path:
+                    instalar += ["-r", requirements_path]
+                subprocess.run(instalar, check=True, capture_output=True, text=True, env=entorno_pip)
+                open(os.path.join(temporal, MARCA_LISTO), "w").close()
+                if os.path.exists(ruta):
+                    shutil.rmtree(ruta, ignore_errors=True)  # Restos de una construcción interrumpida.
+                os.replace(temporal, ruta)
+            except Exception:
+                shutil.rmtree(temporal, ignore_errors=True)
+                raise
+        log(f"Entorno de QA listo en {time.perf_counter() - inicio:.1f}s.", "SUCCESS")
+
+    def _desalojar(self, conservar: str = None):
+        """Borra los entornos menos usados hasta quedar en 'max_entornos'."""
+        entornos = sorted(self._entornos(), key=lambda e: e[1])
+        sobrantes = len(entornos) - self.max_entornos
+        for ruta, _ in entornos:
+            if sobrantes <= 0: break
+            if ruta == conservar: continue
+            with self._lock_de(os.path.basename(ruta)):
+                shutil.rmtree(ruta, ignore_errors=True)
+            sobrantes -= 1
+
+    def resumen(self) -> str:
+        return f"Entornos de QA: {self.construidos} construidos / {self.reutilizados} reutilizados."
+
+_cache_global = None
+_cache_lock = threading.Lock()
+
+def configurar_cache(directorio: str = DIRECTORIO_POR_DEFECTO, max_entornos: int = MAX_ENTORNOS_POR_DEFECTO):
+    global _cache_global
+    with _cache_lock:
+        _cache_global = CacheEntornos(directorio, max_entornos)
+    return _cache_global
+
+def obtener_cache() -> CacheEntornos:
+    """Caché del proceso; si nadie la ha configurado se usa el directorio por defecto."""
+    if _cache_global is None:
+        configurar_cache()
+    return _cache_global
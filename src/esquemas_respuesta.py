@@ -0,0 +1,198 @@
+# src/esquemas_respuesta.py (Esquemas de respuesta por rol, validación y reparación)
+# Compartido por el orquestador y los agentes: una respuesta mal formada se
+# intenta reparar con una llamada corta al LLM en lugar de tumbar la tarea.
+import re
+import ast
+import json
+
+ESQUEMA_ENTRADA_FILES = {
+    "type": "object",
+    "required": ["filename"],
+    "properties": {
+        "filename": {"type": "string", "minLength": 1},
+        "action": {"type": "string", "enum": ["create_or_update", "delete", "patch", "search_replace"]},
+        "code": {"type": ["string", "array", "object"]},
+        "diff": {"type": "string", "minLength": 1},
+        "edits": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["search", "replace"],
+                "properties": {"search": {"type": "string"}, "replace": {"type": "string"}},
+            },
+        },
+    },
+}
+# Clave obligatoria según la acción (el validador mínimo no entiende if/then).
+CLAVE_POR_ACCION = {"patch": "diff", "search_replace": "edits"}
+
+ESQUEMA_FILES = {
+    "type": "object",
+    "required": ["files"],
+    "properties": {
+        "files": {"type": "array", "items": ESQUEMA_ENTRADA_FILES},
+    },
+}
+
+ESQUEMA_PLAN = {
+    "type": "object",
+    "required": ["plan"],
+    "properties": {
+        "plan": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["etapa", "tareas"],
+                "properties": {
+                    "etapa": {"type": "string", "minLength": 1},
+                    "tareas": {"type": "array", "items": {"type": "string"}},
+                },
+            },
+        },
+    },
+}
+
+ESQUEMA_JEFE_DE_PROYECTO = {
+    "type": "object",
+    "required": ["nuevo_objetivo"],
+    "properties": {
+        "analisis_del_fallo": {"type": "string"},
+        "nuevo_objetivo": {"type": "string", "minLength": 1},
+    },
+}
+
+# Fichero del protocolo 'files' cuyo contenido tiene además su propio esquema.
+ESQUEMAS_POR_FICHERO = {"plan_construccion.json": ESQUEMA_PLAN}
+
+REINTENTOS_REPARACION_POR_DEFECTO = 2
+
+_TIPOS = {
+    "object": dict, "array": list, "string": str,
+    "integer": int, "number": (int, float), "boolean": bool, "null": type(None),
+}
+
+def validar(instancia, esquema: dict, ruta: str = "$") -> list:
+    """
+    Validador mínimo de JSON Schema (type, required, properties, items, enum,
+    minLength, minItems). Devuelve la lista de errores; vacía si es válido.
+    """
+    errores = []
+    tipos = esquema.get("type")
+    if tipos:
+        tipos = tipos if isinstance(tipos, list) else [tipos]
+        if not any(isinstance(instancia, _TIPOS[t]) and not (t in ("integer", "number") and isinstance(instancia, bool)) for t in tipos):
+            return [f"{ruta}: se esperaba {' o '.join(tipos)}, se recibió {type(instancia).__name__}"]
+    if "enum" in esquema and instancia not in esquema["enum"]:
+        errores.append(f"{ruta}: valor {instancia!r} no permitido (opciones: {esquema['enum']})")
+    if isinstance(instancia, str) and len(instancia) < esquema.get("minLength", 0):
+        errores.append(f"{ruta}: no puede estar vacío")
+    if isinstance(instancia, dict):
+        for clave in esquema.get("required", []):
+            if clave not in instancia:
+                errores.append(f"{ruta}: falta la clave obligatoria '{clave}'")
+        for clave, subesquema in esquema.get("properties", {}).items():
+            if clave in instancia:
+                errores.extend(validar(instancia[clave], subesquema, f"{ruta}.{clave}"))
+    if isinstance(instancia, list):
+        if len(instancia) < esquema.get("minItems", 0):
+            errores.append(f"{ruta}: necesita al menos {esquema['minItems']} elemento(s)")
+        if "items" in esquema:
+            for i, elemento in enumerate(instancia):
+                errores.extend(validar(elemento, esquema["items"], f"{ruta}[{i}]"))
+    return errores
+
+def validar_entrada_files(entrada) -> list:
+    """Valida una entrada de 'files' y, si es un fichero con esquema propio, su contenido."""
+    errores = validar(entrada, ESQUEMA_ENTRADA_FILES, "$.files[]")
+    if errores:
+        return errores
+    accion = entrada.get("action", "create_or_update")
+    if accion in CLAVE_POR_ACCION and CLAVE_POR_ACCION[accion] not in entrada:
+        return [f"{entrada['filename']}: la acción '{accion}' necesita la clave '{CLAVE_POR_ACCION[accion]}'"]
+    esquema_contenido = ESQUEMAS_POR_FICHERO.get(entrada["filename"].replace("\\", "/").split("/")[-1])
+    # Los parches solo se pueden validar una vez aplicados; aquí se valida el contenido completo.
+    if esquema_contenido and accion == "create_or_update":
+        contenido = entrada.get("code")
+        if isinstance(contenido, str):
+            try: contenido = json.loads(contenido)
+            except json.JSONDecodeError as e:
+                return [f"{entrada['filename']}: el contenido no es JSON válido ({e})"]
+        errores.extend(validar(contenido, esquema_contenido, entrada["filename"]))
+    return errores
+
+def extraer_json(texto: str):
+    """Extrae el bloque {...} de una respuesta del LLM (JSON estricto o dict de Python)."""
+    match = re.search(r'\{.*\}', texto or "", re.DOTALL)
+    if not match:
+        raise ValueError("Respuesta del LLM no contiene un bloque JSON identificable.")
+    try:
+        return json.loads(match.group(0))
+    except json.JSONDecodeError as e:
+        try:
+            return ast.literal_eval(match.group(0))
+        except Exception:
+            raise ValueError(f"La respuesta del LLM no es ni JSON válido ni un diccionario de Python interpretable: {e}")
+
+def opciones_salida_estructurada(config: dict, esquema: dict, nombre: str = "respuesta") -> dict:
+    """
+    Parámetros extra para pedir salida estructurada al backend, si la config lo
+    activa con "salida_estructurada": true. OpenAI compatible usa response_format
+    con json_schema; Gemini, generation_config con response_mime_type.
+    """
+    if not esquema or not config.get("salida_estructurada"):
+        return {}
+    if config.get("api_base") or config.get("api_bases"):
+        return {"response_format": {"type": "json_schema", "json_schema": {"name": nombre, "schema": esquema}}}
+    return {"generation_config": {"response_mime_type": "application/json"}}
+
+def prompt_reparacion(respuesta: str, errores: list, esquema: dict) -> str:
+    return (
+        "La siguiente respuesta debía ser un único objeto JSON conforme al esquema indicado, "
+        "pero tiene estos problemas:\n- " + "\n- ".join(errores) +
+        f"\n\nESQUEMA JSON:\n{json.dumps(esquema, ensure_ascii=False)}"
+        f"\n\nRESPUESTA A CORREGIR:\n{respuesta}"
+        "\n\nDevuelve ÚNICAMENTE el objeto JSON corregido, conservando todo el contenido válido. "
+        "No añadas explicaciones ni bloques de markdown."
+    )
+
+def obtener_json_valido(texto: str, esquema: dict, reparar, intentos: int = REINTENTOS_REPARACION_POR_DEFECTO,
+                        validador=None, log=print) -> dict:
+    """
+    Extrae y valida el JSON de 'texto'. Si falla, pide a 'reparar(prompt) -> str'
+    una versión corregida, hasta 'intentos' veces. Lanza ValueError si no lo logra.
+    """
+    validador = validador or (lambda instancia: validar(instancia, esquema))
+    for intento in range(intentos + 1):
+        try:
+            instancia = extraer_json(texto)
+            errores = validador(instancia)
+        except ValueError as e:
+            errores = [str(e)]
+        if not errores:
+            return instancia
+        if intento == intentos:
+            break
+        log(f"   - Respuesta no válida ({len(errores)} error(es): {errores[0]}). Pidiendo reparación {intento + 1}/{intentos}...")
+        texto = reparar(prompt_reparacion(texto, errores, esquema))
+    raise ValueError(f"La respuesta sigue sin cumplir el esquema tras {intentos} reparación(es): {errores[:3]}")
+
+def validar_payload_files(instancia) -> list:
+    """Validador del objeto {'files': [...]} completo, incluyendo esquemas por fichero."""
+    errores = validar(instancia, ESQUEMA_FILES)
+    if errores:
+        return errores
+    for entrada in instancia["files"]:
+        errores.extend(validar_entrada_files(entrada))
+    return errores
+
+def respuesta_valida(texto: str, esquema: dict = None) -> bool:
+    """¿Contiene 'texto' un JSON que cumple 'esquema' (sin pedir reparaciones)? Sin esquema basta con que no esté vacío."""
+    if not esquema:
+        return bool(texto and texto.strip())
+    validador = validar_payload_files if esquema is ESQUEMA_FILES else (lambda instancia: validar(instancia, esquema))
+    try:
+        return not validador(extraer_json(texto))
+    except ValueError:
+        return False
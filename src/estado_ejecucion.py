@@ -0,0 +1,85 @@
+# src/estado_ejecucion.py (Checkpoints por etapa para reanudar una tarea)
+# Por cada tarea se guarda qué etapas terminaron y el commit que dejaron. Si el
+# orquestador muere a mitad de workflow, la siguiente ejecución salta las etapas
+# completadas cuyo commit sigue en el repo y continúa desde la primera pendiente.
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+DIRECTORIO_POR_DEFECTO = "estado_tareas"
+
+class EstadoEjecucion:
+    def __init__(self, ruta: str, huella_tarea: str, datos: dict = None):
+        self.ruta = ruta
+        self.huella_tarea = huella_tarea
+        self.datos = datos or {"huella_tarea": huella_tarea, "etapas": []}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def cargar(cls, directorio: str, task_file: str, contenido_tarea: bytes, log=print):
+        """Estado guardado de la tarea; se descarta si el fichero de tarea cambió desde entonces."""
+        ruta = os.path.join(directorio, os.path.splitext(task_file)[0] + ".json")
+        huella = hashlib.sha256(contenido_tarea).hexdigest()
+        try:
+            with open(ruta, "r", encoding="utf-8") as f: datos = json.load(f)
+        except (OSError, ValueError):
+            return cls(ruta, huella)
+        if datos.get("huella_tarea") != huella:
+            log("El fichero de tarea cambió desde la última ejecución: se descartan sus checkpoints.", "WARNING")
+            return cls(ruta, huella)
+        return cls(ruta, huella, datos)
+
+    @property
+    def completadas(self) -> list:
+        """[{'etapa', 'commit', 'fin'}] en el orden en que terminaron."""
+        return list(self.datos["etapas"])
+
+    def registrar(self, etapa: str, commit: str):
+        with self._lock:
+            self.datos["etapas"].append({"etapa": etapa, "commit": commit, "fin": time.time()})
+            self._guardar()
+
+    def _guardar(self):
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.ruta) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.datos, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.ruta)
+
+    def pendientes(self, etapas: list, commit_presente, desde: str = None) -> list:
+        """
+        Etapas que quedan por ejecutar. Se salta el prefijo del workflow ya
+        completado cuyo commit siga presente ('commit_presente(sha) -> bool'), o
+        todo lo anterior a 'desde' si se indica. Una etapa repetida en el workflow
+        cuenta como completada tantas veces como se haya registrado.
+        """
+        if desde:
+            if desde not in etapas: raise ValueError(f"La etapa '{desde}' no está en el workflow {etapas}.")
+            return etapas[etapas.index(desde):]
+        restantes = {}
+        for registro in self.datos["etapas"]:
+            restantes.setdefault(registro["etapa"], []).append(registro["commit"])
+        for i, etapa in enumerate(etapas):
+            commits = restantes.get(etapa)
+            if not commits or not commit_presente(commits.pop(0)):
+                return etapas[i:]
+        return []
+
+    def conservar(self, etapas_saltadas: list):
+        """Deja solo los checkpoints de las etapas que se saltan; el resto se va a reejecutar."""
+        with self._lock:
+            registros, conservados = list(self.datos["etapas"]), []
+            for etapa in etapas_saltadas:
+                registro = next((r for r in registros if r["etapa"] == etapa), None)
+                if registro:
+                    registros.remove(registro)
+                    conservados.append(registro)
+            self.datos["etapas"] = conservados
+            self._guardar()
+
+    def borrar(self):
+        try: os.remove(self.ruta)
+        except FileNotFoundError: pass
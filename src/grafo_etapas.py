@@ -0,0 +1,92 @@
+# src/grafo_etapas.py (Ejecución de 'etapas_a_ejecutar' como grafo de dependencias)
+# Las etapas independientes (p. ej. backend-doc y frontend-dev) se lanzan a la
+# vez; el resto espera a las etapas anteriores de las que depende.
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+def _partes(etapa: str):
+    """'backend-dev' -> ('backend', 'dev'); 'documentacion' -> ('documentacion', None)."""
+    if "-" in etapa:
+        componente, fase = etapa.rsplit("-", 1)
+        return componente, fase
+    return etapa, None
+
+def _depende_de_componentes(plan: dict, componente: str) -> set:
+    """Dependencias explícitas del plan: cada etapa puede declarar "depende_de": ["backend", ...]."""
+    for etapa_info in (plan or {}).get("plan", []):
+        if etapa_info.get("etapa") == componente:
+            return set(etapa_info.get("depende_de", []))
+    return set()
+
+def depende(posterior: str, anterior: str, plan: dict = None) -> bool:
+    """¿Debe 'posterior' esperar a 'anterior' (que aparece antes en el workflow)?"""
+    if posterior == anterior or "planificacion" in (posterior, anterior):
+        return True
+    comp_b, fase_b = _partes(posterior)
+    comp_a, fase_a = _partes(anterior)
+
+    if posterior == "documentacion":
+        return fase_a == "dev"
+    if anterior == "documentacion":
+        return fase_b == "dev"  # Un -dev posterior no debe pisar el README que se está generando.
+
+    if fase_b == "dev":
+        if comp_a == comp_b: return True  # Re-construcción tras un QA/doc del mismo componente.
+        if comp_b == "frontend" and anterior == "backend-dev": return True  # El frontend consume la API.
+        return fase_a == "dev" and comp_a in _depende_de_componentes(plan, comp_b)
+    if fase_b == "qa":
+        if comp_b == "e2e": return fase_a == "dev"  # E2E prueba la aplicación completa.
+        return anterior == f"{comp_b}-dev"
+    if fase_b == "doc":
+        return anterior == f"{comp_b}-dev"
+    # Etapas desconocidas: conservamos el orden del workflow.
+    return True
+
+def construir_dependencias(etapas: list, plan: dict = None) -> dict:
+    """Índice de etapa -> conjunto de índices de etapas previas de las que depende."""
+    return {
+        i: {j for j in range(i) if depende(etapas[i], etapas[j], plan)}
+        for i in range(len(etapas))
+    }
+
+def ejecutar_grafo(etapas: list, dependencias: dict, ejecutar, paralelismo: int = 2, log=print) -> bool:
+    """
+    Ejecuta 'ejecutar(etapa) -> bool' respetando las dependencias, con como mucho
+    'paralelismo' etapas a la vez. Fail-fast: si una etapa falla (o lanza una
+    excepción) no se lanzan más etapas, se esperan las que están en curso y se
+    devuelve False.
+    """
+    pendientes = set(range(len(etapas)))
+    completadas = set()
+    en_curso = {}
+    exito = True
+
+    with ThreadPoolExecutor(max_workers=max(1, paralelismo), thread_name_prefix="etapa") as pool:
+        while pendientes or en_curso:
+            if exito:
+                listas = sorted(i for i in pendientes if dependencias[i] <= completadas)
+                for i in listas[:max(0, paralelismo - len(en_curso))]:
+                    pendientes.discard(i)
+                    en_curso[pool.submit(ejecutar, etapas[i])] = i
+                if len(en_curso) > 1:
+                    log(f"Etapas en paralelo: {[etapas[i] for i in sorted(en_curso.values())]}")
+            elif not en_curso:
+                break
+            if not en_curso:
+                break # Sin nada en curso ni etapas listas: no debería ocurrir (las dependencias apuntan hacia atrás).
+
+            terminadas, _ = wait(list(en_curso), return_when=FIRST_COMPLETED)
+            for future in terminadas:
+                i = en_curso.pop(future)
+                try:
+                    resultado = future.result()
+                except Exception as e:
+                    log(f"La etapa '{etapas[i]}' lanzó una excepción: {e}")
+                    resultado = False
+                if resultado:
+                    completadas.add(i)
+                else:
+                    exito = False
+
+    if not exito and pendientes:
+        log(f"Etapas no ejecutadas por fail-fast: {[etapas[i] for i in sorted(pendientes)]}")
+    return exito
@@ -0,0 +1,168 @@
+# src/impacto_tests.py (Selección de tests por impacto y pytest en shards)
+# Cada fichero de test se asocia a los ficheros del proyecto que importa (de
+# forma transitiva). En un ciclo de FIX se ejecutan primero los tests afectados
+# por lo que cambió desde el último commit en verde. Repartirlos en varios
+# procesos (shards) es opcional: la suite del proyecto puede compartir recursos
+# (una base SQLite, un puerto) que no soportan ejecuciones en paralelo.
+import os
+import re
+import ast
+import json
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+DIRECTORIOS_IGNORADOS = {".git", "node_modules", "venv", ".venv", "__pycache__", ".pytest_cache", "build", "dist"}
+FICHERO_ESTADO_QA = "colmena_estado_qa.json"  # Dentro de .git (el común a todos los worktrees): nunca se commitea.
+SIN_TESTS = 5  # Código de salida de pytest cuando no recoge ningún test.
+
+def es_fichero_de_test(ruta: str) -> bool:
+    nombre = os.path.basename(ruta)
+    return nombre.endswith(".py") and (nombre.startswith("test_") or nombre.endswith("_test.py"))
+
+def _ficheros_python(repo_path: str) -> list:
+    ficheros = []
+    for root, dirs, files in os.walk(repo_path):
+        dirs[:] = [d for d in dirs if d not in DIRECTORIOS_IGNORADOS]
+        for nombre in files:
+            if nombre.endswith(".py"):
+                ficheros.append(os.path.relpath(os.path.join(root, nombre), repo_path).replace("\\", "/"))
+    return sorted(ficheros)
+
+def _modulos_importados(repo_path: str, rel: str) -> set:
+    try:
+        with open(os.path.join(repo_path, rel), "r", encoding="utf-8") as f:
+            arbol = ast.parse(f.read(), filename=rel)
+    except (SyntaxError, UnicodeDecodeError, OSError):
+        return set()
+    paquete = rel.rsplit("/", 1)[0].replace("/", ".") if "/" in rel else ""
+    modulos = set()
+    for nodo in ast.walk(arbol):
+        if isinstance(nodo, ast.Import):
+            modulos.update(alias.name for alias in nodo.names)
+        elif isinstance(nodo, ast.ImportFrom):
+            base = nodo.module or ""
+            if nodo.level:  # Import relativo: se resuelve desde el paquete del fichero.
+                partes = paquete.split(".") if paquete else []
+                partes = partes[:len(partes) - (nodo.level - 1)] if nodo.level > 1 else partes
+                base = ".".join(p for p in [*partes, base] if p)
+            modulos.add(base)
+            modulos.update(f"{base}.{alias.name}" if base else alias.name for alias in nodo.names)
+    # Importar 'a.b.c' ejecuta también los __init__ de 'a' y 'a.b'.
+    return {".".join(m.split(".")[:i]) for m in modulos if m for i in range(1, m.count(".") + 2)}
+
+def construir_mapa_dependencias(repo_path: str) -> dict:
+    """Fichero de test -> conjunto de ficheros del proyecto de los que depende (incluido él mismo)."""
+    ficheros = _ficheros_python(repo_path)
+    # Un módulo se resuelve por su ruta completa o por sufijo (p. ej. 'app.models' o 'models' con src/ en el path).
+    por_modulo = {}
+    for rel in ficheros:
+        modulo = rel[:-3].replace("/", ".")
+        if modulo.endswith(".__init__"): modulo = modulo[:-len(".__init__")]
+        partes = modulo.split(".")
+        for i in range(len(partes)):
+            por_modulo.setdefault(".".join(partes[i:]), rel)
+
+    directas = {rel: {por_modulo[m] for m in _modulos_importados(repo_path, rel) if m in por_modulo} for rel in ficheros}
+    mapa = {}
+    for test in (f for f in ficheros if es_fichero_de_test(f)):
+        visitados, pendientes = set(), [test]
+        while pendientes:
+            actual = pendientes.pop()
+            if actual in visitados: continue
+            visitados.add(actual)
+            pendientes.extend(directas.get(actual, ()))
+        mapa[test] = visitados
+    return mapa
+
+def _git(repo_path: str, *argumentos) -> str:
+    resultado = subprocess.run(["git", *argumentos], cwd=repo_path, capture_output=True, text=True, encoding="utf-8")
+    return resultado.stdout if resultado.returncode == 0 else ""
+
+def _ruta_estado(repo_path: str) -> str:
+    return os.path.join(repo_path, _git(repo_path, "rev-parse", "--git-common-dir").strip() or ".git", FICHERO_ESTADO_QA)
+
+def leer_estado_qa(repo_path: str) -> dict:
+    """{'verde': commit con la suite completa en verde, 'ultima_qa': commit de la última QA, 'fallidos': [tests]}."""
+    try:
+        with open(_ruta_estado(repo_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def registrar_resultado(repo_path: str, resultado: subprocess.CompletedProcess, suite_completa: bool):
+    """Guarda el commit evaluado y los ficheros de test que fallaron para la siguiente QA."""
+    head = _git(repo_path, "rev-parse", "HEAD").strip()
+    if not head:
+        return
+    estado = leer_estado_qa(repo_path)
+    estado["ultima_qa"] = head
+    if resultado.returncode in (0, SIN_TESTS):
+        estado["fallidos"] = [] if suite_completa else estado.get("fallidos", [])
+        if suite_completa: estado["verde"] = head
+    else:
+        estado["fallidos"] = sorted(set(re.findall(r"^(?:FAILED|ERROR) ([^\s:]+\.py)", resultado.stdout, re.MULTILINE)))
+    with open(_ruta_estado(repo_path), "w", encoding="utf-8") as f:
+        json.dump(estado, f)
+
+def ficheros_cambiados(repo_path: str, desde: str) -> set:
+    """Cambios entre 'desde' y el árbol de trabajo (commits nuevos y cambios sin commitear)."""
+    cambiados = set(_git(repo_path, "diff", "--name-only", desde).split())
+    for linea in _git(repo_path, "status", "--porcelain", "--untracked-files=all").splitlines():
+        cambiados.add(linea[3:].split(" -> ")[-1].strip('"'))
+    return {c for c in cambiados if c}
+
+def tests_afectados(repo_path: str, cambiados: set) -> list:
+    mapa = construir_mapa_dependencias(repo_path)
+    return sorted(test for test, dependencias in mapa.items() if dependencias & cambiados)
+
+def seleccionar_tests(repo_path: str):
+    """
+    Tests a ejecutar primero: los afectados por los cambios desde el último
+    commit en verde (o desde la última QA) más los que fallaron entonces.
+    Devuelve (tests, descripción de la base); tests None = no hay base, suite completa.
+    """
+    estado = leer_estado_qa(repo_path)
+    base = estado.get("verde") or estado.get("ultima_qa")
+    if not base or subprocess.run(["git", "cat-file", "-e", f"{base}^{{commit}}"], cwd=repo_path, capture_output=True).returncode != 0:
+        return None, "sin QA previa"
+    existentes = {t for t in estado.get("fallidos", []) if os.path.exists(os.path.join(repo_path, t))}
+    tests = sorted(set(tests_afectados(repo_path, ficheros_cambiados(repo_path, base))) | existentes)
+    return tests, f"cambios desde {base[:8]}" + (f" + {len(existentes)} fallido(s) antes" if existentes else "")
+
+def repartir_en_shards(tests: list, shards: int) -> list:
+    """Reparte los ficheros de test por tamaño (el más grande al shard menos cargado)."""
+    cargas = [[0, []] for _ in range(max(1, min(shards, len(tests))))]
+    for test, tamano in sorted(((t, os.path.getsize(t) if os.path.exists(t) else 0) for t in tests), key=lambda x: -x[1]):
+        carga = min(cargas, key=lambda c: c[0])
+        carga[0] += tamano
+        carga[1].append(test)
+    return [sorted(grupo) for _, grupo in cargas if grupo]
+
+def ejecutar_pytest(python: str, repo_path: str, tests: list = None, shards: int = None) -> subprocess.CompletedProcess:
+    """
+    Ejecuta pytest con 'tests' (None = toda la suite, con el descubrimiento
+    normal de pytest) repartido en 'shards' procesos (por defecto uno). Devuelve
+    un CompletedProcess combinado: returncode 0 si todo pasó, 5 si ningún shard
+    recogió tests, o el primer código de fallo.
+    """
+    shards = shards or 1
+    if tests is None:
+        tests = [t for t in _ficheros_python(repo_path) if es_fichero_de_test(t)] if shards > 1 else []
+        if not tests:  # Un solo proceso o sin ficheros de test reconocibles: dejamos que pytest decida.
+            return subprocess.run([python, "-m", "pytest"], cwd=repo_path, capture_output=True, text=True, encoding="utf-8")
+    grupos = repartir_en_shards([os.path.join(repo_path, t) for t in tests], shards)
+    grupos = [[os.path.relpath(t, repo_path) for t in grupo] for grupo in grupos]
+
+    def ejecutar(grupo):
+        return subprocess.run([python, "-m", "pytest", *grupo], cwd=repo_path, capture_output=True, text=True, encoding="utf-8")
+
+    with ThreadPoolExecutor(max_workers=len(grupos) or 1) as pool:
+        resultados = list(pool.map(ejecutar, grupos))
+
+    codigos = [r.returncode for r in resultados]
+    fallos = [c for c in codigos if c not in (0, SIN_TESTS)]
+    returncode = fallos[0] if fallos else (SIN_TESTS if codigos and all(c == SIN_TESTS for c in codigos) else 0)
+    separador = lambda i: f"\n===== shard {i + 1}/{len(resultados)} =====\n" if len(resultados) > 1 else ""
+    stdout = "".join(separador(i) + r.stdout for i, r in enumerate(resultados))
+    stderr = "".join(separador(i) + r.stderr for i, r in enumerate(resultados) if r.stderr)
+    return subprocess.CompletedProcess([python, "-m", "pytest"], returncode, stdout, stderr)
@@ -0,0 +1,178 @@
+# src/llm_cache.py (Caché persistente de respuestas del LLM)
+# Se usa tanto en el orquestador como dentro de los contenedores de agente
+# (montando el mismo directorio en LLM_CACHE_DIR).
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+import trazas
+import enrutador_llm
+
+MAX_MB_POR_DEFECTO = 512
+MODOS_VALIDOS = ("usar", "bypass", "refrescar")
+FIN_NORMAL = "stop"  # finish_reason de OpenAI; en Gemini, FinishReason.STOP.
+
+class CacheLLM:
+    """
+    Caché en disco direccionada por contenido. Cada entrada es un fichero
+    <dir>/<aa>/<sha256>.json; el mtime hace de marca LRU (se actualiza en cada
+    acierto) y, al superar 'max_bytes', se borran las entradas más antiguas.
+    """
+    def __init__(self, directorio: str, max_bytes: int = MAX_MB_POR_DEFECTO * 1024 * 1024):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        os.makedirs(directorio, exist_ok=True)
+        self._bytes_totales = sum(tamano for _, _, tamano in self._entradas())
+
+    @staticmethod
+    def clave(model_name: str, api_base, temperature: float, prompt: str, opciones: dict = None) -> str:
+        """'opciones' son los parámetros extra que cambian la respuesta (response_format, generation_config...)."""
+        material = json.dumps([model_name or "", api_base or "", temperature, prompt, opciones or {}],
+                              ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, clave[:2], f"{clave}.json")
+
+    def _entradas(self):
+        """Devuelve (ruta, mtime, tamaño) de todas las entradas de la caché."""
+        entradas = []
+        for root, _, files in os.walk(self.directorio):
+            for nombre in files:
+                if not nombre.endswith(".json"): continue
+                ruta = os.path.join(root, nombre)
+                try:
+                    st = os.stat(ruta)
+                    entradas.append((ruta, st.st_mtime, st.st_size))
+                except FileNotFoundError: pass # Otro proceso la ha desalojado.
+        return entradas
+
+    def obtener(self, clave: str):
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                respuesta = json.load(f)["respuesta"]
+            os.utime(ruta) # Marca de uso reciente para el LRU.
+        except (FileNotFoundError, ValueError, KeyError):
+            with self._lock: self.fallos += 1
+            return None
+        with self._lock: self.aciertos += 1
+        trazas.anotar(cache="acierto")
+        return respuesta
+
+    def guardar(self, clave: str, respuesta: str):
+        ruta = self._ruta(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        # Escritura atómica: varios procesos pueden compartir el directorio.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"creado": time.time(), "respuesta": respuesta}, f, ensure_ascii=False)
+        os.replace(tmp, ruta)
+        with self._lock:
+            self._bytes_totales += os.path.getsize(ruta)
+            if self._bytes_totales > self.max_bytes:
+                self._desalojar()
+
+    def _desalojar(self):
+        """Borra las entradas menos usadas hasta quedar por debajo del 90% del límite."""
+        entradas = sorted(self._entradas(), key=lambda e: e[1])
+        total = sum(tamano for _, _, tamano in entradas)
+        objetivo = int(self.max_bytes * 0.9)
+        for ruta, _, tamano in entradas:
+            if total <= objetivo: break
+            try:
+                os.remove(ruta); total -= tamano
+            except FileNotFoundError: pass
+        self._bytes_totales = total
+
+    def resumen(self) -> str:
+        total = self.aciertos + self.fallos
+        ratio = (self.aciertos / total * 100) if total else 0.0
+        return f"Caché LLM: {self.aciertos} aciertos / {self.fallos} fallos ({ratio:.0f}%), {self._bytes_totales / 1024 / 1024:.1f} MB en disco."
+
+_cache_global = None
+_cache_lock = threading.Lock()
+
+def configurar_cache(directorio: str, max_mb: int = MAX_MB_POR_DEFECTO):
+    """Activa la caché del proceso. Con 'directorio' vacío la desactiva."""
+    global _cache_global
+    with _cache_lock:
+        _cache_global = CacheLLM(directorio, max_mb * 1024 * 1024) if directorio else None
+    return _cache_global
+
+def obtener_cache():
+    """Caché del proceso; dentro del contenedor se activa sola si existe LLM_CACHE_DIR."""
+    global _cache_global
+    if _cache_global is None and os.environ.get("LLM_CACHE_DIR"):
+        configurar_cache(os.environ["LLM_CACHE_DIR"], int(os.environ.get("LLM_CACHE_MAX_MB", MAX_MB_POR_DEFECTO)))
+    return _cache_global
+
+def terminada_con_normalidad(motivo) -> bool:
+    """¿El motivo de fin del backend (str de OpenAI o enum de Gemini) indica una respuesta completa?"""
+    return str(getattr(motivo, "name", motivo) or "").lower() == FIN_NORMAL
+
+def clave_de(config: dict, temperature: float, prompt: str, opciones: dict = None) -> str:
+    """Clave de caché con todo lo que da forma a la petición: modelo, backends, temperatura, prompt y opciones."""
+    return CacheLLM.clave(config.get("model_name"), sorted(enrutador_llm.endpoints_de(config)), temperature, prompt, opciones)
+
+def respuesta_con_cache(config: dict, temperature: float, prompt: str, generar, opciones: dict = None, cacheable=None) -> str:
+    """
+    Devuelve la respuesta cacheada para la petición o llama a 'generar()' y la
+    guarda si 'cacheable(respuesta)' lo permite (p. ej. terminó con "stop" y
+    cumple el esquema). config["cache"] admite "usar" (por defecto), "bypass"
+    (ni lee ni escribe) y "refrescar" (ignora la entrada y la reescribe).
+    """
+    modo = config.get("cache", "usar")
+    cache = obtener_cache()
+    if cache is None or modo == "bypass":
+        return generar()
+
+    clave = clave_de(config, temperature, prompt, opciones)
+    if modo != "refrescar":
+        respuesta = cache.obtener(clave)
+        if respuesta is not None:
+            print(f"   - Respuesta del LLM servida desde la caché ({clave[:12]}).")
+            return respuesta
+
+    respuesta = generar()
+    if respuesta and (cacheable is None or cacheable(respuesta)):
+        cache.guardar(clave, respuesta)
+    return respuesta
+
+def stream_con_cache(config: dict, temperature: float, prompt: str, generar_stream, opciones: dict = None, cacheable=None):
+    """
+    Versión streaming de respuesta_con_cache: 'generar_stream()' devuelve un
+    iterador de trozos de texto. En un acierto se entrega la respuesta cacheada
+    de una vez; en un fallo se reenvían los trozos y, si el stream se agota y
+    'cacheable(total)' lo permite, se guarda el total. Un stream cortado o una
+    respuesta inválida no se guardan: se repetirían en cada reejecución.
+    """
+    modo = config.get("cache", "usar")
+    cache = obtener_cache()
+    if cache is None or modo == "bypass":
+        yield from generar_stream()
+        return
+
+    clave = clave_de(config, temperature, prompt, opciones)
+    if modo != "refrescar":
+        respuesta = cache.obtener(clave)
+        if respuesta is not None:
+            print(f"   - Respuesta del LLM servida desde la caché ({clave[:12]}).")
+            yield respuesta
+            return
+
+    trozos = []
+    for trozo in generar_stream():
+        trozos.append(trozo)
+        yield trozo
+    respuesta = "".join(trozos)
+    if respuesta and (cacheable is None or cacheable(respuesta)):
+        cache.guardar(clave, respuesta)
+    elif respuesta:
+        print(f"   - Respuesta incompleta o no válida: no se guarda en la caché ({clave[:12]}).")
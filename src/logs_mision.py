@@ -0,0 +1,105 @@
+# src/logs_mision.py (Logs de misión en streaming, acotados y con plazo)
+# La salida del contenedor se vuelca a disco mientras corre, con rotación por
+# tamaño, en lugar de cargar container.logs() entero en memoria al final. En RAM
+# solo quedan las últimas líneas (para el informe de error) y un trozo de línea.
+import os
+import threading
+import collections
+import requests
+
+MAX_BYTES_POR_DEFECTO = 10 * 1024 * 1024
+COPIAS_POR_DEFECTO = 3
+LINEAS_COLA = 50
+MAX_LINEA = 64 * 1024  # Una "línea" sin salto más larga que esto se corta.
+CODIGO_PLAZO_AGOTADO = 124  # Como timeout(1).
+
+class RegistroMision:
+    """
+    Fichero de log de una misión con rotación: ruta, ruta.1 ... ruta.N (la
+    más antigua se descarta). 'eco(linea)', si se indica, recibe cada línea
+    completa en cuanto llega (seguimiento en vivo).
+    """
+    def __init__(self, ruta: str, max_bytes: int = MAX_BYTES_POR_DEFECTO, copias: int = COPIAS_POR_DEFECTO, eco=None):
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self.copias = copias
+        self.eco = eco
+        self.cola = collections.deque(maxlen=LINEAS_COLA)
+        self.bytes_totales = 0
+        self._pendiente = b""
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        self._fichero = open(ruta, "wb")
+        self._bytes_fichero = 0
+
+    def _rotar(self):
+        self._fichero.close()
+        for i in range(self.copias, 0, -1):
+            origen = self.ruta if i == 1 else f"{self.ruta}.{i - 1}"
+            if os.path.exists(origen): os.replace(origen, f"{self.ruta}.{i}")
+        self._fichero = open(self.ruta, "wb")
+        self._bytes_fichero = 0
+
+    def escribir(self, datos: bytes):
+        with self._lock:
+            if self._fichero.closed:
+                return  # Un lector rezagado tras cerrar la misión.
+            if self._bytes_fichero + len(datos) > self.max_bytes and self._bytes_fichero:
+                self._rotar()
+            self._fichero.write(datos)
+            self._fichero.flush()
+            self._bytes_fichero += len(datos)
+            self.bytes_totales += len(datos)
+            self._pendiente += datos
+            *lineas, self._pendiente = self._pendiente.split(b"\n")
+            if len(self._pendiente) > MAX_LINEA:
+                lineas.append(self._pendiente); self._pendiente = b""
+            for linea in lineas:
+                texto = linea[:MAX_LINEA].decode("utf-8", errors="replace").rstrip("\r")
+                self.cola.append(texto)
+                if self.eco: self.eco(texto)
+
+    def ultimas_lineas(self) -> str:
+        with self._lock:
+            return "\n".join(self.cola)
+
+    def cerrar(self, renombrar_a: str = None) -> str:
+        """Cierra el fichero y, si se indica, lo renombra junto con sus copias rotadas. Devuelve la ruta final."""
+        with self._lock:
+            if self._pendiente:
+                texto = self._pendiente.decode("utf-8", errors="replace")
+                self.cola.append(texto)
+                if self.eco: self.eco(texto)
+                self._pendiente = b""
+            self._fichero.close()
+            if renombrar_a and renombrar_a != self.ruta:
+                for i in range(self.copias + 1):
+                    sufijo = f".{i}" if i else ""
+                    if os.path.exists(self.ruta + sufijo): os.replace(self.ruta + sufijo, renombrar_a + sufijo)
+                self.ruta = renombrar_a
+            return self.ruta
+
+def seguir_logs(container, registro: RegistroMision) -> threading.Thread:
+    """Hilo que vuelca la salida del contenedor en 'registro' hasta que el contenedor termina."""
+    def seguir():
+        try:
+            for trozo in container.logs(stream=True, follow=True):
+                registro.escribir(trozo)
+        except Exception as e:
+            registro.escribir(f"\n[orquestador] Se perdió el flujo de logs del contenedor: {e}\n".encode("utf-8"))
+    hilo = threading.Thread(target=seguir, name=f"logs-{getattr(container, 'short_id', '')}", daemon=True)
+    hilo.start()
+    return hilo
+
+def esperar(container, plazo: float = None):
+    """
+    container.wait() con plazo en segundos. Si se agota, mata el contenedor y
+    devuelve None; si no, el dict de wait() ({'StatusCode': ...}).
+    """
+    try:
+        return container.wait(timeout=plazo) if plazo else container.wait()
+    except requests.exceptions.RequestException:
+        # docker-py señala el plazo agotado con ReadTimeout/ConnectionError de requests.
+        try: container.kill()
+        except Exception: pass
+        return None
@@ -0,0 +1,116 @@
+# src/memo_etapas.py (Memoización de etapas -dev y -doc por huella de entradas)
+# La huella de una etapa resume todo lo que recibe el LLM (tareas del plan,
+# plantilla de prompt, guías de estilo, código relevante y config del modelo).
+# Si coincide con la de su última ejecución correcta y los ficheros que produjo
+# siguen intactos en disco, la etapa se da por hecha sin llamar al LLM. Lo que
+# cuenta es el working tree, no HEAD: un fichero borrado en disco pero aún en
+# HEAD se perdería en el siguiente commit_etapa (git add -A).
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import subprocess
+
+DIRECTORIO_POR_DEFECTO = "memo_etapas"
+# Claves del contexto que no influyen en lo que genera el LLM.
+CLAVES_IGNORADAS = {
+    "github_pat", "github_repo", "github_org", "etapas_a_ejecutar", "etapa_actual", "plan_de_origen",
+    "cache_llm", "paralelismo_etapas", "git_checkpoints", "reanudar_desde", "memoizar_etapas",
+    "volumen_compartido", "doc_resumenes_en_paralelo",
+}
+CLAVES_LLM_IGNORADAS = {"api_key", "cache", "streaming", "max_peticiones_en_vuelo", "cache_prefijo", "clave_cache_prefijo"}
+
+def huella(*partes) -> str:
+    """sha256 de las partes serializadas de forma canónica (dicts con claves ordenadas)."""
+    material = json.dumps(partes, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def contexto_relevante(contexto: dict) -> dict:
+    relevante = {k: v for k, v in contexto.items() if k not in CLAVES_IGNORADAS and not k.startswith(("qa_", "e2e_"))}
+    if isinstance(relevante.get("llm_config"), dict):
+        relevante["llm_config"] = {k: v for k, v in relevante["llm_config"].items() if k not in CLAVES_LLM_IGNORADAS}
+    return relevante
+
+def _git(repo_path: str, *argumentos) -> str:
+    resultado = subprocess.run(["git", *argumentos], cwd=repo_path, capture_output=True, text=True, encoding="utf-8")
+    return resultado.stdout if resultado.returncode == 0 else ""
+
+def arbol_actual(repo_path: str) -> str:
+    return _git(repo_path, "rev-parse", "HEAD^{tree}").strip()
+
+def _blobs_en_disco(repo_path: str, rutas: list) -> dict:
+    """ruta -> hash del blob que tendría el fichero en disco al hacer git add (None si no existe)."""
+    blobs = dict.fromkeys(rutas)
+    existentes = [r for r in rutas if os.path.isfile(os.path.join(repo_path, r))]
+    if existentes:
+        hashes = _git(repo_path, "hash-object", "--", *existentes).split()
+        if len(hashes) == len(existentes):
+            blobs.update(zip(existentes, hashes))
+    return blobs
+
+class MemoEtapas:
+    """Registro por proyecto: etapa -> {'huella', 'salidas': {ruta: blob}, 'fin'}."""
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+
+    def _leer(self) -> dict:
+        try:
+            with open(self.ruta, "r", encoding="utf-8") as f: return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _guardar(self, datos: dict):
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.ruta) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.ruta)
+
+    def vigente(self, etapa: str, huella_entradas: str, repo_path: str) -> bool:
+        """
+        ¿Coincide la huella y están en disco los mismos ficheros que dejó la última
+        ejecución? Si falta alguno de ellos, la entrada se descarta.
+        """
+        with self._lock:
+            registro = self._leer().get(etapa)
+        if not registro or registro.get("huella") != huella_entradas:
+            return False
+        salidas = registro.get("salidas", {})
+        en_disco = _blobs_en_disco(repo_path, list(salidas))
+        if any(blob and en_disco[ruta] is None for ruta, blob in salidas.items()):
+            self.olvidar(etapa)
+            return False
+        return en_disco == salidas
+
+    def registrar(self, etapa: str, huella_entradas: str, repo_path: str, arbol_antes: str, salidas: list = None):
+        """
+        Guarda la huella y los ficheros producidos: 'salidas' o, si no se indican,
+        los que cambiaron entre 'arbol_antes' y HEAD.
+        """
+        if salidas is None:
+            arbol_despues = arbol_actual(repo_path)
+            salidas = [r for r in _git(repo_path, "diff", "--name-only", "-z", arbol_antes, arbol_despues).split("\0") if r] if arbol_antes else []
+        blobs = _blobs_en_disco(repo_path, salidas)
+        with self._lock:
+            datos = self._leer()
+            datos[etapa] = {"huella": huella_entradas, "salidas": blobs, "fin": time.time()}
+            self._guardar(datos)
+
+    def olvidar(self, etapa: str = None):
+        """Descarta la entrada de 'etapa' (o todas, p. ej. tras vaciar el workspace)."""
+        with self._lock:
+            datos = self._leer()
+            if etapa is None and datos or etapa in datos:
+                self._guardar({} if etapa is None else {k: v for k, v in datos.items() if k != etapa})
+
+_memos = {}
+_memos_lock = threading.Lock()
+
+def obtener_memo(directorio: str, proyecto: str) -> MemoEtapas:
+    """Un MemoEtapas por proyecto y proceso (comparte el lock entre etapas en paralelo)."""
+    ruta = os.path.join(directorio, f"{proyecto}.json")
+    with _memos_lock:
+        return _memos.setdefault(os.path.abspath(ruta), MemoEtapas(ruta))
@@ -0,0 +1,110 @@
+# src/parches.py (Aplicación de parches del protocolo "files")
+# Las acciones "patch" (diff unificado) y "search_replace" permiten al LLM
+# devolver solo lo que cambia de un fichero. Los modelos rara vez aciertan los
+# números de línea ni el espaciado exacto, así que cada bloque se localiza por
+# su contenido: primero exacto, luego ignorando espacios al final o a ambos
+# lados de cada línea, y por último recortando líneas de contexto (como el
+# "fuzz" de GNU patch). Si aun así no encaja se lanza ParcheNoAplicable.
+import re
+
+MAX_FUZZ = 2  # Líneas de contexto que se pueden descartar por cada extremo del bloque.
+_CABECERA_BLOQUE = re.compile(r"^@@\s*-(\d+)(?:,\d+)?\s+\+\d+(?:,\d+)?\s*@@")
+_NORMALIZACIONES = (lambda linea: linea, str.rstrip, str.strip)
+
+class ParcheNoAplicable(ValueError):
+    pass
+
+def _bloques(diff: str) -> list:
+    """[(línea de inicio aproximada o None, [(marca, texto)], contexto inicial, contexto final)]."""
+    bloques, actual = [], None
+    for linea in diff.splitlines():
+        if linea.startswith("@@"):
+            cabecera = _CABECERA_BLOQUE.match(linea)
+            actual = {"inicio": int(cabecera.group(1)) - 1 if cabecera else None, "lineas": []}
+            bloques.append(actual)
+        elif linea.startswith(("--- ", "+++ ", "diff ", "index ")) and (actual is None or not actual["lineas"]):
+            continue
+        elif linea.startswith("\\"):
+            continue  # "\ No newline at end of file"
+        else:
+            if actual is None:  # Diff sin cabecera @@: un único bloque.
+                actual = {"inicio": None, "lineas": []}
+                bloques.append(actual)
+            actual["lineas"].append(linea)
+    resultado = []
+    for bloque in bloques:
+        filas = [(linea[0], linea[1:]) if linea[:1] in (" ", "-", "+") else (" ", linea) for linea in bloque["lineas"]]
+        marcas = [marca for marca, _ in filas]
+        if not marcas or all(m == " " for m in marcas):
+            continue
+        contexto_inicial = next((i for i, m in enumerate(marcas) if m != " "), 0)
+        contexto_final = next((i for i, m in enumerate(reversed(marcas)) if m != " "), 0)
+        resultado.append((bloque["inicio"], filas, contexto_inicial, contexto_final))
+    return resultado
+
+def _localizar(lineas: list, buscadas: list, desde: int, pista: int = None) -> int:
+    """Índice donde 'buscadas' aparece en 'lineas' a partir de 'desde' (el más cercano a 'pista'), o -1."""
+    if not buscadas:
+        return min(max(pista if pista is not None else len(lineas), desde), len(lineas))
+    for normalizar in _NORMALIZACIONES:
+        objetivo = [normalizar(l) for l in buscadas]
+        normalizadas = [normalizar(l) for l in lineas]
+        candidatos = [i for i in range(desde, len(lineas) - len(objetivo) + 1) if normalizadas[i:i + len(objetivo)] == objetivo]
+        if candidatos:
+            return min(candidatos, key=lambda i: abs(i - pista)) if pista is not None else candidatos[0]
+    return -1
+
+def aplicar_diff(texto: str, diff: str) -> str:
+    """Aplica un diff unificado a 'texto'. Lanza ParcheNoAplicable si algún bloque no encaja."""
+    bloques = _bloques(diff)
+    if not bloques:
+        raise ParcheNoAplicable("el diff no contiene ningún bloque con cambios")
+    lineas = texto.splitlines()
+    final_con_salto = texto.endswith("\n") or not texto
+    desde, desplazamiento = 0, 0
+    for numero, (inicio, filas, contexto_inicial, contexto_final) in enumerate(bloques, 1):
+        pista = inicio + desplazamiento if inicio is not None else None
+        for fuzz in range(MAX_FUZZ + 1):
+            recortadas = filas[min(fuzz, contexto_inicial):len(filas) - min(fuzz, contexto_final)]
+            buscadas = [contenido for marca, contenido in recortadas if marca != "+"]
+            posicion = _localizar(lineas, buscadas, desde, pista)
+            if posicion >= 0:
+                break
+        else:
+            raise ParcheNoAplicable(f"el bloque {numero} no encaja con el fichero actual")
+        # Las líneas de contexto conservan el texto del fichero (el diff puede diferir en espacios).
+        reemplazo, actual = [], posicion
+        for marca, contenido in recortadas:
+            if marca == " ": reemplazo.append(lineas[actual])
+            if marca == "+": reemplazo.append(contenido)
+            if marca != "+": actual += 1
+        lineas[posicion:posicion + len(buscadas)] = reemplazo
+        desde = posicion + len(reemplazo)
+        desplazamiento += len(reemplazo) - len(buscadas)
+    return "\n".join(lineas) + ("\n" if final_con_salto and lineas else "")
+
+def aplicar_reemplazos(texto: str, ediciones: list) -> str:
+    """
+    Aplica una lista de {"search", "replace"} en orden. 'search' se busca tal
+    cual y, si no aparece, línea a línea ignorando espacios en los extremos.
+    Un 'search' vacío solo vale para un fichero vacío o nuevo.
+    """
+    for numero, edicion in enumerate(ediciones, 1):
+        buscado, nuevo = edicion.get("search", ""), edicion.get("replace", "")
+        if not buscado:
+            if texto.strip():
+                raise ParcheNoAplicable(f"la edición {numero} tiene 'search' vacío y el fichero no está vacío")
+            texto = nuevo
+        elif buscado in texto:
+            texto = texto.replace(buscado, nuevo, 1)
+        else:
+            lineas = texto.splitlines(keepends=True)
+            buscadas = buscado.strip("\n").splitlines()
+            posicion = _localizar([l.rstrip("\r\n") for l in lineas], buscadas, 0)
+            if posicion < 0:
+                raise ParcheNoAplicable(f"el texto de 'search' de la edición {numero} no aparece en el fichero")
+            final = lineas[posicion + len(buscadas) - 1]
+            salto = final[len(final.rstrip("\r\n")):] or "\n"
+            lineas[posicion:posicion + len(buscadas)] = [nuevo.strip("\n") + salto] if nuevo.strip("\n") else []
+            texto = "".join(lineas)
+    return texto
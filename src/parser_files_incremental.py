@@ -0,0 +1,112 @@
+# src/parser_files_incremental.py (Parser incremental del protocolo {"files": [...]})
+# Recibe la respuesta del LLM a trozos (streaming) y entrega cada elemento de
+# "files" en cuanto su objeto JSON se cierra, sin esperar al final de la respuesta.
+import re
+import ast
+import json
+
+_PATRON_INICIO_FILES = re.compile(r'["\']files["\']\s*:\s*\[')
+# Cola que se conserva mientras se busca la clave "files" por si queda partida entre dos trozos.
+_COLA_BUSQUEDA = 32
+
+class ParserFilesIncremental:
+    """
+    Cada trozo se recorre una sola vez. Del objeto en curso solo se guardan sus
+    fragmentos, que se unen al cerrarse; el texto ya consumido se descarta.
+    """
+    def __init__(self):
+        self._cola = ""                # Final del texto aún sin "files", por si la clave queda partida.
+        self._fase = "buscando_files"  # -> "en_array" -> "fin"
+        self._partes = []              # Fragmentos del objeto abierto (vacío si no hay ninguno).
+        self._abierto = False
+        self._profundidad = 0
+        self._en_string = None  # Comilla que abrió el string actual, o None.
+        self._escape = False
+        self._texto_previo = []  # Texto fuera de objetos, solo hasta emitir el primer fichero (parser de respaldo).
+        self.ficheros_emitidos = 0
+        self.caracteres_recibidos = 0
+
+    @property
+    def encontro_files(self) -> bool:
+        return self._fase != "buscando_files"
+
+    @property
+    def terminado(self) -> bool:
+        return self._fase == "fin"
+
+    def texto_completo(self) -> str:
+        """Texto recibido, disponible mientras no se haya emitido ningún fichero."""
+        if self.ficheros_emitidos:
+            return ""
+        return "".join(self._texto_previo) + "".join(self._partes)
+
+    def alimentar(self, trozo: str):
+        """
+        Procesa un trozo de texto y devuelve la lista de entradas de 'files'
+        completadas: un dict por entrada, o su texto en bruto si no se pudo
+        decodificar (para repararla después sin abortar el stream).
+        """
+        if not trozo or self._fase == "fin":
+            return []
+        self.caracteres_recibidos += len(trozo)
+
+        emitidos = []
+        if self._fase == "buscando_files":
+            buscado = self._cola + trozo
+            match = _PATRON_INICIO_FILES.search(buscado)
+            if not match:
+                self._texto_previo.append(trozo)
+                self._cola = buscado[-_COLA_BUSQUEDA:]
+                return emitidos
+            resto = buscado[match.end():]
+            # Lo que sigue a '"files": [' se guarda abajo, dentro o fuera de un objeto.
+            self._texto_previo.append(trozo[:len(trozo) - len(resto)])
+            trozo = resto
+            self._cola = ""
+            self._fase = "en_array"
+
+        # Estado en locales: el bucle por carácter es la parte caliente del parser.
+        profundidad, en_string, escape, abierto = self._profundidad, self._en_string, self._escape, self._abierto
+        inicio = 0
+        for i, c in enumerate(trozo):
+            if not abierto:
+                if c == "{":
+                    abierto, profundidad, inicio = True, 1, i
+                elif c == "]":
+                    self._fase = "fin"
+                    break
+                elif self.ficheros_emitidos == 0:
+                    self._texto_previo.append(c)
+                continue
+            if en_string:
+                if escape: escape = False
+                elif c == "\\": escape = True
+                elif c == en_string: en_string = None
+            elif c in ('"', "'"):
+                en_string = c
+            elif c == "{":
+                profundidad += 1
+            elif c == "}":
+                profundidad -= 1
+                if profundidad == 0:
+                    self._partes.append(trozo[inicio:i + 1])
+                    texto = "".join(self._partes)
+                    self._partes = []
+                    abierto = False
+                    emitidos.append(self._decodificar(texto))
+                    self.ficheros_emitidos += 1
+                    self._texto_previo = []
+        if abierto:
+            self._partes.append(trozo[inicio:])
+        self._profundidad, self._en_string, self._escape, self._abierto = profundidad, en_string, escape, abierto
+        return emitidos
+
+    @staticmethod
+    def _decodificar(texto: str):
+        """dict de la entrada; si ni JSON (tolerando saltos de línea crudos) ni literal de Python la leen, el texto tal cual."""
+        for decodificar in (json.loads, lambda t: json.loads(t, strict=False), ast.literal_eval):
+            try:
+                return decodificar(texto)
+            except (ValueError, SyntaxError, MemoryError, RecursionError):
+                continue
+        return texto
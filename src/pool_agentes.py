@@ -0,0 +1,127 @@
+# src/pool_agentes.py (Pool de contenedores de agente precalentados)
+import time
+import queue
+import threading
+import requests
+
+PUERTO_AGENTE = 8000
+
+def _log(mensaje, nivel="POOL"):
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [{nivel}] {mensaje}", flush=True)
+
+class AgenteCaliente:
+    """Un contenedor vivo ejecutando 'agent_runner.py --servir'."""
+    def __init__(self, container, url: str):
+        self.container = container
+        self.url = url
+        self.misiones = 0
+
+class PoolDeAgentes:
+    """
+    Mantiene 'tamano' contenedores de agente arrancados y listos. Cada misión
+    toma un contenedor libre, lo usa vía HTTP y lo devuelve al pool. Un
+    contenedor se recicla (se destruye y se crea otro) tras 'reciclar_tras'
+    misiones o si falla su health check.
+    """
+    def __init__(self, client, imagen: str, tamano: int = 2, reciclar_tras: int = 20, timeout_arranque: float = 60, volumes: dict = None, environment: dict = None):
+        self.client = client
+        self.volumes = volumes
+        self.environment = environment or {}
+        self.imagen = imagen
+        self.tamano = tamano
+        self.reciclar_tras = reciclar_tras
+        self.timeout_arranque = timeout_arranque
+        self._libres = queue.Queue()
+        self._todos = set()
+        self._lock = threading.Lock()
+
+    # --- Ciclo de vida de los contenedores ---
+    def _arrancar_agente(self) -> AgenteCaliente:
+        container = self.client.containers.run(
+            self.imagen,
+            command=["python", "-u", "agent_runner.py", "--servir"],
+            environment={**self.environment, "AGENT_PORT": str(PUERTO_AGENTE)},
+            ports={f"{PUERTO_AGENTE}/tcp": ("127.0.0.1", None)},
+            volumes=self.volumes,
+            detach=True,
+        )
+        container.reload()
+        puerto_host = container.attrs["NetworkSettings"]["Ports"][f"{PUERTO_AGENTE}/tcp"][0]["HostPort"]
+        agente = AgenteCaliente(container, f"http://127.0.0.1:{puerto_host}")
+
+        limite = time.time() + self.timeout_arranque
+        while time.time() < limite:
+            if self.esta_sano(agente):
+                with self._lock: self._todos.add(agente)
+                _log(f"Agente precalentado listo ({container.short_id}) en {agente.url}.")
+                return agente
+            time.sleep(0.5)
+        self._destruir(agente)
+        raise RuntimeError(f"El contenedor {container.short_id} no respondió al health check en {self.timeout_arranque}s.")
+
+    def _destruir(self, agente: AgenteCaliente):
+        with self._lock: self._todos.discard(agente)
+        try: agente.container.remove(force=True)
+        except Exception as e: _log(f"No se pudo eliminar el contenedor {agente.container.short_id}: {e}", "WARNING")
+
+    def esta_sano(self, agente: AgenteCaliente) -> bool:
+        try:
+            return requests.get(f"{agente.url}/salud", timeout=2).status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+    def iniciar(self):
+        _log(f"Precalentando {self.tamano} contenedor(es) de agente...")
+        for _ in range(self.tamano):
+            self._libres.put(self._arrancar_agente())
+
+    def cerrar(self):
+        with self._lock: agentes = list(self._todos)
+        for agente in agentes: self._destruir(agente)
+        _log("Pool de agentes cerrado.")
+
+    # --- Despacho de misiones ---
+    def _tomar(self) -> AgenteCaliente:
+        agente = self._libres.get()
+        if agente is None:
+            try: return self._arrancar_agente()
+            except Exception:
+                self._libres.put(None); raise
+        if not self.esta_sano(agente):
+            _log(f"El agente {agente.container.short_id} no superó el health check. Reemplazándolo...", "WARNING")
+            self._destruir(agente)
+            agente = self._arrancar_agente()
+        return agente
+
+    def _devolver(self, agente: AgenteCaliente):
+        if agente.misiones >= self.reciclar_tras:
+            _log(f"Reciclando el agente {agente.container.short_id} tras {agente.misiones} misiones.")
+            self._destruir(agente)
+            try: agente = self._arrancar_agente()
+            except Exception as e:
+                # Dejamos un hueco vacío: el próximo _tomar intentará arrancarlo de nuevo.
+                _log(f"No se pudo arrancar un agente de reemplazo: {e}", "ERROR"); agente = None
+        self._libres.put(agente)
+
+    def ejecutar_mision(self, environment: dict, timeout: float = None) -> dict:
+        """
+        Envía la misión (mismas variables que el modo contenedor efímero) a un
+        agente libre. Devuelve {'StatusCode': int, 'logs': str}. Si no responde
+        en 'timeout' segundos lanza TimeoutError y el contenedor se recicla.
+        """
+        agente = self._tomar()
+        try:
+            respuesta = requests.post(f"{agente.url}/mision", json=environment, timeout=(10, timeout) if timeout else None)
+            respuesta.raise_for_status()
+            agente.misiones += 1
+            return respuesta.json()
+        except requests.exceptions.ReadTimeout:
+            _log(f"El agente {agente.container.short_id} superó el plazo de {timeout}s. Se reciclará.", "WARNING")
+            agente.misiones = self.reciclar_tras
+            raise TimeoutError(f"La misión superó el plazo de {timeout}s.")
+        except requests.exceptions.RequestException:
+            # Si el canal se rompe, el contenedor no es de fiar: lo forzamos a reciclarse.
+            agente.misiones = self.reciclar_tras
+            raise
+        finally:
+            self._devolver(agente)
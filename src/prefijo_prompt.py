@@ -0,0 +1,36 @@
+# src/prefijo_prompt.py (Aprovechamiento de la caché de prefijo de los servidores LLM)
+# llama.cpp, LM Studio, vLLM y OpenAI reutilizan el KV ya calculado para el
+# prefijo que un prompt comparte con uno anterior. Los prompts de misión se
+# componen de lo más estático a lo más volátil (plantilla, guías, formato,
+# contexto, tarea) y aquí están las pistas de caché que acepta cada servidor
+# y la medida de cuánto prefijo se comparte de verdad.
+#
+# llm_config["cache_prefijo"]:
+#   "llama.cpp" -> cache_prompt=true en cada petición (el servidor reusa el slot).
+#   "openai"    -> prompt_cache_key=<rol>, para que misiones del mismo rol caigan en la misma caché.
+#   "vllm", "lmstudio" -> sin pistas: la caché es automática (vLLM con --enable-prefix-caching).
+SERVIDORES = ("llama.cpp", "openai", "vllm", "lmstudio")
+
+def opciones_cache(config: dict, clave: str = None) -> dict:
+    """Parámetros extra de la petición OpenAI compatible según config["cache_prefijo"]."""
+    servidor = config.get("cache_prefijo")
+    clave = clave or config.get("clave_cache_prefijo")
+    if servidor == "llama.cpp":
+        return {"extra_body": {"cache_prompt": True}}
+    if servidor == "openai" and clave:
+        return {"extra_body": {"prompt_cache_key": clave}}
+    return {}
+
+def tokens_cacheados(uso):
+    """Tokens del prompt servidos desde la caché de prefijo, si el servidor lo informa."""
+    detalles = getattr(uso, "prompt_tokens_details", None)
+    return getattr(detalles, "cached_tokens", None) if detalles is not None else None
+
+def prefijo_comun(a: str, b: str) -> int:
+    """Longitud del prefijo común de 'a' y 'b' (búsqueda binaria sobre comparaciones de cortes)."""
+    bajo, alto = 0, min(len(a), len(b))
+    while bajo < alto:
+        medio = (bajo + alto + 1) // 2
+        if a[:medio] == b[:medio]: bajo = medio
+        else: alto = medio - 1
+    return bajo
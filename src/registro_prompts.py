@@ -0,0 +1,115 @@
+# src/registro_prompts.py (Plantillas de prompt cargadas una vez, con recarga por mtime)
+# Las plantillas de prompts/ y las guías de resources/ se leen la primera vez
+# que se piden y se vuelven a leer solo si cambia su mtime o su tamaño. Cada
+# plantilla se trocea al cargarla en texto literal y marcadores {MAYUSCULAS},
+# de modo que renderizar es un único "".join() en lugar de una cadena de
+# .replace() sobre textos muy grandes.
+import os
+import re
+import threading
+
+from prefijo_prompt import prefijo_comun
+
+MARCADOR = re.compile(r"\{([A-Z][A-Z0-9_]*)\}")  # Solo mayúsculas: las llaves de los ejemplos JSON no cuentan.
+CARACTERES_POR_TOKEN = 3.5  # Aproximación para texto en castellano mezclado con código y JSON.
+
+def _log(mensaje, nivel="INFO"):
+    print(f"   - [{nivel}] {mensaje}", flush=True)
+
+def estimar_tokens(texto: str) -> int:
+    """Tokens aproximados de 'texto' (sin depender del tokenizador de cada modelo)."""
+    return int(len(texto) / CARACTERES_POR_TOKEN) + 1 if texto else 0
+
+class Plantilla:
+    def __init__(self, texto: str, ruta: str = None):
+        self.texto = texto
+        self.ruta = ruta
+        # Literales en posiciones pares, nombres de marcador en las impares.
+        self._trozos = MARCADOR.split(texto)
+        self.marcadores = set(self._trozos[1::2])
+
+    def renderizar(self, valores: dict = None, anexos=()) -> str:
+        """
+        Sustituye los marcadores en una sola pasada (los que no estén en
+        'valores' se dejan tal cual) y añade 'anexos' al final sin copias intermedias.
+        """
+        valores = valores or {}
+        partes = [trozo if i % 2 == 0 else valores.get(trozo, "{" + trozo + "}") for i, trozo in enumerate(self._trozos)]
+        partes.extend(anexos)
+        return "".join(partes)
+
+class RegistroPrompts:
+    def __init__(self, log=_log):
+        self.log = log
+        self._plantillas = {}     # ruta -> (firma, Plantilla)
+        self._tamanos = {}        # nombre -> contadores de tamaño y de prefijo compartido
+        self._ultimos = {}        # nombre -> último prompt renderizado (para medir el prefijo reutilizable)
+        self._lock = threading.Lock()
+
+    def obtener(self, ruta: str) -> Plantilla:
+        """Plantilla de 'ruta', releída solo si el fichero cambió. Propaga FileNotFoundError."""
+        estado = os.stat(ruta)
+        firma = (estado.st_mtime_ns, estado.st_size)
+        with self._lock:
+            cargada = self._plantillas.get(ruta)
+            if cargada and cargada[0] == firma:
+                return cargada[1]
+        with open(ruta, "r", encoding="utf-8") as f:
+            plantilla = Plantilla(f.read(), ruta)
+        with self._lock:
+            if cargada:
+                self.log(f"Plantilla '{ruta}' modificada en disco: recargada.", "INFO")
+            self._plantillas[ruta] = (firma, plantilla)
+        return plantilla
+
+    def texto(self, ruta: str) -> str:
+        return self.obtener(ruta).texto
+
+    def renderizar(self, ruta: str, valores: dict = None, anexos=()) -> str:
+        """
+        Renderiza la plantilla de 'ruta' y anota el tamaño (caracteres y tokens
+        estimados) del prompt y cuánto de él comparte con el anterior de la misma
+        plantilla, que es lo que la caché de prefijo del servidor puede reutilizar.
+        """
+        prompt = self.obtener(ruta).renderizar(valores, anexos)
+        nombre = os.path.splitext(os.path.basename(ruta))[0]
+        with self._lock:
+            anterior = self._ultimos.get(nombre)
+            self._ultimos[nombre] = prompt
+        compartido = prefijo_comun(anterior, prompt) if anterior is not None else None
+        with self._lock:
+            tamano = self._tamanos.setdefault(nombre, {"n": 0, "caracteres": 0, "max": 0, "tokens": 0, "comparados": 0, "compartidos": 0})
+            tamano["n"] += 1
+            tamano["caracteres"] += len(prompt)
+            tamano["max"] = max(tamano["max"], len(prompt))
+            tamano["tokens"] += estimar_tokens(prompt)
+            if compartido is not None:
+                tamano["comparados"] += len(prompt)
+                tamano["compartidos"] += compartido
+        return prompt
+
+    def precargar(self, rutas):
+        """Carga de antemano las plantillas (al arrancar) y avisa de las que faltan."""
+        for ruta in rutas:
+            try: self.obtener(ruta)
+            except FileNotFoundError: self.log(f"No se encontró la plantilla '{ruta}'.", "WARNING")
+
+    def resumen(self) -> str:
+        with self._lock:
+            filas = []
+            for nombre, t in sorted(self._tamanos.items(), key=lambda item: -item[1]["caracteres"]):
+                reutilizado = f", prefijo reutilizable {100 * t['compartidos'] / t['comparados']:.0f}%" if t["comparados"] else ""
+                filas.append(f"  {nombre}: {t['n']} prompt(s), media {t['caracteres'] // t['n']} car. (~{t['tokens'] // t['n']} tokens), "
+                             f"máx {t['max']} car.{reutilizado}")
+        return "\n".join(filas)
+
+_registro = None
+_registro_lock = threading.Lock()
+
+def obtener_registro(log=_log) -> RegistroPrompts:
+    """Registro de plantillas del proceso (se crea al primer uso)."""
+    global _registro
+    with _registro_lock:
+        if _registro is None:
+            _registro = RegistroPrompts(log)
+        return _registro
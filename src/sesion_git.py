@@ -0,0 +1,129 @@
+# src/sesion_git.py (Sesión Git por tarea: commits locales y push agrupado)
+# Cada etapa hace su commit en local; la red solo se toca para traer lo que
+# empujó un agente (pull) y para publicar en los checkpoints (push).
+import os
+import time
+import shutil
+import tempfile
+import subprocess
+import threading
+from contextlib import contextmanager
+
+import trazas
+
+# Operaciones que van por la red (el resto son locales).
+OPERACIONES_DE_RED = {"pull", "push", "fetch", "clone"}
+CHECKPOINT_FINAL = "final"    # Un único push al terminar la tarea.
+CHECKPOINT_ETAPA = "etapa"    # Push tras cada commit de etapa (comportamiento clásico).
+
+class SesionGit:
+    def __init__(self, repo_path: str, checkpoints: str = CHECKPOINT_FINAL, lock=None, log=print):
+        self.repo_path = repo_path
+        self.checkpoints = checkpoints
+        self.lock = lock or threading.RLock()
+        self.log = log
+        self.pendiente_push = False
+        self.tiempos = []  # (operación, segundos)
+
+    def _git(self, *argumentos, comprobar: bool = True) -> subprocess.CompletedProcess:
+        inicio = time.perf_counter()
+        try:
+            with trazas.span("git", argumentos[0]):
+                return subprocess.run(["git", *argumentos], cwd=self.repo_path, check=comprobar,
+                                      capture_output=True, text=True, encoding='utf-8')
+        except subprocess.CalledProcessError as e:
+            self.log(f"Error ejecutando Git ({' '.join(argumentos)}): {e.stderr}", "ERROR")
+            raise
+        finally:
+            self.tiempos.append((argumentos[0], time.perf_counter() - inicio))
+
+    def pull(self):
+        """
+        Trae lo que haya empujado un agente. Es la única operación de red obligatoria
+        por etapa. Los commits locales aún sin publicar se rebasan encima: un pull con
+        merge sobre ramas divergentes falla en Git >= 2.33 si no hay pull.rebase.
+        """
+        with self.lock:
+            try:
+                self._git("pull", "--rebase", "--autostash")
+            except subprocess.CalledProcessError:
+                self._git("rebase", "--abort", comprobar=False) # No dejar el checkout a medio rebasar.
+                raise
+
+    def commit_etapa(self, mensaje: str, rutas=(".",)) -> bool:
+        """
+        Commit local de una etapa. Si el árbol resultante es idéntico al de HEAD no
+        se crea commit. Devuelve True si hubo commit.
+        """
+        with self.lock:
+            self._git("add", "-A", "--", *rutas)
+            arbol_nuevo = self._git("write-tree").stdout.strip()
+            arbol_head = self._git("rev-parse", "--verify", "--quiet", "HEAD^{tree}", comprobar=False).stdout.strip()
+            if arbol_nuevo == arbol_head:
+                self.log("No hay nuevos cambios que guardar (árbol sin cambios).", "GIT")
+                return False
+            self._git("commit", "-m", mensaje)
+            self.pendiente_push = True
+            if self.checkpoints == CHECKPOINT_ETAPA:
+                self.publicar_pendientes()
+            return True
+
+    def publicar_pendientes(self):
+        """Push de los commits locales aún no publicados (checkpoint)."""
+        with self.lock:
+            if not self.pendiente_push:
+                return
+            if self._git("push", comprobar=False).returncode != 0:
+                # Un agente publicó mientras tanto: integramos sus commits y reintentamos una vez.
+                self.log("Push rechazado; rebasando sobre lo publicado y reintentando...", "GIT")
+                self.pull()
+                self._git("push")
+            self.pendiente_push = False
+
+    @contextmanager
+    def instantanea(self):
+        """
+        Worktree separado (y desechable) con HEAD. Sirve para ejecutar el QA de una
+        etapa mientras otras siguen escribiendo o haciendo pull en el checkout.
+        """
+        ruta = tempfile.mkdtemp(prefix="colmena_qa_")
+        with self.lock:
+            self._git("worktree", "add", "--detach", ruta, "HEAD")
+        try:
+            yield ruta
+        finally:
+            with self.lock:
+                if self._git("worktree", "remove", "--force", ruta, comprobar=False).returncode != 0:
+                    shutil.rmtree(ruta, ignore_errors=True)
+                    self._git("worktree", "prune", comprobar=False)
+
+    def resumen(self) -> str:
+        por_operacion = {}
+        for operacion, segundos in self.tiempos:
+            veces, total = por_operacion.get(operacion, (0, 0.0))
+            por_operacion[operacion] = (veces + 1, total + segundos)
+        de_red = sum(veces for op, (veces, _) in por_operacion.items() if op in OPERACIONES_DE_RED)
+        total = sum(segundos for _, segundos in self.tiempos)
+        detalle = ", ".join(f"{op} {veces}x {seg:.2f}s" for op, (veces, seg) in sorted(por_operacion.items()))
+        return f"Git: {len(self.tiempos)} operaciones ({de_red} de red) en {total:.2f}s — {detalle or 'ninguna'}"
+
+_sesiones = {}
+_sesiones_lock = threading.Lock()
+
+def iniciar_sesion(repo_path: str, **opciones) -> SesionGit:
+    with _sesiones_lock:
+        sesion = SesionGit(repo_path, **opciones)
+        _sesiones[os.path.realpath(repo_path)] = sesion
+        return sesion
+
+def obtener_sesion(repo_path: str):
+    with _sesiones_lock:
+        return _sesiones.get(os.path.realpath(repo_path))
+
+def cerrar_sesion(repo_path: str):
+    """Publica lo pendiente y olvida la sesión. Devuelve la sesión cerrada (o None)."""
+    with _sesiones_lock:
+        sesion = _sesiones.pop(os.path.realpath(repo_path), None)
+    if sesion:
+        sesion.publicar_pendientes()
+    return sesion
@@ -0,0 +1,130 @@
+# src/snapshot_proyecto.py (Snapshot incremental del código de un proyecto)
+# Sustituye a los antiguos leer_codigo_proyecto / crear_contexto_del_proyecto:
+# un índice por fichero evita releer lo que no ha cambiado entre etapas.
+import io
+import os
+import subprocess
+import threading
+
+DIRECTORIOS_A_IGNORAR = {'.git', '__pycache__', 'docs', '.venv', 'node_modules'}
+EXTENSIONES_RELEVANTES = ('.py', '.js', '.html', '.css', '.json', '.md', 'requirements.txt', 'Dockerfile')
+# Ficheros enormes y sin valor para el LLM (lockfiles, etc.).
+FICHEROS_A_IGNORAR = {'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'poetry.lock'}
+MAX_BYTES_POR_FICHERO = 200 * 1024
+BYTES_SONDA_BINARIO = 8192
+
+FORMATO_COMPACTO = "compacto"      # El de leer_codigo_proyecto.
+FORMATO_DELIMITADO = "delimitado"  # El de contextualizador (con INICIO/FIN).
+
+class IndiceSnapshot:
+    """
+    Índice en memoria de un directorio: ruta relativa -> (mtime_ns, tamaño, contenido).
+    Solo se vuelve a leer del disco un fichero cuyo mtime o tamaño ha cambiado.
+    """
+    def __init__(self, raiz: str, max_bytes: int = MAX_BYTES_POR_FICHERO):
+        self.raiz = os.path.abspath(raiz)
+        self.max_bytes = max_bytes
+        self.entradas = {}
+        self.lecturas = 0
+        self.omitidos = 0
+        self._lock = threading.Lock()
+
+    def _listar_candidatos(self):
+        """Ficheros según 'git ls-files' (respeta .gitignore) o, si no es un repo, os.walk."""
+        try:
+            salida = subprocess.run(
+                ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+                cwd=self.raiz, check=True, capture_output=True,
+            ).stdout.decode("utf-8", errors="ignore")
+            rutas = [r for r in salida.split("\0") if r]
+        except (subprocess.CalledProcessError, FileNotFoundError, NotADirectoryError):
+            rutas = []
+            for root, dirs, files in os.walk(self.raiz):
+                dirs[:] = [d for d in dirs if d not in DIRECTORIOS_A_IGNORAR]
+                for file in files:
+                    rutas.append(os.path.relpath(os.path.join(root, file), self.raiz).replace(os.sep, "/"))
+        return sorted(
+            r for r in set(rutas)
+            if r.endswith(EXTENSIONES_RELEVANTES)
+            and os.path.basename(r) not in FICHEROS_A_IGNORAR
+            and not DIRECTORIOS_A_IGNORAR.intersection(r.split("/")[:-1])
+        )
+
+    def _leer(self, ruta_abs: str, tamano: int):
+        if tamano > self.max_bytes:
+            return None
+        with open(ruta_abs, 'rb') as f:
+            datos = f.read()
+        if b"\0" in datos[:BYTES_SONDA_BINARIO]:
+            return None
+        self.lecturas += 1
+        return datos.decode('utf-8', errors='ignore')
+
+    def actualizar(self):
+        """Sincroniza el índice con el disco y devuelve la lista ordenada de (ruta, contenido)."""
+        with self._lock:
+            self.lecturas = 0
+            self.omitidos = 0
+            vistos = set()
+            resultado = []
+            for rel_path in self._listar_candidatos():
+                ruta_abs = os.path.join(self.raiz, rel_path)
+                try:
+                    st = os.stat(ruta_abs)
+                except OSError:
+                    continue # Borrado pero aún en el índice de git.
+                vistos.add(rel_path)
+                previa = self.entradas.get(rel_path)
+                if previa and previa[0] == st.st_mtime_ns and previa[1] == st.st_size:
+                    contenido = previa[2]
+                else:
+                    try:
+                        contenido = self._leer(ruta_abs, st.st_size)
+                    except OSError:
+                        continue
+                    self.entradas[rel_path] = (st.st_mtime_ns, st.st_size, contenido)
+                if contenido is None:
+                    self.omitidos += 1
+                    continue
+                resultado.append((rel_path, contenido))
+            for rel_path in set(self.entradas) - vistos:
+                del self.entradas[rel_path]
+            return resultado
+
+_indices = {}
+_indices_lock = threading.Lock()
+
+def obtener_indice(path: str) -> IndiceSnapshot:
+    """Un índice por directorio y proceso, reutilizado entre etapas (QA, documentación...)."""
+    raiz = os.path.abspath(path)
+    with _indices_lock:
+        if raiz not in _indices:
+            _indices[raiz] = IndiceSnapshot(raiz)
+        return _indices[raiz]
+
+def olvidar_indice(path: str):
+    """Descarta el índice de un directorio temporal (p. ej. la instantánea del QA)."""
+    with _indices_lock:
+        _indices.pop(os.path.abspath(path), None)
+
+def escribir_snapshot(path: str, salida, formato: str = FORMATO_COMPACTO) -> int:
+    """
+    Vuelca el snapshot de 'path' en el stream 'salida' fichero a fichero (sin
+    concatenaciones cuadráticas). Devuelve el número de ficheros escritos.
+    """
+    ficheros = obtener_indice(path).actualizar()
+    separador = '=' * 20
+    for rel_path, contenido in ficheros:
+        if formato == FORMATO_DELIMITADO:
+            salida.write(f"\n{separador}\n--- INICIO DEL FICHERO: {rel_path} ---\n{separador}\n\n")
+            salida.write(contenido)
+            salida.write(f"\n\n{separador}\n--- FIN DEL FICHERO: {rel_path} ---\n{separador}\n")
+        else:
+            salida.write(f"\n\n{separador}\n--- FICHERO: {rel_path} ---\n{separador}\n\n")
+            salida.write(contenido)
+    return len(ficheros)
+
+def leer_snapshot(path: str, formato: str = FORMATO_COMPACTO) -> str:
+    buffer = io.StringIO()
+    escribir_snapshot(path, buffer, formato)
+    return buffer.getvalue()
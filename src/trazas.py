@@ -0,0 +1,212 @@
+# src/trazas.py (Trazas por spans y métricas de la colmena)
+# Cada operación relevante (etapa, llamada al LLM, contenedor, git, pip...) se
+# envuelve en un span con duración, resultado y atributos (tamaños, tokens).
+# Los spans se añaden a <dir>/trazas.jsonl (orquestador y agentes, vía volumen
+# montado) y el orquestador mantiene además un textfile de Prometheus.
+import os
+import json
+import time
+import uuid
+import threading
+import contextlib
+import contextvars
+
+FICHERO_TRAZAS = "trazas.jsonl"
+FICHERO_PROMETHEUS = "colmena.prom"
+INTERVALO_PROMETHEUS = 1.0  # Segundos mínimos entre reescrituras del textfile.
+
+_tarea = contextvars.ContextVar("traza_tarea", default=None)
+_span_actual = contextvars.ContextVar("traza_span", default=None)      # Span abierto más interno.
+_padre_externo = contextvars.ContextVar("traza_padre", default=None)   # Id de span de otro proceso (agente).
+
+class Span:
+    def __init__(self, tipo: str, nombre: str, padre=None, atributos: dict = None):
+        self.id = uuid.uuid4().hex[:16]
+        self.tipo = tipo
+        self.nombre = nombre
+        self.padre = padre
+        self.atributos = dict(atributos or {})
+        self.resultado = "ok"
+        self.inicio = time.time()
+        self.duracion = None
+
+    def anotar(self, **atributos):
+        self.atributos.update({k: v for k, v in atributos.items() if v is not None})
+
+    def registro(self) -> dict:
+        return {
+            "traza": _tarea.get(), "id": self.id, "padre": self.padre, "tipo": self.tipo, "nombre": self.nombre,
+            "inicio": round(self.inicio, 3), "duracion_s": round(self.duracion or 0.0, 4), "resultado": self.resultado,
+            **self.atributos,
+        }
+
+class Trazador:
+    def __init__(self, directorio: str, proceso: str = "orquestador", prometheus: bool = True):
+        self.directorio = directorio
+        self.proceso = proceso
+        self.prometheus = prometheus
+        self._lock = threading.Lock()
+        self._metricas = {}       # (tipo, nombre, resultado) -> [n, segundos]
+        self._contadores = {}     # (métrica, etiqueta) -> total
+        self._por_tarea = {}      # tarea -> [registros]
+        self._ultima_escritura_prom = 0.0
+        os.makedirs(directorio, exist_ok=True)
+        self.ruta_jsonl = os.path.join(directorio, FICHERO_TRAZAS)
+
+    def emitir(self, span: Span):
+        registro = {**span.registro(), "proceso": self.proceso}
+        linea = json.dumps(registro, ensure_ascii=False, default=str) + "\n"
+        # Una única escritura en modo append: las líneas de varios procesos no se mezclan.
+        with self._lock:
+            with open(self.ruta_jsonl, "a", encoding="utf-8") as f:
+                f.write(linea)
+            clave = (span.tipo, span.nombre, span.resultado)
+            acumulado = self._metricas.setdefault(clave, [0, 0.0])
+            acumulado[0] += 1
+            acumulado[1] += span.duracion or 0.0
+            for metrica, etiqueta, atributo in (
+                ("colmena_llm_tokens_total", "entrada", "tokens_entrada"), ("colmena_llm_tokens_total", "salida", "tokens_salida"),
+                ("colmena_llm_tokens_total", "cacheados", "tokens_cacheados"),
+                ("colmena_llm_caracteres_total", "prompt", "prompt_caracteres"), ("colmena_llm_caracteres_total", "respuesta", "respuesta_caracteres"),
+            ):
+                if isinstance(span.atributos.get(atributo), (int, float)):
+                    self._contadores[(metrica, etiqueta)] = self._contadores.get((metrica, etiqueta), 0) + span.atributos[atributo]
+            if registro["traza"]:
+                self._por_tarea.setdefault(registro["traza"], []).append(registro)
+            if self.prometheus and time.monotonic() - self._ultima_escritura_prom >= INTERVALO_PROMETHEUS:
+                self._escribir_prometheus()
+
+    def _escribir_prometheus(self):
+        etiqueta = lambda valor: str(valor).replace("\\", "\\\\").replace('"', '\\"')
+        lineas = [
+            "# HELP colmena_span_duracion_segundos Duración de los spans de la colmena.",
+            "# TYPE colmena_span_duracion_segundos summary",
+        ]
+        for (tipo, nombre, resultado), (n, segundos) in sorted(self._metricas.items()):
+            etiquetas = f'tipo="{etiqueta(tipo)}",nombre="{etiqueta(nombre)}",resultado="{etiqueta(resultado)}"'
+            lineas.append(f"colmena_span_duracion_segundos_sum{{{etiquetas}}} {segundos:.6f}")
+            lineas.append(f"colmena_span_duracion_segundos_count{{{etiquetas}}} {n}")
+        metricas_vistas = set()
+        for (metrica, tipo), total in sorted(self._contadores.items()):
+            if metrica not in metricas_vistas:
+                lineas.append(f"# TYPE {metrica} counter")
+                metricas_vistas.add(metrica)
+            lineas.append(f'{metrica}{{tipo="{tipo}"}} {total}')
+        ruta = os.path.join(self.directorio, FICHERO_PROMETHEUS)
+        with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+            f.write("\n".join(lineas) + "\n")
+        os.replace(ruta + ".tmp", ruta)  # El node_exporter nunca ve un fichero a medias.
+        self._ultima_escritura_prom = time.monotonic()
+
+    def cerrar(self):
+        with self._lock:
+            if self.prometheus: self._escribir_prometheus()
+
+    def registros_de_tarea(self, tarea: str, desde_byte: int = 0) -> list:
+        """Spans de la tarea: los de este proceso y los que los agentes añadieron al JSONL desde 'desde_byte'."""
+        with self._lock:
+            registros = list(self._por_tarea.pop(tarea, []))
+        try:
+            with open(self.ruta_jsonl, "r", encoding="utf-8") as f:
+                f.seek(desde_byte)
+                for linea in f:
+                    try: registro = json.loads(linea)
+                    except ValueError: continue
+                    if registro.get("traza") == tarea and registro.get("proceso") != self.proceso:
+                        registros.append(registro)
+        except OSError:
+            pass
+        return registros
+
+    def tamano_jsonl(self) -> int:
+        try: return os.path.getsize(self.ruta_jsonl)
+        except OSError: return 0
+
+_trazador = None
+_trazador_lock = threading.Lock()
+
+def configurar(directorio: str, proceso: str = "orquestador", prometheus: bool = True):
+    """Activa las trazas del proceso. Con 'directorio' vacío las desactiva."""
+    global _trazador
+    with _trazador_lock:
+        if _trazador: _trazador.cerrar()
+        _trazador = Trazador(directorio, proceso, prometheus) if directorio else None
+    return _trazador
+
+def obtener():
+    """Trazador del proceso; dentro del contenedor se activa solo si existe TRAZAS_DIR."""
+    if _trazador is None and os.environ.get("TRAZAS_DIR"):
+        configurar(os.environ["TRAZAS_DIR"], proceso="agente", prometheus=False)
+    return _trazador
+
+@contextlib.contextmanager
+def span(tipo: str, nombre: str, **atributos):
+    """
+    Mide el bloque y emite el span al salir. Una excepción lo marca como
+    "error" y se propaga. El bloque puede anotar atributos con span.anotar(...)
+    o fijar span.resultado (p. ej. "fallo" cuando una etapa devuelve False).
+    """
+    abierto = _span_actual.get()
+    actual = Span(tipo, nombre, padre=abierto.id if abierto else _padre_externo.get(), atributos=atributos)
+    token = _span_actual.set(actual)
+    inicio = time.perf_counter()
+    try:
+        yield actual
+    except BaseException as e:
+        actual.resultado = "error"
+        actual.anotar(error=f"{type(e).__name__}: {e}"[:300])
+        raise
+    finally:
+        actual.duracion = time.perf_counter() - inicio
+        _span_actual.reset(token)
+        trazador = obtener()
+        if trazador:
+            try: trazador.emitir(actual)
+            except OSError: pass # Las trazas nunca deben tumbar la misión.
+
+def anotar(**atributos):
+    """Anota atributos en el span abierto más interno de este contexto (si lo hay)."""
+    abierto = _span_actual.get()
+    if abierto: abierto.anotar(**atributos)
+
+@contextlib.contextmanager
+def contexto_tarea(tarea: str, padre: str = None):
+    """Asocia los spans de este contexto (y de los hilos que lo copien) a 'tarea'."""
+    token_tarea = _tarea.set(tarea)
+    token_padre = _padre_externo.set(padre)
+    try:
+        yield
+    finally:
+        _tarea.reset(token_tarea)
+        _padre_externo.reset(token_padre)
+
+def tarea_actual():
+    return _tarea.get()
+
+def entorno_para_agente() -> dict:
+    """Variables para que el agente cuelgue sus spans de la misión en curso."""
+    entorno = {}
+    if _tarea.get(): entorno["TRAZA_TAREA"] = _tarea.get()
+    if _span_actual.get(): entorno["TRAZA_PADRE"] = _span_actual.get().id
+    return entorno
+
+def resumen_tarea(tarea: str, desde_byte: int = 0) -> str:
+    """Tabla de texto con el tiempo de la tarea agrupado por tipo y nombre de span."""
+    trazador = obtener()
+    if not trazador:
+        return ""
+    grupos = {}
+    for registro in trazador.registros_de_tarea(tarea, desde_byte):
+        clave = (registro.get("proceso", ""), registro["tipo"], registro["nombre"])
+        g = grupos.setdefault(clave, {"n": 0, "total": 0.0, "max": 0.0, "errores": 0, "tokens": 0})
+        g["n"] += 1
+        g["total"] += registro.get("duracion_s", 0.0)
+        g["max"] = max(g["max"], registro.get("duracion_s", 0.0))
+        g["errores"] += registro.get("resultado") != "ok"
+        g["tokens"] += (registro.get("tokens_entrada") or 0) + (registro.get("tokens_salida") or 0)
+    if not grupos:
+        return ""
+    filas = [f"{'proceso':<12} {'tipo':<12} {'nombre':<28} {'n':>4} {'total s':>9} {'máx s':>8} {'err':>4} {'tokens':>8}"]
+    for (proceso, tipo, nombre), g in sorted(grupos.items(), key=lambda item: -item[1]["total"]):
+        filas.append(f"{proceso:<12} {tipo:<12} {nombre[:28]:<28} {g['n']:>4} {g['total']:>9.2f} {g['max']:>8.2f} {g['errores']:>4} {g['tokens']:>8}")
+    return "\n".join(filas)